@@ -0,0 +1,146 @@
+"""
+Local OHLCV candle store.
+
+Closed candles are kept in the 'ohlcv_candles' table of scores.db, keyed by
+(exchange type, symbol, timeframe, open time). get_candles() works out which
+candle open times of the requested window are not stored yet, downloads only
+those runs from the exchange (paginating with 'since', since Binance caps one
+request at 1000 candles) and serves the rest from disk. The candle that is
+still open is fetched on every call and never stored.
+"""
+import numpy as np
+import pandas as pd
+
+from db_manager import connections
+
+# Binance returns at most 1000 (spot) / 1500 (futures) candles per request;
+# stay at the lower bound so one code path works for every market type.
+MAX_CANDLES_PER_REQUEST = 1000
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+def init_candle_table(conn):
+    """Creates the ohlcv_candles table if it doesn't exist."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ohlcv_candles (
+            exchange_type TEXT NOT NULL, -- spot, future, ...
+            symbol TEXT NOT NULL,
+            timeframe TEXT NOT NULL,
+            timestamp INTEGER NOT NULL, -- candle open time, milliseconds since epoch
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            volume REAL NOT NULL,
+            PRIMARY KEY (exchange_type, symbol, timeframe, timestamp)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _missing_ranges(grid, stored):
+    """Returns [(first_ts, last_ts), ...] runs of 'grid' timestamps that are not in 'stored'."""
+    missing = ~np.isin(grid, stored)
+    if not missing.any():
+        return []
+    # Edges of each run of consecutive missing grid points
+    edges = np.diff(np.r_[0, missing.astype(np.int8), 0])
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return [(int(grid[s]), int(grid[e])) for s, e in zip(starts, ends)]
+
+
+def _fetch_range(exchange, symbol, timeframe, first_ts, last_ts, tf_ms):
+    """Downloads candles with open times in [first_ts, last_ts], paginating with 'since'."""
+    candles = []
+    since = first_ts
+    while since <= last_ts:
+        limit = min(MAX_CANDLES_PER_REQUEST, (last_ts - since) // tf_ms + 1)
+        batch = exchange.fetch_ohlcv(symbol, timeframe, since, limit)
+        if not batch:
+            break
+        candles.extend(candle for candle in batch if candle[0] <= last_ts)
+        next_since = batch[-1][0] + tf_ms
+        if next_since <= since:
+            break
+        since = next_since
+    return candles
+
+
+def get_candles(exchange, exchange_type, symbol, timeframe='1m', limit=1440, since=None):
+    """
+    Returns OHLCV candles for (exchange_type, symbol, timeframe) from the local
+    store, downloading only the ranges that are not stored yet.
+
+    Without 'since' the window is the last 'limit' candles up to the current
+    one; with it, 'limit' candles starting at 'since'. Closed candles are
+    persisted; the still-open candle is always fetched live and never stored,
+    since it keeps changing until its period ends.
+
+    Returns:
+        pd.DataFrame: int64 'timestamp' (ms) plus open/high/low/close/volume,
+        sorted by timestamp.
+    """
+    tf_ms = exchange.parse_timeframe(timeframe) * 1000
+    now = exchange.milliseconds()
+    current_open = now - now % tf_ms
+    if since is None:
+        start = current_open - (limit - 1) * tf_ms
+    else:
+        start = since - since % tf_ms
+    end = min(start + (limit - 1) * tf_ms, current_open)
+
+    with connections.write() as conn:
+        init_candle_table(conn)
+        key = (exchange_type, symbol, timeframe)
+        stored = np.fromiter(
+            (row[0] for row in conn.execute(
+                "SELECT timestamp FROM ohlcv_candles WHERE exchange_type = ? AND symbol = ? AND timeframe = ? "
+                "AND timestamp BETWEEN ? AND ?", (*key, start, end))),
+            dtype=np.int64
+        )
+        grid = np.arange(start, end + 1, tf_ms, dtype=np.int64)
+        # The open candle is never stored, so it always shows up as missing
+        ranges = _missing_ranges(grid, stored)
+
+        live = []
+        for first_ts, last_ts in ranges:
+            fetched = _fetch_range(exchange, symbol, timeframe, first_ts, last_ts, tf_ms)
+            closed = [candle for candle in fetched if candle[0] + tf_ms <= now]
+            live.extend(candle for candle in fetched if candle[0] + tf_ms > now)
+            if closed:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO ohlcv_candles "
+                        "(exchange_type, symbol, timeframe, timestamp, open, high, low, close, volume) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(*key, *candle[:6]) for candle in closed]
+                    )
+
+        df = pd.read_sql_query(
+            "SELECT timestamp, open, high, low, close, volume FROM ohlcv_candles "
+            "WHERE exchange_type = ? AND symbol = ? AND timeframe = ? AND timestamp BETWEEN ? AND ? "
+            "ORDER BY timestamp",
+            conn, params=(*key, start, end),
+            dtype={'timestamp': 'int64', 'open': 'float64', 'high': 'float64',
+                   'low': 'float64', 'close': 'float64', 'volume': 'float64'}
+        )
+
+    if live:
+        live_df = pd.DataFrame([candle[:6] for candle in live], columns=OHLCV_COLUMNS).astype({'timestamp': 'int64'})
+        df = pd.concat([df, live_df], ignore_index=True)
+    return df
+
+
+def clear_candles(exchange_type=None, symbol=None, timeframe=None):
+    """Deletes stored candles, optionally only for one exchange type / symbol / timeframe."""
+    clauses, params = [], []
+    for column, value in (('exchange_type', exchange_type), ('symbol', symbol), ('timeframe', timeframe)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    with connections.write() as conn:
+        init_candle_table(conn)
+        with conn:
+            conn.execute(f"DELETE FROM ohlcv_candles{where}", params)
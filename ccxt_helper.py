@@ -1,49 +1,197 @@
 import ccxt
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
-def get_balance_in_usdt(exchange: ccxt.Exchange):
+import price_cache
+
+# Quote assets tried, in order, when an asset has no direct or inverse USDT pair
+BRIDGE_ASSETS = ('BTC', 'ETH', 'BNB')
+
+class PriceIndex:
+    """
+    USDT conversion rates for every asset reachable from one fetch_tickers()
+    snapshot, resolved once when the index is built:
+
+    1. USDT itself (rate 1)
+    2. direct ASSET/USDT
+    3. inverse USDT/ASSET
+    4. via a bridge asset B in BRIDGE_ASSETS: ASSET/B or B/ASSET, times B's own rate
+
+    Derivative tickers ('BTC/USDT:USDT') and tickers without a positive last
+    price are ignored.
+    """
+
+    def __init__(self, tickers: dict, quote='USDT', bridges=BRIDGE_ASSETS):
+        self.quote = quote
+        # (base, quote) -> last price, spot pairs only
+        pairs = {}
+        for symbol, ticker in tickers.items():
+            if ':' in symbol or '/' not in symbol:
+                continue
+            price = ticker.get('last') or ticker.get('close')
+            if price and price > 0:
+                base, pair_quote = symbol.split('/', 1)
+                pairs[(base, pair_quote)] = float(price)
+
+        def rate_to(asset, target):
+            # Direct pair first, then the inverse pair
+            if (asset, target) in pairs:
+                return pairs[(asset, target)]
+            if (target, asset) in pairs:
+                return 1.0 / pairs[(target, asset)]
+            return None
+
+        rates = {quote: (1.0, quote)}
+        bridge_rates = {bridge: rate_to(bridge, quote) for bridge in bridges}
+        for asset in {asset for pair in pairs for asset in pair}:
+            if asset in rates:
+                continue
+            rate = rate_to(asset, quote)
+            if rate is not None:
+                rates[asset] = (rate, f"{asset}->{quote}")
+                continue
+            for bridge in bridges:
+                if asset == bridge or bridge_rates[bridge] is None:
+                    continue
+                rate = rate_to(asset, bridge)
+                if rate is not None:
+                    rates[asset] = (rate * bridge_rates[bridge], f"{asset}->{bridge}->{quote}")
+                    break
+
+        self.prices = pd.Series({asset: rate for asset, (rate, _) in rates.items()}, dtype='float64')
+        self.paths = pd.Series({asset: path for asset, (_, path) in rates.items()}, dtype='object')
+
+    def value(self, assets: dict):
+        """
+        Values { 'ASSET': amount } in one vectorized pass.
+
+        Returns:
+            tuple: (total_usdt_value, breakdown) where breakdown is a DataFrame
+            indexed by asset with 'amount', 'price', 'usdt_value' and 'path'
+            columns; unresolvable assets have NaN price and value.
+        """
+        amounts = pd.Series(assets, dtype='float64')
+        breakdown = pd.DataFrame({
+            'amount': amounts,
+            'price': self.prices.reindex(amounts.index),
+            'path': self.paths.reindex(amounts.index),
+        })
+        breakdown['usdt_value'] = breakdown['amount'] * breakdown['price']
+        return float(np.nansum(breakdown['usdt_value'].to_numpy())), breakdown
+
+def fetch_non_zero_balance(exchange: ccxt.Exchange):
+    """
+    Fetches the account balance of an exchange.
+
+    Returns:
+        dict: { 'ASSET': total_amount } for every asset with a positive total.
+    """
+    # 'total' key in the balance dictionary gives you { 'ASSET': total_amount }
+    balance = exchange.fetch_balance()
+    return {
+        asset: amount
+        for asset, amount in balance['total'].items()
+        if amount and amount > 0
+    }
+
+def value_assets_in_usdt(assets: dict, tickers):
+    """
+    Converts { 'ASSET': amount } to USDT using a ticker snapshot from
+    fetch_tickers() or a PriceIndex already built from one.
+
+    Returns:
+        float: The summed USDT value of every asset a price was found for.
+    """
+    index = tickers if isinstance(tickers, PriceIndex) else PriceIndex(tickers)
+    total_usdt_value, breakdown = index.value(assets)
+    for asset in breakdown.index[breakdown['price'].isna()]:
+        print(f"Warning: Could not find price for {asset}. Skipping conversion for this asset.")
+    return total_usdt_value
+
+def get_balance_in_usdt(exchange: ccxt.Exchange, tickers: dict = None):
     """
     Fetches your Binance account balance and converts all assets to their
     USDT equivalent, returning the sum as a float.
 
     Args:
-        api_key (str): Your Binance API key.
-        api_secret (str): Your Binance API secret.
+        exchange (ccxt.Exchange): Authenticated exchange of the account to value.
+        tickers (dict): Optional ticker snapshot to price with; taken from the
+            shared price cache for the exchange's account type when not given.
 
     Returns:
         float: The total estimated value of your assets in USDT, or None if an error occurs.
     """
     total_usdt_value = 0
     try:
-        # Fetch account balance
-        # 'total' key in the balance dictionary gives you { 'ASSET': total_amount }
-        balance = exchange.fetch_balance()
-        non_zero_assets = {
-            asset: amount
-            for asset, amount in balance['total'].items()
-            if amount > 0
-        }
+        non_zero_assets = fetch_non_zero_balance(exchange)
 
         if not non_zero_assets:
             print("No assets found in your balance.")
 
-        # Fetch all tickers once to get current prices
-        tickers = exchange.fetch_tickers()
-
-        for asset, amount in non_zero_assets.items():
-            if asset == 'USDT':
-                usdt_equivalent = amount
-                total_usdt_value += usdt_equivalent
-            else:
-                pair_usdt = f"{asset}/USDT"
-                price = None
-                if pair_usdt in tickers:
-                    price = tickers[pair_usdt]['last']
-                if price:
-                    usdt_equivalent = amount * price
-                    total_usdt_value += usdt_equivalent
-                else:
-                    print(f"Warning: Could not find price for {asset}. Skipping conversion for this asset.")
+        # Fetch all tickers once to get current prices (shared with other callers for a few seconds)
+        if tickers is None:
+            tickers = price_cache.get_tickers(exchange, exchange.options.get('defaultType', 'spot'))
+
+        total_usdt_value = value_assets_in_usdt(non_zero_assets, tickers)
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
-    return total_usdt_value
\ No newline at end of file
+    return total_usdt_value
+
+def get_accounts_balance_in_usdt(exchanges: dict, price_exchange: ccxt.Exchange, max_workers=None):
+    """
+    Values several accounts at once. Every account's fetch_balance and a single
+    spot ticker snapshot (from the shared price cache, fetched on 'price_exchange'
+    only when stale) run concurrently, and that one ticker
+    snapshot prices all accounts, so wall-clock time is roughly that of the
+    slowest request instead of the sum of all of them.
+
+    Args:
+        exchanges (dict): { account_name: exchange }, e.g. one exchange per
+            account type ('spot', 'future', 'margin', ...) or sub-account.
+            Each exchange must be its own instance; they are used from worker threads.
+        price_exchange (ccxt.Exchange): Spot exchange used only for fetch_tickers
+            (not shared with 'exchanges' for the same reason).
+        max_workers (int): Thread pool size; defaults to one thread per request.
+
+    Returns:
+        tuple: (total_usdt_value, { account_name: usdt_value }, breakdown) where
+        breakdown is the PriceIndex.value() breakdown of every account with an
+        extra 'account' column. total_usdt_value is None if any request failed.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or len(exchanges) + 1) as pool:
+        tickers_future = pool.submit(price_cache.get_tickers, price_exchange, 'spot')
+        balance_futures = {
+            name: pool.submit(fetch_non_zero_balance, exchange)
+            for name, exchange in exchanges.items()
+        }
+
+        try:
+            tickers = tickers_future.result()
+        except Exception as e:
+            print(f"Error fetching tickers: {e}")
+            return None, {}, pd.DataFrame()
+        # Resolve conversion paths once for all accounts
+        index = PriceIndex(tickers)
+
+        account_values = {}
+        breakdowns = []
+        failed = False
+        for name, future in balance_futures.items():
+            try:
+                assets = future.result()
+            except Exception as e:
+                print(f"Error fetching balance for account '{name}': {e}")
+                failed = True
+                continue
+            account_values[name], breakdown = index.value(assets)
+            breakdowns.append(breakdown.assign(account=name))
+            for asset in breakdown.index[breakdown['price'].isna()]:
+                print(f"Warning: Could not find price for {asset} in account '{name}'. Skipping conversion for this asset.")
+
+    breakdown = pd.concat(breakdowns) if breakdowns else pd.DataFrame()
+    if failed:
+        # A partial total would show up as a drop in the balance history
+        return None, account_values, breakdown
+    return sum(account_values.values()), account_values, breakdown
@@ -0,0 +1,215 @@
+"""
+Plotly figures for the dashboard, sized for the screen rather than the data.
+
+Every series is decimated to roughly CHART_WIDTH_PX points before it is put
+in a figure: line series keep the first/min/max/last point of each pixel
+bucket (downsample.minmax_indices), and candles are merged into wider
+candles (open = first, high = max, low = min, close = last, volume = sum).
+Line traces switch to WebGL (Scattergl) above WEBGL_THRESHOLD points. The
+score is carried as customdata of the volume bars, so the kline chart has no
+extra hover-only trace. The score overview adds a sparkline grid and a
+correlation heatmap over the wide frames of db_manager.fetch_scores_wide.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from downsample import bucket_aggregate, minmax_indices
+from series_align import to_epoch_ms
+
+# Roughly the plot width in pixels; no series gets many more points than this
+CHART_WIDTH_PX = 2000
+# Line traces with more points than this are drawn with WebGL
+WEBGL_THRESHOLD = 1000
+# Points per sparkline; each one is only a few hundred pixels wide
+SPARKLINE_POINTS = 200
+
+
+def decimate_line(x, y, max_points=CHART_WIDTH_PX):
+    """
+    Min/max-per-bucket decimation of a sorted line series.
+
+    Returns:
+        tuple: (x, y) restricted to at most about 'max_points' points.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    if max_points is None or len(x) <= max_points:
+        return x, y
+    # minmax_indices keeps up to 4 points per bucket
+    idx = minmax_indices(to_epoch_ms(x), y, max(max_points // 4, 1))
+    return x[idx], y[idx]
+
+
+def line_trace(x, y, max_points=CHART_WIDTH_PX, **kwargs):
+    """Builds a Scatter (or, for many points, Scattergl) trace over the decimated series."""
+    x, y = decimate_line(x, y, max_points)
+    trace = go.Scattergl if len(x) > WEBGL_THRESHOLD else go.Scatter
+    return trace(x=x, y=y, **kwargs)
+
+
+def resample_candles(df, timeframe_ms, max_candles=CHART_WIDTH_PX):
+    """
+    Merges consecutive candles into wider ones so at most 'max_candles' remain.
+    'df' has a datetime index and open/high/low/close/volume columns, plus an
+    optional 'score' column (last score of each merged candle).
+
+    Returns:
+        pd.DataFrame: same columns, indexed by the open time of each merged candle.
+    """
+    if max_candles is None or len(df) <= max_candles:
+        return df
+    width = timeframe_ms * math.ceil(len(df) / max_candles)
+    ts = to_epoch_ms(df.index)
+    start = ts[0] - ts[0] % width
+
+    def aggregate(column):
+        return bucket_aggregate(ts, df[column].to_numpy(), start, width)
+
+    opens = aggregate('open')
+    merged = {
+        'open': opens['first'],
+        'high': aggregate('high')['max'],
+        'low': aggregate('low')['min'],
+        'close': aggregate('close')['last'],
+        'volume': aggregate('volume')['sum'],
+    }
+    if 'score' in df:
+        merged['score'] = aggregate('score')['last']
+    index = pd.to_datetime(start + opens['bucket'] * width, unit='ms')
+    return pd.DataFrame(merged, index=index)
+
+
+def build_balance_figure(balance_df, max_points=CHART_WIDTH_PX):
+    """Line chart of total_usdt_value over the UTC 'datetime' column."""
+    balance_df = balance_df.sort_values('timestamp')
+    many = len(balance_df) > WEBGL_THRESHOLD
+    fig = go.Figure(data=line_trace(
+        balance_df['datetime'].dt.tz_localize(None).to_numpy(), # The UTC datetime column, as naive UTC for numpy
+        balance_df['total_usdt_value'].to_numpy(),
+        max_points=max_points,
+        mode='lines' if many else 'lines+markers', # Markers only while they are still distinguishable
+        name='Total USDT Value',
+        line=dict(color='skyblue', width=2), # Styling the line
+        marker=dict(size=6, color='lightcoral', line=dict(width=1, color='DarkSlateGrey')) # Styling markers
+    ))
+
+    # Update layout for better readability and mobile responsiveness
+    fig.update_layout(
+        xaxis_title="Time (UTC)", # Explicitly label X-axis as UTC
+        yaxis_title="Total USDT Value",
+        hovermode="x unified", # Improves hover experience, especially on mobile
+        title=dict(
+            text="Account Balance History",
+            font=dict(size=20),
+            # x=0.5 # Center the title
+        ),
+        margin=dict(l=40, r=40, t=60, b=40), # Adjust margins
+        autosize=True, # Allow Plotly to automatically size the chart
+        height=500, # Set a default height, will scale with width due to autosize
+        template="plotly_dark" # Use a dark theme for aesthetics
+    )
+    return fig
+
+
+def build_kline_figure(df_klines, symbol, timeframe_ms, max_candles=CHART_WIDTH_PX):
+    """
+    Candlestick chart with volume bars on a secondary axis. The score (NaN
+    when missing) is shown in the unified hover through the volume bars'
+    customdata.
+    """
+    df = resample_candles(df_klines, timeframe_ms, max_candles)
+
+    # Create Candlestick chart
+    fig = go.Figure(data=[go.Candlestick(
+        x=df.index,
+        open=df['open'],
+        high=df['high'],
+        low=df['low'],
+        close=df['close'],
+        name='Candlesticks',
+    )])
+
+    # Add Volume bars, carrying the score for the hover label
+    score = df['score'].to_numpy(dtype=np.float64) if 'score' in df else np.full(len(df), np.nan)
+    score_text = np.where(np.isnan(score), 'N/A', np.char.mod('%.6f', score))
+    fig.add_trace(go.Bar(
+        x=df.index,
+        y=df['volume'],
+        name='Volume',
+        marker_color='rgba(0, 150, 0, 0.5)',  # Green for up, red for down (simple)
+        yaxis='y2', # Assign to secondary y-axis
+        customdata=score_text,
+        hovertemplate="Volume: %{y}<br><b>Score:</b> %{customdata}<extra></extra>",
+    ))
+
+    # Update layout for better appearance
+    fig.update_layout(
+        xaxis_rangeslider_visible=False, # Hide the default range slider for cleaner look
+        xaxis_title="Time",
+        yaxis_title="Price",
+        title=f"{symbol} K-line Chart",
+        hovermode="x unified",
+        height=600,
+        # Add secondary y-axis for volume
+        yaxis=dict(domain=[0.3, 1]), # Price axis occupies top 70%
+        yaxis2=dict(domain=[0, 0.25], anchor='x', overlaying='y', side='right', showgrid=False, title='Volume'), # Volume axis occupies bottom 25%
+        template="plotly_dark", # Or "plotly_white"
+    )
+    return fig
+
+
+def build_sparkline_grid(wide, columns=4, max_points=SPARKLINE_POINTS):
+    """
+    Grid of small line charts, one per column of a wide score frame
+    (db_manager.fetch_scores_wide), each decimated to about 'max_points'.
+    """
+    symbols = list(wide.columns)
+    rows = max(math.ceil(len(symbols) / columns), 1)
+    fig = make_subplots(rows=rows, cols=columns, subplot_titles=symbols,
+                        vertical_spacing=min(0.3 / rows, 0.08), horizontal_spacing=0.04)
+    x = wide.index.to_numpy()
+    for i, symbol in enumerate(symbols):
+        y = wide[symbol].to_numpy(dtype=np.float64)
+        present = ~np.isnan(y)
+        fig.add_trace(
+            line_trace(x[present], y[present], max_points=max_points, mode='lines',
+                       name=symbol, line=dict(color='skyblue', width=1)),
+            row=i // columns + 1, col=i % columns + 1
+        )
+
+    fig.update_xaxes(showticklabels=False, showgrid=False)
+    fig.update_yaxes(showticklabels=False, showgrid=False, zeroline=False)
+    fig.update_annotations(font_size=12) # The subplot titles
+    fig.update_layout(
+        showlegend=False,
+        height=110 * rows + 40,
+        margin=dict(l=10, r=10, t=30, b=10),
+        template="plotly_dark",
+    )
+    return fig
+
+
+def build_correlation_heatmap(corr):
+    """Heatmap of a symbols x symbols correlation frame (NaN cells are left blank)."""
+    text = np.where(np.isnan(corr.to_numpy()), '', np.char.mod('%.2f', np.nan_to_num(corr.to_numpy())))
+    fig = go.Figure(data=go.Heatmap(
+        z=corr.to_numpy(),
+        x=list(corr.columns),
+        y=list(corr.index),
+        zmin=-1, zmax=1,
+        colorscale='RdBu',
+        text=text,
+        texttemplate="%{text}" if len(corr) <= 20 else None, # Values only while they fit in the cells
+        hovertemplate="%{y} / %{x}: %{z:.3f}<extra></extra>",
+    ))
+    fig.update_layout(
+        title="Score Correlation",
+        yaxis=dict(autorange='reversed'), # First symbol at the top, like a table
+        height=max(400, 25 * len(corr) + 150),
+        template="plotly_dark",
+    )
+    return fig
@@ -1,17 +1,136 @@
+import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
 import pandas as pd
 
+import score_archive
+from downsample import lttb_indices
+
+DATABASE_FILE = 'scores.db'
+
+# PRAGMAs applied to every pooled connection. WAL lets readers carry on while
+# a batch is being written, and synchronous=NORMAL only fsyncs at checkpoints,
+# which is safe in WAL mode (a power loss can drop the last commits, never
+# corrupt the file).
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",     # negative means KiB, so ~64 MB of page cache
+    "PRAGMA mmap_size=268435456",   # map up to 256 MB of the file into memory
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+# Read-only connections can't change the journal mode; query_only guards
+# against a reader accidentally writing
+SQLITE_READ_PRAGMAS = tuple(p for p in SQLITE_PRAGMAS if 'journal_mode' not in p) + ("PRAGMA query_only=ON",)
+
+# Prepared statements kept per connection; pooled connections keep them warm
+CACHED_STATEMENTS = 256
+
+class ConnectionManager:
+    """
+    Thread-safe pools of tuned SQLite connections shared by every module of
+    the process: read-write connections for writers and read-only ones (opened
+    with mode=ro) for readers. Connections are created lazily, handed out to
+    one thread at a time and returned afterwards, so callers never pay for
+    connect + PRAGMA setup once the pools are warm.
+    """
+
+    def __init__(self, database, size=8):
+        self.database = database
+        self._idle = {False: queue.LifoQueue(maxsize=size), True: queue.LifoQueue(maxsize=size)}
+
+    def _connect(self, readonly):
+        if readonly:
+            if not os.path.exists(self.database):
+                # mode=ro can't create the file; let a writer create it (in WAL mode)
+                with self.write():
+                    pass
+            path = os.path.abspath(self.database)
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False,
+                                   cached_statements=CACHED_STATEMENTS)
+            pragmas = SQLITE_READ_PRAGMAS
+        else:
+            conn = sqlite3.connect(self.database, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+            pragmas = SQLITE_PRAGMAS
+        for pragma in pragmas:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def _connection(self, readonly):
+        idle = self._idle[readonly]
+        try:
+            conn = idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect(readonly)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def write(self):
+        """Context manager lending a pooled read-write connection; uncommitted work is rolled back on return."""
+        return self._connection(False)
+
+    def read(self):
+        """Context manager lending a pooled read-only connection."""
+        return self._connection(True)
+
+    def read_frame(self, sql, params=(), dtypes=None):
+        """
+        Runs a query on a read-only connection straight into pandas.
+
+        Returns:
+            pd.DataFrame: one column per selected column, cast to 'dtypes'
+            ({column: dtype}) so empty results keep the right types too.
+        """
+        with self.read() as conn:
+            return pd.read_sql_query(sql, conn, params=params, dtype=dtypes)
+
+    def read_arrays(self, sql, params=(), dtypes=()):
+        """
+        Runs a query on a read-only connection into a NumPy structured array,
+        without building a pandas frame or a Python list of rows.
+
+        Args:
+            dtypes: [(column name, numpy dtype), ...] matching the selected columns.
+
+        Returns:
+            numpy.ndarray: structured array, e.g. result['timestamp'].
+        """
+        with self.read() as conn:
+            return np.fromiter(conn.execute(sql, params), dtype=np.dtype(list(dtypes)))
+
+    def close(self):
+        """Closes all idle connections."""
+        for idle in self._idle.values():
+            while True:
+                try:
+                    idle.get_nowait().close()
+                except queue.Empty:
+                    break
+
+# Shared by score_server, the dashboard, the collector and the local stores
+connections = ConnectionManager(DATABASE_FILE)
+
 def fetch_symbols():
-    DATABASE_FILE = 'scores.db'
-    conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT symbol FROM scores")
-        rows = cursor.fetchall()
-        symbols = []
-        for row in rows:
-            symbols.append(row[0])
+        with connections.read() as conn:
+            symbols = [row[0] for row in conn.execute("SELECT DISTINCT symbol FROM scores")]
+        # Symbols whose scores have all been moved to the cold tier
+        for symbol in score_archive.archived_symbols():
+            if symbol not in symbols:
+                symbols.append(symbol)
         return symbols
     except sqlite3.Error as e:
         print(f"Database error: {e}")
@@ -19,23 +138,35 @@ def fetch_symbols():
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
 
-def fetch_scores(symbol: str):
-    DATABASE_FILE = 'scores.db'
-    conn = None
+def fetch_scores(symbol: str, start_ms=None, end_ms=None):
+    """
+    Loads the scores of a symbol, optionally limited to [start_ms, end_ms]
+    (inclusive, milliseconds). Rows moved to the Parquet archive by
+    score_archive are stitched in transparently; on a duplicate timestamp
+    the row still in SQLite wins.
+    """
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT symbol, timestamp, score FROM scores WHERE symbol = ? ORDER BY timestamp", (symbol,))
-        rows = cursor.fetchall()
-
-        scores = []
-        for row in rows:
-            scores.append([row[0], row[1], row[2]])
-        scores_df = pd.DataFrame(scores, columns=['symbol', 'timestamp', 'score'])
+        sql = "SELECT symbol, timestamp, score FROM scores WHERE symbol = ?"
+        params = [symbol]
+        if start_ms is not None:
+            sql += " AND timestamp >= ?"
+            params.append(start_ms)
+        if end_ms is not None:
+            sql += " AND timestamp <= ?"
+            params.append(end_ms)
+        scores_df = connections.read_frame(
+            sql + " ORDER BY timestamp", params,
+            dtypes={'symbol': 'object', 'timestamp': 'int64', 'score': 'float64'}
+        )
+
+        cold_df = score_archive.read_archived(symbol, start_ms, end_ms)
+        if not cold_df.empty:
+            cold_df.insert(0, 'symbol', symbol)
+            scores_df = pd.concat([cold_df, scores_df], ignore_index=True)
+            scores_df = scores_df.drop_duplicates('timestamp', keep='last')
+            scores_df = scores_df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
         scores_df['merge_key'] = pd.to_datetime(scores_df['timestamp'], unit='ms')
         scores_df['merge_key'] = scores_df['merge_key'].dt.floor('min')
         return scores_df
@@ -45,31 +176,136 @@ def fetch_scores(symbol: str):
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
-def fetch_balance_history():
+SCORE_ROW_DTYPES = [('symbol', object), ('timestamp', np.int64), ('score', np.float64)]
+
+def fetch_scores_wide(symbols=None, start_ms=None, end_ms=None, bucket_ms=60_000):
     """
-    Loads all balance snapshots from the SQLite database.
-    Converts the 'timestamp_ms' column to UTC-aware datetime objects.
+    Loads the scores of many symbols within [start_ms, end_ms] (inclusive,
+    milliseconds) with one query and pivots them into a wide frame: one
+    column per symbol, one row per 'bucket_ms' bucket holding the symbol's
+    last score in that bucket. Archived rows are stitched in as in
+    fetch_scores (SQLite wins on a duplicate timestamp).
+
+    Args:
+        symbols (list): Symbols to load; None means every known symbol.
+
+    Returns:
+        pd.DataFrame: float64 columns in 'symbols' order (NaN = no score in
+        that bucket), indexed by the bucket open time (naive UTC datetime),
+        or None on error.
+    """
+    try:
+        if symbols is None:
+            symbols = fetch_symbols()
+        symbols = list(symbols)
+        if not symbols:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name='timestamp'), dtype=np.float64)
+
+        sql = f"SELECT symbol, timestamp, score FROM scores WHERE symbol IN ({', '.join('?' * len(symbols))})"
+        params = list(symbols)
+        if start_ms is not None:
+            sql += " AND timestamp >= ?"
+            params.append(start_ms)
+        if end_ms is not None:
+            sql += " AND timestamp <= ?"
+            params.append(end_ms)
+        hot = connections.read_arrays(sql, params, SCORE_ROW_DTYPES)
+
+        codes = [pd.Categorical(hot['symbol'], categories=symbols).codes.astype(np.int64)]
+        timestamps, scores, tiers = [hot['timestamp']], [hot['score']], [np.ones(len(hot), np.int8)]
+        for code, symbol in enumerate(symbols):
+            cold = score_archive.read_archived(symbol, start_ms, end_ms)
+            if not cold.empty:
+                codes.append(np.full(len(cold), code, np.int64))
+                timestamps.append(cold['timestamp'].to_numpy(np.int64))
+                scores.append(cold['score'].to_numpy(np.float64))
+                tiers.append(np.zeros(len(cold), np.int8))
+        codes, timestamps, scores, tiers = (np.concatenate(a) for a in (codes, timestamps, scores, tiers))
+
+        # Sort by (symbol, timestamp, tier) so the last row of every
+        # (symbol, bucket) run is its latest score, the SQLite copy on a tie
+        order = np.lexsort((tiers, timestamps, codes))
+        codes, buckets, scores = codes[order], timestamps[order] // bucket_ms * bucket_ms, scores[order]
+        last = np.r_[(codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1]), True]
+        codes, buckets, scores = codes[last], buckets[last], scores[last]
+
+        grid = np.unique(buckets)
+        wide = np.full((len(grid), len(symbols)), np.nan)
+        wide[np.searchsorted(grid, buckets), codes] = scores
+        index = pd.DatetimeIndex(pd.to_datetime(grid, unit='ms'), name='timestamp')
+        return pd.DataFrame(wide, index=index, columns=symbols)
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return None
+
+# Process-wide copy of balance_snapshots (ascending by timestamp). Each call
+# only reads rows newer than the last cached timestamp and appends them.
+_balance_history = {'df': None, 'last_timestamp': None}
+_balance_history_lock = threading.Lock()
+
+def _read_balance_snapshots(conn, after=None):
+    sql = "SELECT id, timestamp, total_usdt_value FROM balance_snapshots"
+    params = []
+    if after is not None:
+        sql += " WHERE timestamp > ?"
+        params.append(after)
+    # Older collectors stored fractional milliseconds, so timestamps keep their
+    # stored type (casting would move the watermark below the last row)
+    df = pd.read_sql_query(sql + " ORDER BY timestamp", conn, params=params,
+                           dtype={'id': 'int64', 'total_usdt_value': 'float64'})
+    # Convert milliseconds timestamp (INTEGER) to UTC-aware datetime objects
+    df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
+    return df
+
+def _sync_balance_history(conn):
+    """Appends new snapshots to the cached frame, reloading it if rows were deleted or backfilled."""
+    cached = _balance_history['df']
+    if cached is not None:
+        new_rows = _read_balance_snapshots(conn, _balance_history['last_timestamp'])
+        if not new_rows.empty:
+            cached = pd.concat([cached, new_rows], ignore_index=True)
+        # Retention (downsample_old_snapshots) and backfills change the count
+        # without adding rows past the watermark
+        count = conn.execute("SELECT COUNT(*) FROM balance_snapshots").fetchone()[0]
+        if count != len(cached):
+            cached = None
+    if cached is None:
+        cached = _read_balance_snapshots(conn)
+    _balance_history['df'] = cached
+    if not cached.empty:
+        _balance_history['last_timestamp'] = cached['timestamp'].iloc[-1].item()
+    return cached
+
+def fetch_balance_history(start_ms=None, max_points=None):
+    """
+    Loads balance snapshots from the SQLite database through a process-wide
+    cache, so each call only reads the rows added since the previous one.
+
+    Args:
+        start_ms (int): Only return snapshots at or after this time (milliseconds).
+        max_points (int): Downsample the result to about this many points (LTTB
+            over total_usdt_value), keeping the chart cheap for long histories.
+
+    Returns:
+        pd.DataFrame: id, timestamp, total_usdt_value and a UTC-aware 'datetime'
+        column, latest first.
     """
-    DATABASE_FILE = 'scores.db'
-    conn = None # Initialize conn to None
     df = pd.DataFrame() # Initialize df as an empty DataFrame
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        # Fetch all records, ordered by timestamp (descending for latest first)
-        df = pd.read_sql_query("SELECT * FROM balance_snapshots ORDER BY timestamp DESC", conn)
+        with _balance_history_lock, connections.read() as conn:
+            df = _sync_balance_history(conn)
     except Exception as e:
        print(f"An unexpected error occurred while loading data: {e}")
-    finally:
-        if conn:
-            conn.close()
-
-    if not df.empty:
-        # Convert milliseconds timestamp (INTEGER) to UTC-aware datetime objects
-        # 'unit='ms'' tells pandas the integer is in milliseconds
-        # 'utc=True' makes the resulting datetime objects timezone-aware and set to UTC
-        df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
-    return df
\ No newline at end of file
+
+    if df.empty:
+        return df
+    if start_ms is not None:
+        df = df.iloc[df['timestamp'].searchsorted(start_ms, side='left'):]
+    if max_points is not None and len(df) > max_points:
+        df = df.iloc[lttb_indices(df['timestamp'].to_numpy(), df['total_usdt_value'].to_numpy(), max_points)]
+    # Latest first, as a new frame so callers can't modify the cache
+    return df.iloc[::-1].reset_index(drop=True)
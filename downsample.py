@@ -0,0 +1,105 @@
+import numpy as np
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Picks at most 'threshold' points from the (x, y) series that keep its visual
+    shape, always including the first and last point. 'x' must be sorted.
+    Thresholds below 3 leave the series untouched.
+
+    Returns:
+        numpy.ndarray: sorted int64 indices of the selected points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n, dtype=np.int64)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket edges over the points between the fixed first and last one
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point for the final bucket)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+
+        # Pick the point forming the largest triangle with the previous pick and that average
+        area = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_indices(x, y, buckets):
+    """
+    Min/max decimation for line charts: splits the x range into 'buckets'
+    equal-width buckets and keeps the first, minimum, maximum and last point
+    of each, so spikes survive however far the series is reduced. 'x' must be
+    sorted; NaN values are never picked as min/max.
+
+    Returns:
+        numpy.ndarray: sorted int64 indices of the selected points (at most
+        4 per bucket).
+    """
+    n = len(x)
+    if buckets < 1 or n <= 4 * buckets:
+        return np.arange(n, dtype=np.int64)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    width = (x[-1] - x[0]) / buckets or 1.0
+    bucket = np.minimum(((x - x[0]) // width).astype(np.int64), buckets - 1)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+
+    # Sorting by (bucket, y) puts each bucket's min first and max last;
+    # NaN sorts after every number, so fall back to the last non-NaN point
+    order = np.lexsort((y, bucket))
+    valid_ends = ends - np.add.reduceat(np.isnan(y[order]), starts)
+    picks = np.concatenate([starts, ends, order[starts], order[np.maximum(valid_ends, starts)]])
+    return np.unique(picks).astype(np.int64)
+
+
+def bucket_aggregate(timestamps, values, start, bucket_ms):
+    """
+    Aggregates a time-sorted series into fixed-width buckets starting at 'start'.
+
+    Returns:
+        dict of numpy arrays, one entry per non-empty bucket: 'bucket' (index),
+        'count', 'first', 'min', 'max', 'sum', 'mean', 'last' and 'last_timestamp'.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    buckets = (timestamps - start) // bucket_ms
+    if len(buckets) == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return {"bucket": np.empty(0, dtype=np.int64), "count": np.empty(0, dtype=np.int64),
+                "first": empty, "min": empty, "max": empty, "sum": empty, "mean": empty, "last": empty,
+                "last_timestamp": np.empty(0, dtype=np.int64)}
+    # Sorted input means each bucket is one contiguous run
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    counts = ends - starts + 1
+    sums = np.add.reduceat(values, starts)
+    return {
+        "bucket": buckets[starts],
+        "count": counts,
+        "first": values[starts],
+        "min": np.minimum.reduceat(values, starts),
+        "max": np.maximum.reduceat(values, starts),
+        "sum": sums,
+        "mean": sums / counts,
+        "last": values[ends],
+        "last_timestamp": timestamps[ends],
+    }
@@ -0,0 +1,149 @@
+"""
+Process-wide factory for CCXT Binance exchanges.
+
+get_exchange() returns one shared instance per (account type, API key, role)
+instead of a new one per call. Market metadata is persisted under
+MARKETS_CACHE_DIR, and a new instance is seeded from that file, so a cold
+start only re-downloads markets once the file is older than
+MARKETS_REFRESH_SECONDS. The server time difference (normally measured inside
+load_markets because of 'adjustForTimeDifference') is persisted next to the
+markets and re-measured every TIME_DIFFERENCE_REFRESH_SECONDS.
+
+CCXT instances are not thread-safe (nonces, rate limiter, markets). Code that
+may run on several threads at once - e.g. two Streamlit sessions - uses
+locked_exchange(), which holds a per-instance lock for as long as the caller
+uses the exchange. Callers that should run in parallel with each other, like
+the dashboard's trades and klines loaders, pass different 'role's and so get
+instances (and locks) of their own.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import ccxt
+
+MARKETS_CACHE_DIR = os.getenv('MARKETS_CACHE_DIR', 'exchange_cache')
+MARKETS_REFRESH_SECONDS = float(os.getenv('MARKETS_REFRESH_SECONDS', str(6 * 60 * 60)))
+TIME_DIFFERENCE_REFRESH_SECONDS = float(os.getenv('TIME_DIFFERENCE_REFRESH_SECONDS', str(60 * 60)))
+
+_exchanges = {}
+_exchanges_lock = threading.Lock()
+_instance_locks = {} # (type, api_key) -> RLock serialising calls on that instance
+
+
+def _cache_path(type):
+    return os.path.join(MARKETS_CACHE_DIR, f"binance-{type}.json")
+
+
+def _read_cache(type):
+    try:
+        with open(_cache_path(type)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(type, cache):
+    os.makedirs(MARKETS_CACHE_DIR, exist_ok=True)
+    path = _cache_path(type)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+
+def _load_markets(exchange, type):
+    """Seeds an exchange's markets and time difference from disk, refreshing whatever is stale."""
+    now = time.time()
+    cache = _read_cache(type) or {}
+    changed = False
+
+    if cache.get('markets') and now - cache.get('markets_saved_at', 0) < MARKETS_REFRESH_SECONDS:
+        exchange.set_markets(cache['markets'], cache.get('currencies'))
+    else:
+        try:
+            exchange.load_markets(reload=True)
+            cache.update(markets=exchange.markets, currencies=exchange.currencies, markets_saved_at=now)
+            # load_markets measured the time difference as well
+            cache.update(time_difference=exchange.options.get('timeDifference', 0), time_difference_saved_at=now)
+            changed = True
+        except Exception as e:
+            if not cache.get('markets'):
+                raise
+            print(f"Error refreshing {type} markets, using the cached copy: {e}")
+            exchange.set_markets(cache['markets'], cache.get('currencies'))
+
+    if exchange.options.get('adjustForTimeDifference') and not changed:
+        if 'time_difference' in cache and now - cache.get('time_difference_saved_at', 0) < TIME_DIFFERENCE_REFRESH_SECONDS:
+            exchange.options['timeDifference'] = cache['time_difference']
+        else:
+            exchange.load_time_difference()
+            cache.update(time_difference=exchange.options.get('timeDifference', 0), time_difference_saved_at=now)
+            changed = True
+
+    if changed:
+        _write_cache(type, cache)
+
+
+def get_exchange(type, api_key=None, api_secret=None, role=None):
+    """
+    Returns the shared CCXT Binance exchange for an account type, creating it
+    (with markets loaded) on first use.
+
+    Args:
+        type (str): spot, margin, future or delivery.
+        api_key (str), api_secret (str): Credentials; leave out for an
+            unauthenticated instance that can only call public endpoints.
+        role (str): Name of the caller's workload; each role gets a separate
+            instance, so different roles never wait for each other's lock.
+
+    Returns:
+        ccxt.binance: The exchange instance. It is shared with every other
+        caller; use locked_exchange() instead where other threads may be
+        using it at the same time.
+    """
+    key = (type, api_key, role)
+    with _exchanges_lock:
+        exchange, loaded_at = _exchanges.get(key, (None, 0))
+        instance_lock = _instance_locks.setdefault(key, threading.RLock())
+        refresh = False
+        if exchange is not None and time.time() - loaded_at >= min(MARKETS_REFRESH_SECONDS, TIME_DIFFERENCE_REFRESH_SECONDS):
+            # Long-running processes pick up refreshed markets / time difference
+            # too. Claimed here so only one caller refreshes; done below, under
+            # the instance lock and not the factory's, so calls in flight finish first.
+            _exchanges[key] = (exchange, time.time())
+            refresh = True
+        elif exchange is None:
+            config = {
+                'enableRateLimit': True,
+                'options': {
+                    'defaultType': type,  # spot, margin, future, delivery
+                    'adjustForTimeDifference': True,
+                }
+            }
+            if api_key:
+                config.update(apiKey=api_key, secret=api_secret)
+            exchange = ccxt.binance(config)
+            _load_markets(exchange, type)
+            _exchanges[key] = (exchange, time.time())
+    if refresh:
+        with instance_lock:
+            _load_markets(exchange, type)
+    return exchange
+
+
+@contextmanager
+def locked_exchange(type, api_key=None, api_secret=None, role=None):
+    """
+    Context manager yielding the shared exchange (see get_exchange) while
+    holding its instance lock, so concurrent callers of the same role take
+    turns instead of interleaving requests on one CCXT instance. The lock is
+    reentrant.
+    """
+    exchange = get_exchange(type, api_key, api_secret, role)
+    with _exchanges_lock:
+        instance_lock = _instance_locks.setdefault((type, api_key, role), threading.RLock())
+    with instance_lock:
+        yield exchange
@@ -1,4 +1,3 @@
-import ccxt
 import os
 import sqlite3
 import datetime
@@ -8,8 +7,9 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
 from dotenv import load_dotenv
-from db_manager import fetch_symbols, fetch_scores
-from ccxt_helper import get_balance_in_usdt
+from db_manager import fetch_symbols, fetch_scores, connections
+from ccxt_helper import get_accounts_balance_in_usdt
+import exchange_factory
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,6 +18,13 @@ load_dotenv()
 API_KEY = os.getenv("API_KEY")
 API_SECRET = os.getenv("API_SECRET")
 
+# Comma-separated account types to value, e.g. "spot,future,margin,delivery"
+BALANCE_ACCOUNT_TYPES = [t.strip() for t in os.getenv("BALANCE_ACCOUNT_TYPES", "spot,future").split(",") if t.strip()]
+# Minutes between collections; e.g. 1 for minute-level snapshots while actively trading
+BALANCE_COLLECTION_INTERVAL_MINUTES = float(os.getenv("BALANCE_COLLECTION_INTERVAL_MINUTES", "60"))
+# Snapshots older than this are thinned out to the last one of every hour
+BALANCE_FULL_RESOLUTION_DAYS = float(os.getenv("BALANCE_FULL_RESOLUTION_DAYS", "7"))
+HOUR_MS = 60 * 60 * 1000
 
 DATABASE_FILE = "scores.db"
 
@@ -34,52 +41,104 @@ def initialize_db():
                 total_usdt_value REAL NOT NULL
             )
         """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_balance_snapshots_timestamp ON balance_snapshots (timestamp)")
+        # One row per asset and account of every collection
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS balance_asset_snapshots (
+                timestamp INTEGER NOT NULL,
+                account_type TEXT NOT NULL,
+                asset TEXT NOT NULL,
+                amount REAL NOT NULL,
+                price REAL, -- USDT per unit, NULL if no conversion path was found
+                value REAL, -- amount * price
+                PRIMARY KEY (timestamp, account_type, asset)
+            ) WITHOUT ROWID
+        """)
         conn.commit()
         conn.close()
         print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Database '{DATABASE_FILE}' initialized.")
     except Exception as e:
         print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error initializing database: {e}")
 
-def save_balance_to_db(timestamp, total_usdt_value):
-    """Saves the balance snapshot to the database."""
+def save_balance_to_db(timestamp, total_usdt_value, breakdown=None):
+    """
+    Saves the balance snapshot to the database, together with its per-asset
+    breakdown (as returned by get_binance_balance_breakdown) in the same transaction.
+    """
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO balance_snapshots (timestamp, total_usdt_value) VALUES (?, ?)",
-                       (timestamp, total_usdt_value))
-        conn.commit()
-        conn.close()
+        with connections.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO balance_snapshots (timestamp, total_usdt_value) VALUES (?, ?)",
+                           (timestamp, total_usdt_value))
+            if breakdown is not None and not breakdown.empty:
+                # NaN prices (unresolved assets) are stored as NULL
+                rows = breakdown[['account', 'amount', 'price', 'usdt_value']].astype(object)
+                rows = rows.where(rows.notna(), None)
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO balance_asset_snapshots (timestamp, account_type, asset, amount, price, value) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(timestamp, account, asset, amount, price, value)
+                     for asset, account, amount, price, value in rows.itertuples(name=None)]
+                )
+            conn.commit()
         print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Saved: {timestamp} - {total_usdt_value:.2f} USDT to DB.")
     except Exception as e:
         print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error saving balance to DB: {e}")
 
 def get_exchange(type):
-    """Initializes and returns the CCXT Binance exchange object."""
-    exchange = ccxt.binance(
-        {
-            'apiKey': API_KEY,
-            'secret': API_SECRET,
-            'enableRateLimit': True,
-            'options': {
-                'defaultType': type,  # spot, margin, future, delivery
-                'adjustForTimeDifference': True,
-            }
-        }
-    )
-    return exchange
+    """Returns the shared CCXT Binance exchange object (markets cached on disk by exchange_factory)."""
+    return exchange_factory.get_exchange(type, API_KEY, API_SECRET)
 
 # --- Binance Balance Fetching Function ---
-def get_binance_total_usdt_balance_combined():
+def get_binance_balance_breakdown(account_types=None):
+    """
+    Fetches balances from every account type in BALANCE_ACCOUNT_TYPES (Spot and
+    USD-M Futures by default) concurrently and converts all assets to their USDT
+    equivalent with one shared spot ticker snapshot. Prices come from a
+    separate public spot exchange so no instance is used by two threads at once.
+
+    Returns:
+        tuple: (total_usdt_value, breakdown) where total_usdt_value is None if
+        any account could not be fetched and breakdown has one row per asset
+        and account ('account', 'amount', 'price', 'usdt_value', indexed by asset).
     """
-    Fetches balances from both Binance Spot and USD-M Futures accounts,
-    converts all assets to their USDT equivalent, and returns the total sum as a float.
+    account_types = account_types or BALANCE_ACCOUNT_TYPES
+    exchanges = {type: get_exchange(type) for type in account_types}
+    total_usdt_value, account_values, breakdown = get_accounts_balance_in_usdt(exchanges, exchange_factory.get_exchange('spot'))
+    for type, value in account_values.items():
+        print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {type}: {value:.2f} USDT")
+
+    return total_usdt_value, breakdown
+
+def get_binance_total_usdt_balance_combined(account_types=None):
+    """
+    Returns the combined USDT value of all accounts as a float, or None if any
+    account could not be fetched.
     """
-    total_usdt_value = 0
-    for type in ['spot', 'future']:
-        exchange = get_exchange(type)
-        total_usdt_value += get_balance_in_usdt(exchange)
+    return get_binance_balance_breakdown(account_types)[0]
 
-    return total_usdt_value
+# --- Retention ---
+def downsample_old_snapshots(full_resolution_days=BALANCE_FULL_RESOLUTION_DAYS):
+    """
+    Thins out snapshots older than 'full_resolution_days' to the last snapshot
+    of every hour, in both the total and the per-asset table. Hourly data is
+    left as it is, so this is safe to run repeatedly.
+    """
+    cutoff = int(time.time() * 1000 - full_resolution_days * 24 * HOUR_MS)
+    try:
+        with connections.write() as conn, conn:
+            deleted = 0
+            for table in ('balance_snapshots', 'balance_asset_snapshots'):
+                # CAST because rows from older collectors have REAL timestamps
+                deleted += conn.execute(f"""
+                    DELETE FROM {table}
+                    WHERE timestamp < ? AND timestamp NOT IN (
+                        SELECT MAX(timestamp) FROM {table} WHERE timestamp < ? GROUP BY CAST(timestamp / ? AS INTEGER)
+                    )
+                """, (cutoff, cutoff, HOUR_MS)).rowcount
+        print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Downsampled snapshots older than {full_resolution_days} days ({deleted} rows removed).")
+    except Exception as e:
+        print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error downsampling old snapshots: {e}")
 
 # --- Main Scheduled Task ---
 def collect_and_save_balance():
@@ -87,11 +146,11 @@ def collect_and_save_balance():
     The task to be scheduled: fetches balance and saves it to the database.
     """
     print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Starting balance collection...")
-    current_time = datetime.datetime.utcnow().timestamp() * 1000
-    total_balance = get_binance_total_usdt_balance_combined()
+    current_time = int(datetime.datetime.utcnow().timestamp() * 1000)
+    total_balance, breakdown = get_binance_balance_breakdown()
 
     if total_balance is not None:
-        save_balance_to_db(current_time, total_balance)
+        save_balance_to_db(current_time, total_balance, breakdown)
     else:
         print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Failed to get balance at {current_time}. Not saving to DB.")
     print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Balance collection finished.")
@@ -105,16 +164,26 @@ if __name__ == "__main__":
 
     # Set up the scheduler
     scheduler = BackgroundScheduler()
-    # Add the job to run every 1 hour
+    # Add the job to run every BALANCE_COLLECTION_INTERVAL_MINUTES (1 hour by default)
     scheduler.add_job(
         collect_and_save_balance,
-        trigger=IntervalTrigger(hours=1),
+        trigger=IntervalTrigger(minutes=BALANCE_COLLECTION_INTERVAL_MINUTES),
         id='binance_balance_job',
-        name='Binance Hourly Balance Collection',
-        replace_existing=True # Ensures only one instance of this job runs
+        name='Binance Balance Collection',
+        replace_existing=True, # Ensures only one instance of this job runs
+        max_instances=1,
+        coalesce=True # A slow collection must not queue up a burst of catch-up runs
+    )
+    # Thin out old high-frequency snapshots once an hour
+    scheduler.add_job(
+        downsample_old_snapshots,
+        trigger=IntervalTrigger(hours=1),
+        id='binance_balance_retention_job',
+        name='Binance Balance Snapshot Retention',
+        replace_existing=True
     )
 
-    print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Scheduler started. Next collection in 1 hour.")
+    print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Scheduler started. Next collection in {BALANCE_COLLECTION_INTERVAL_MINUTES:g} minutes.")
     print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] The first collection will run shortly after startup.")
 
     # Run the first collection immediately
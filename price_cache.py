@@ -0,0 +1,149 @@
+"""
+Shared TTL cache of fetch_tickers() snapshots.
+
+Snapshots are cached per exchange type at two levels:
+
+- in process, where a lock per exchange type makes concurrent callers wait
+  for the one fetch already in flight instead of starting their own;
+- in the 'price_snapshots' table of scores.db, so the collector, the
+  dashboard and the score server processes reuse each other's fresh prices.
+
+A snapshot of the whole ticker universe is fresh for PRICE_TTL_SECONDS.
+Callers that only need a few symbols pass them in, and only the ones that are
+missing or stale are fetched (fetch_tickers(symbols) is a much lighter call).
+Two processes that both find the table stale may still fetch concurrently.
+"""
+import json
+import os
+import threading
+import time
+
+from db_manager import connections
+
+PRICE_TTL_SECONDS = float(os.getenv('PRICE_TTL_SECONDS', '30'))
+
+# exchange_type -> {'full_at': ms or None, 'tickers': {symbol: (fetched_at_ms, ticker)}}
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+_fetch_locks = {}
+
+
+def init_price_tables(conn):
+    """Creates the price_snapshots tables if they don't exist."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS price_snapshots (
+            exchange_type TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            fetched_at INTEGER NOT NULL, -- milliseconds since epoch
+            ticker TEXT NOT NULL, -- ccxt ticker as JSON, without the raw 'info'
+            PRIMARY KEY (exchange_type, symbol)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS price_snapshot_fetches (
+            exchange_type TEXT PRIMARY KEY,
+            full_fetched_at INTEGER NOT NULL -- last time the whole universe was fetched
+        )
+    ''')
+
+
+def _fetch_lock(exchange_type):
+    with _snapshots_lock:
+        return _fetch_locks.setdefault(exchange_type, threading.Lock())
+
+
+def _entry(exchange_type):
+    with _snapshots_lock:
+        return _snapshots.setdefault(exchange_type, {'full_at': None, 'tickers': {}})
+
+
+def _load_shared(conn, exchange_type, entry, since_ms, symbols=None):
+    """Merges rows fetched by any process since 'since_ms' into the in-process entry."""
+    sql = "SELECT symbol, fetched_at, ticker FROM price_snapshots WHERE exchange_type = ? AND fetched_at >= ?"
+    params = [exchange_type, since_ms]
+    if symbols is not None:
+        sql += f" AND symbol IN ({', '.join('?' * len(symbols))})"
+        params.extend(symbols)
+    for symbol, fetched_at, ticker in conn.execute(sql, params):
+        cached = entry['tickers'].get(symbol)
+        if cached is None or cached[0] < fetched_at:
+            entry['tickers'][symbol] = (fetched_at, json.loads(ticker))
+
+
+def _store(conn, exchange_type, entry, tickers, fetched_at, full):
+    rows = []
+    for symbol, ticker in tickers.items():
+        ticker = {key: value for key, value in ticker.items() if key != 'info'}
+        entry['tickers'][symbol] = (fetched_at, ticker)
+        rows.append((exchange_type, symbol, fetched_at, json.dumps(ticker)))
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO price_snapshots (exchange_type, symbol, fetched_at, ticker) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        if full:
+            conn.execute(
+                "INSERT OR REPLACE INTO price_snapshot_fetches (exchange_type, full_fetched_at) VALUES (?, ?)",
+                (exchange_type, fetched_at)
+            )
+    if full:
+        entry['full_at'] = fetched_at
+
+
+def get_tickers(exchange, exchange_type, symbols=None, ttl=PRICE_TTL_SECONDS):
+    """
+    Returns fetch_tickers()-style tickers for an exchange type that are at most
+    'ttl' seconds old, fetching from 'exchange' only when neither this process
+    nor the shared table has them.
+
+    Args:
+        symbols (list): Only return (and, if needed, fetch) these symbols;
+            None means the whole ticker universe.
+
+    Returns:
+        dict: { symbol: ticker } (tickers carry no 'info').
+    """
+    with _fetch_lock(exchange_type):
+        entry = _entry(exchange_type)
+        now = int(time.time() * 1000)
+        fresh_since = now - int(ttl * 1000)
+
+        def fresh(symbol):
+            cached = entry['tickers'].get(symbol)
+            return cached is not None and cached[0] >= fresh_since
+
+        if symbols is None:
+            if entry['full_at'] is not None and entry['full_at'] >= fresh_since:
+                return {symbol: ticker for symbol, (_, ticker) in entry['tickers'].items()}
+        elif all(fresh(symbol) for symbol in symbols):
+            return {symbol: entry['tickers'][symbol][1] for symbol in symbols}
+
+        with connections.write() as conn:
+            init_price_tables(conn)
+            if symbols is None:
+                row = conn.execute(
+                    "SELECT full_fetched_at FROM price_snapshot_fetches WHERE exchange_type = ?", (exchange_type,)
+                ).fetchone()
+                if row and row[0] >= fresh_since:
+                    # Another process fetched the universe recently
+                    _load_shared(conn, exchange_type, entry, row[0])
+                    entry['full_at'] = row[0]
+                else:
+                    _store(conn, exchange_type, entry, exchange.fetch_tickers(), now, full=True)
+                return {symbol: ticker for symbol, (_, ticker) in entry['tickers'].items()}
+
+            missing = [symbol for symbol in symbols if not fresh(symbol)]
+            _load_shared(conn, exchange_type, entry, fresh_since, missing)
+            missing = [symbol for symbol in missing if not fresh(symbol)]
+            if missing:
+                _store(conn, exchange_type, entry, exchange.fetch_tickers(missing), now, full=False)
+        return {symbol: entry['tickers'][symbol][1] for symbol in symbols if symbol in entry['tickers']}
+
+
+def clear(exchange_type=None):
+    """Drops the in-process snapshots (the shared table simply ages out)."""
+    with _snapshots_lock:
+        if exchange_type is None:
+            _snapshots.clear()
+        else:
+            _snapshots.pop(exchange_type, None)
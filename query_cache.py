@@ -0,0 +1,217 @@
+"""
+Process-wide cache of dashboard queries, shared by every Streamlit session.
+
+Entries are keyed by (source, symbol, ...) - e.g. ('klines', 'BTCUSDT',
+'future', '1m', 1440, None) - and live for the TTL of their source
+(QUERY_CACHE_TTLS). The cache is an LRU bounded by the estimated memory of
+the cached values (QUERY_CACHE_MAX_MB). Concurrent misses on the same key are
+coalesced: the first caller runs the loader and the others wait for its
+result, so N viewers of one symbol cause one exchange / DB fetch.
+
+Invalidation:
+- invalidate(source, symbol) drops entries of this process;
+- a source can have a validator, a cheap token checked on every hit. The
+  'scores' and 'scores_wide' sources use the versions in score_symbols,
+  which score_server bumps on every write (and drops on a delete), so the
+  dashboard process sees ingests from the score server process without
+  waiting for the TTL.
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from db_manager import connections
+
+# Seconds an entry of each source stays fresh. Klines include the open
+# candle and trades the latest fills, so they expire quickly; scores are
+# validated against score_symbols on every hit and can live longer.
+QUERY_CACHE_TTLS = {
+    'trades': 30,
+    'klines': 10,
+    'scores': 300,
+    'scores_wide': 60,
+    'balance': 60,
+}
+DEFAULT_TTL_SECONDS = 30
+QUERY_CACHE_MAX_MB = float(os.getenv('QUERY_CACHE_MAX_MB', '256'))
+
+
+def estimate_size(value):
+    """Approximate memory footprint of a cached value in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+def _copy(value):
+    # Callers may modify what they get back (set_index(inplace=True), ...)
+    return value.copy() if isinstance(value, (pd.DataFrame, pd.Series)) else value
+
+
+class QueryCache:
+    """
+    Thread-safe, size-bounded LRU of query results with per-source TTLs,
+    single-flight loading and optional per-source validators.
+    """
+
+    def __init__(self, max_bytes, ttls=None, default_ttl=DEFAULT_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict() # key -> (value, size, expires_at, token)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {} # key -> lock held while its loader runs
+        self._validators = {}
+        self._counters = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0, 'invalidations': 0}
+
+    def set_validator(self, source, validator):
+        """
+        Registers validator(key) for a source. It returns a token (e.g. a
+        version number) that is stored with each entry; a hit whose token no
+        longer matches is treated as a miss.
+        """
+        self._validators[source] = validator
+
+    def _lookup(self, key, token, now):
+        # Caller holds self._lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, expires_at, entry_token = entry
+        if expires_at <= now or entry_token != token:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _drop(self, key):
+        # Caller holds self._lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _store(self, key, value, ttl, token):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return # Would evict everything else and still not fit
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (value, size, time.monotonic() + ttl, token)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._counters['evictions'] += 1
+
+    def get(self, source, key, loader, ttl=None):
+        """
+        Returns the cached result of loader() for (source, *key), calling it
+        at most once at a time per key. 'key' starts with the symbol (None for
+        symbol-less queries) so entries can be invalidated per symbol.
+        Results that are None or raise are not cached.
+
+        Returns:
+            The loader's result (DataFrames are copied, so callers may modify them).
+        """
+        full_key = (source,) + tuple(key)
+        ttl = self.ttls.get(source, self.default_ttl) if ttl is None else ttl
+        validator = self._validators.get(source)
+        # Taken before loading, so a write during the load leaves a stale token behind
+        token = validator(tuple(key)) if validator else None
+
+        with self._lock:
+            entry = self._lookup(full_key, token, time.monotonic())
+            if entry is not None:
+                self._counters['hits'] += 1
+                return _copy(entry[0])
+            load_lock = self._loading.setdefault(full_key, threading.Lock())
+
+        with load_lock:
+            # Whoever held the lock before us may have just loaded it
+            with self._lock:
+                entry = self._lookup(full_key, token, time.monotonic())
+                if entry is not None:
+                    self._counters['coalesced'] += 1
+                    return _copy(entry[0])
+                self._counters['misses'] += 1
+            try:
+                value = loader()
+                if value is not None:
+                    self._store(full_key, value, ttl, token)
+                return _copy(value)
+            finally:
+                with self._lock:
+                    if self._loading.get(full_key) is load_lock:
+                        del self._loading[full_key]
+
+    def invalidate(self, source=None, symbol=None):
+        """
+        Drops every entry of 'source' (all sources if None) for 'symbol'
+        (all symbols if None).
+
+        Returns:
+            int: number of entries dropped.
+        """
+        with self._lock:
+            keys = [key for key in self._entries
+                    if (source is None or key[0] == source)
+                    and (symbol is None or (len(key) > 1 and key[1] == symbol))]
+            for key in keys:
+                self._drop(key)
+            self._counters['invalidations'] += len(keys)
+            return len(keys)
+
+    def stats(self):
+        """Returns the entry count, estimated bytes held and hit/miss/eviction counters."""
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+def score_version(key):
+    """Validator of the 'scores' source: the symbol's write version in score_symbols (0 if unknown)."""
+    try:
+        with connections.read() as conn:
+            row = conn.execute("SELECT version FROM score_symbols WHERE symbol = ?", (key[0],)).fetchone()
+        return row[0] if row else 0
+    except sqlite3.Error:
+        # score_server hasn't created the table yet
+        return 0
+
+
+def scores_wide_version(key):
+    """
+    Validator of the 'scores_wide' source, keyed (None, symbols, ...): the
+    versions of those symbols, or a summary of every symbol's version when
+    'symbols' is empty (all symbols).
+    """
+    symbols = tuple(key[1]) if len(key) > 1 and key[1] else ()
+    try:
+        with connections.read() as conn:
+            if symbols:
+                return tuple(conn.execute(
+                    f"SELECT symbol, version FROM score_symbols WHERE symbol IN ({','.join('?' * len(symbols))})"
+                    " ORDER BY symbol",
+                    symbols
+                ).fetchall())
+            # A delete drops a row, a write bumps a version
+            return conn.execute("SELECT COUNT(*), SUM(version), MAX(updated_at) FROM score_symbols").fetchone()
+    except sqlite3.Error:
+        return 0
+
+
+# Shared by every session of the dashboard process
+cache = QueryCache(int(QUERY_CACHE_MAX_MB * 1024 * 1024), QUERY_CACHE_TTLS)
+cache.set_validator('scores', score_version)
+cache.set_validator('scores_wide', scores_wide_version)
@@ -0,0 +1,385 @@
+"""
+Rolling analytics of each symbol's scores, maintained at ingest time.
+
+Every symbol has a running state in 'score_analytics_state': one EMA per span
+in ANALYTICS_EMA_SPANS and, per window in ANALYTICS_WINDOWS (a number of
+scores), the scores in the window with their running mean and sum of squared
+deviations (Welford's update, extended to drop the oldest score as the window
+slides). Each new score updates that state in O(1), and the derived metrics
+of the point are stored as JSON in 'score_analytics':
+
+    ema_<span>, mean_<window>, std_<window>, zscore_<window>, count
+
+Rolling metrics stay null until their window is full (like
+pandas' rolling(window)); std is the sample standard deviation.
+
+The ingest path calls update_analytics() inside its own transaction. Scores
+newer than the symbol's last analysed timestamp are simply appended. A batch
+that reaches back in time (a backfill, or INSERT OR REPLACE overwriting an
+existing score) has to replay every score from its earliest timestamp on,
+starting from a state rebuilt from the stored metrics of the previous point
+and the last scores before it. Replays of up to ANALYTICS_INLINE_REPLAY
+points besides the batch run right there; longer ones would hold the write lock for seconds,
+so the symbol is only marked dirty from that timestamp in
+'score_analytics_dirty' and replay_dirty(), run by a background thread of the
+score server, catches it up ANALYTICS_REPLAY_CHUNK points per transaction.
+Until then the symbol's metrics from 'dirty_from' on are stale and new
+scores are left to the replay as well. Windows are rebuilt from the
+'scores' table only, so a replay reaching into archived ranges starts with
+short windows.
+
+Run `python score_analytics.py [--symbol SYMBOL]` to rebuild the tables from
+raw scores, e.g. after changing the windows or upgrading an existing database.
+"""
+import argparse
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+DATABASE_FILE = 'scores.db'
+
+# Rolling windows, in number of scores, and EMA spans (alpha = 2 / (span + 1))
+ANALYTICS_WINDOWS = tuple(int(w) for w in os.getenv('SCORE_ANALYTICS_WINDOWS', '20,100').split(','))
+ANALYTICS_EMA_SPANS = tuple(int(s) for s in os.getenv('SCORE_ANALYTICS_EMA_SPANS', '12,26').split(','))
+# Longest replay done inside an ingest transaction, and points replayed per
+# background transaction; both keep the write lock well under busy_timeout
+ANALYTICS_INLINE_REPLAY = int(os.getenv('SCORE_ANALYTICS_INLINE_REPLAY', '2000'))
+ANALYTICS_REPLAY_CHUNK = int(os.getenv('SCORE_ANALYTICS_REPLAY_CHUNK', '10000'))
+
+
+def init_analytics_tables(cursor):
+    """Creates the score_analytics tables if they don't exist."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS score_analytics (
+            symbol TEXT NOT NULL,
+            timestamp INTEGER NOT NULL, -- milliseconds since epoch, same as the score
+            metrics TEXT NOT NULL, -- JSON object of the derived metrics at this point
+            PRIMARY KEY (symbol, timestamp)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS score_analytics_state (
+            symbol TEXT PRIMARY KEY,
+            last_timestamp INTEGER NOT NULL, -- newest analysed score
+            state TEXT NOT NULL -- JSON of SymbolAnalytics.to_state()
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS score_analytics_dirty (
+            symbol TEXT PRIMARY KEY,
+            dirty_from INTEGER NOT NULL -- metrics from this timestamp on await replay_dirty()
+        )
+    ''')
+
+
+class RollingWindow:
+    """Mean and variance of the last 'size' values, updated in O(1) per value."""
+
+    def __init__(self, size, values=()):
+        self.size = size
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0 # Sum of squared deviations from the mean
+        for value in values:
+            self.push(value)
+
+    def push(self, value):
+        self.values.append(value)
+        n = len(self.values)
+        delta = value - self.mean
+        self.mean += delta / n
+        self.m2 += delta * (value - self.mean)
+        if n > self.size:
+            # Welford's update run backwards for the value leaving the window
+            oldest = self.values.popleft()
+            n -= 1
+            delta = oldest - self.mean
+            self.mean -= delta / n
+            self.m2 -= delta * (oldest - self.mean)
+        # Rounding can leave a tiny negative sum for a constant window
+        self.m2 = max(self.m2, 0.0)
+
+    def full(self):
+        return len(self.values) >= self.size
+
+    def std(self):
+        n = len(self.values)
+        return math.sqrt(self.m2 / (n - 1)) if n > 1 else None
+
+
+class SymbolAnalytics:
+    """Running EMAs and rolling windows of one symbol."""
+
+    def __init__(self, windows=ANALYTICS_WINDOWS, spans=ANALYTICS_EMA_SPANS):
+        self.windows = {size: RollingWindow(size) for size in windows}
+        self.emas = {span: None for span in spans}
+        self.count = 0
+
+    def update(self, score):
+        """
+        Adds the next score (in timestamp order).
+
+        Returns:
+            dict: the metrics at this point (None where not defined yet).
+        """
+        self.count += 1
+        metrics = {'count': self.count}
+        for span, ema in self.emas.items():
+            ema = score if ema is None else ema + 2.0 / (span + 1) * (score - ema)
+            self.emas[span] = ema
+            metrics[f'ema_{span}'] = ema
+        for size, window in self.windows.items():
+            window.push(score)
+            mean = std = zscore = None
+            if window.full():
+                mean, std = window.mean, window.std()
+                zscore = (score - mean) / std if std else None
+            metrics[f'mean_{size}'] = mean
+            metrics[f'std_{size}'] = std
+            metrics[f'zscore_{size}'] = zscore
+        return metrics
+
+    def to_state(self):
+        return {
+            'count': self.count,
+            'emas': {str(span): ema for span, ema in self.emas.items()},
+            'windows': {str(size): list(window.values) for size, window in self.windows.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state, windows=ANALYTICS_WINDOWS, spans=ANALYTICS_EMA_SPANS):
+        """Restores a saved state; windows or spans missing from it (new configuration) start empty."""
+        analytics = cls(windows, spans)
+        analytics.count = state.get('count', 0)
+        for span in analytics.emas:
+            analytics.emas[span] = state.get('emas', {}).get(str(span))
+        for size in analytics.windows:
+            values = state.get('windows', {}).get(str(size), [])
+            analytics.windows[size] = RollingWindow(size, values[-size:])
+        return analytics
+
+
+def _scores_from(conn, symbol, start=None, limit=-1):
+    """A symbol's (timestamp, score) rows from 'start' on (all of them if None), oldest first, at most 'limit'."""
+    if start is None:
+        return conn.execute(
+            "SELECT timestamp, score FROM scores WHERE symbol = ? ORDER BY timestamp LIMIT ?", (symbol, limit)
+        )
+    return conn.execute(
+        "SELECT timestamp, score FROM scores WHERE symbol = ? AND timestamp >= ? ORDER BY timestamp LIMIT ?",
+        (symbol, start, limit)
+    )
+
+
+def _state_before(conn, symbol, timestamp):
+    """
+    Rebuilds a symbol's analytics as they were just before 'timestamp', or
+    returns None if no point before it has been analysed.
+    """
+    previous = conn.execute(
+        "SELECT metrics FROM score_analytics WHERE symbol = ? AND timestamp < ? ORDER BY timestamp DESC LIMIT 1",
+        (symbol, timestamp)
+    ).fetchone()
+    if previous is None:
+        return None
+    analytics = SymbolAnalytics()
+    metrics = json.loads(previous[0])
+    analytics.count = metrics.get('count', 0)
+    for span in analytics.emas:
+        analytics.emas[span] = metrics.get(f'ema_{span}')
+    longest = max(analytics.windows, default=0)
+    recent = [row[0] for row in conn.execute(
+        "SELECT score FROM scores WHERE symbol = ? AND timestamp < ? ORDER BY timestamp DESC LIMIT ?",
+        (symbol, timestamp, longest)
+    )][::-1]
+    for size in analytics.windows:
+        analytics.windows[size] = RollingWindow(size, recent[-size:])
+    return analytics
+
+
+def _analyse(conn, symbol, analytics, points):
+    """Runs the (timestamp, score) points through 'analytics' and stores the metrics and the new state."""
+    metric_rows = []
+    metrics = None
+    for timestamp, score in points:
+        metrics = analytics.update(score)
+        metric_rows.append((symbol, timestamp, json.dumps(metrics)))
+    if not metric_rows:
+        return
+    conn.executemany(
+        "INSERT OR REPLACE INTO score_analytics (symbol, timestamp, metrics) VALUES (?, ?, ?)",
+        metric_rows
+    )
+    state = dict(analytics.to_state(), metrics=metrics)
+    conn.execute(
+        "INSERT OR REPLACE INTO score_analytics_state (symbol, last_timestamp, state) VALUES (?, ?, ?)",
+        (symbol, metric_rows[-1][1], json.dumps(state))
+    )
+
+
+def _dirty_from(conn, symbol):
+    row = conn.execute("SELECT dirty_from FROM score_analytics_dirty WHERE symbol = ?", (symbol,)).fetchone()
+    return row[0] if row else None
+
+
+def _mark_dirty(conn, symbol, timestamp):
+    """Leaves the symbol's metrics from 'timestamp' on to replay_dirty() (keeping an earlier mark)."""
+    conn.execute(
+        """
+        INSERT INTO score_analytics_dirty (symbol, dirty_from) VALUES (?, ?)
+        ON CONFLICT(symbol) DO UPDATE SET dirty_from = MIN(dirty_from, excluded.dirty_from)
+        """,
+        (symbol, timestamp)
+    )
+
+
+def update_analytics(conn, rows):
+    """
+    Updates the analytics of every symbol in 'rows' ((symbol, timestamp, score)
+    tuples already written to 'scores'). Must run inside the ingest transaction.
+    Replays that would rewrite more than ANALYTICS_INLINE_REPLAY points
+    besides the batch's own are deferred to replay_dirty().
+    """
+    by_symbol = {}
+    for symbol, timestamp, score in rows:
+        # A later row for the same timestamp replaced the earlier one in 'scores'
+        by_symbol.setdefault(symbol, {})[timestamp] = score
+
+    for symbol, points in by_symbol.items():
+        earliest = min(points)
+        if _dirty_from(conn, symbol) is not None:
+            # A replay is pending; it will cover these scores too
+            _mark_dirty(conn, symbol, earliest)
+            continue
+        saved = conn.execute(
+            "SELECT last_timestamp, state FROM score_analytics_state WHERE symbol = ?", (symbol,)
+        ).fetchone()
+        if saved is not None and earliest > saved[0]:
+            # The usual case: the batch only appends to the series
+            analytics = SymbolAnalytics.from_state(json.loads(saved[1]))
+            _analyse(conn, symbol, analytics, sorted(points.items()))
+            continue
+        # Out of order or replaced: replay everything from the earliest change
+        analytics = _state_before(conn, symbol, earliest)
+        if analytics is None:
+            # Nothing analysed before it (a new symbol, or scores stored
+            # before analytics existed): start from the first score
+            analytics, earliest = SymbolAnalytics(), None
+        # The batch's own points are analysed inline either way; bound the rest
+        bound = len(points) + ANALYTICS_INLINE_REPLAY
+        replay = _scores_from(conn, symbol, earliest, bound + 1).fetchall()
+        if len(replay) <= bound:
+            _analyse(conn, symbol, analytics, replay)
+        else:
+            _mark_dirty(conn, symbol, replay[0][0])
+
+
+def replay_dirty(conn, chunk_size=ANALYTICS_REPLAY_CHUNK):
+    """
+    Replays the next 'chunk_size' points of every symbol marked dirty, one
+    symbol per transaction, and moves its mark past them (or clears it once
+    the replay reached the newest score). A write that lands during the
+    replay can only move the mark back, so catching up is always safe.
+
+    Returns:
+        int: number of symbols still dirty afterwards.
+    """
+    symbols = [row[0] for row in conn.execute("SELECT symbol FROM score_analytics_dirty").fetchall()]
+    for symbol in symbols:
+        # Take the write lock up front: the mark must not move between reading it and replaying
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            start = _dirty_from(conn, symbol)
+            if start is not None:
+                analytics = _state_before(conn, symbol, start)
+                if analytics is None:
+                    analytics, start = SymbolAnalytics(), None
+                points = _scores_from(conn, symbol, start, chunk_size + 1).fetchall()
+                _analyse(conn, symbol, analytics, points[:chunk_size])
+                if len(points) > chunk_size:
+                    conn.execute(
+                        "UPDATE score_analytics_dirty SET dirty_from = ? WHERE symbol = ?", (points[chunk_size][0], symbol)
+                    )
+                else:
+                    conn.execute("DELETE FROM score_analytics_dirty WHERE symbol = ?", (symbol,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return conn.execute("SELECT COUNT(*) FROM score_analytics_dirty").fetchone()[0]
+
+
+def start_replayer(connect, interval=1.0):
+    """
+    Starts a daemon thread that runs replay_dirty() on a connection from
+    'connect' (a context manager factory such as connections.write), pausing
+    'interval' seconds whenever no symbol is left dirty.
+    """
+    def run():
+        while True:
+            try:
+                with connect() as conn:
+                    pending = replay_dirty(conn)
+            except sqlite3.Error as e:
+                print(f"Analytics replay error: {e}")
+                pending = 0
+            if not pending:
+                time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='score-analytics-replayer', daemon=True)
+    thread.start()
+    return thread
+
+
+def delete_analytics(conn, symbol):
+    """Drops the analytics of a symbol, e.g. when its scores are deleted."""
+    conn.execute("DELETE FROM score_analytics WHERE symbol = ?", (symbol,))
+    conn.execute("DELETE FROM score_analytics_state WHERE symbol = ?", (symbol,))
+    conn.execute("DELETE FROM score_analytics_dirty WHERE symbol = ?", (symbol,))
+
+
+def latest_analytics(conn, symbol):
+    """
+    Returns the metrics of the newest analysed score without touching the
+    per-point table, or None if the symbol has no analytics.
+
+    Returns:
+        dict: {'timestamp': ms, 'metrics': {...}, 'stale_from': ms or None},
+        'stale_from' being where a pending replay starts (see replay_dirty).
+    """
+    saved = conn.execute(
+        "SELECT last_timestamp, state FROM score_analytics_state WHERE symbol = ?", (symbol,)
+    ).fetchone()
+    if saved is None:
+        return None
+    return {'timestamp': saved[0], 'metrics': json.loads(saved[1]).get('metrics'),
+            'stale_from': _dirty_from(conn, symbol)}
+
+
+def rebuild_analytics(conn, symbol=None):
+    """Recomputes the analytics of one symbol (or of all symbols) from raw scores."""
+    with conn:
+        symbols = [symbol] if symbol else [row[0] for row in conn.execute("SELECT DISTINCT symbol FROM scores")]
+        for name in symbols:
+            delete_analytics(conn, name)
+            _analyse(conn, name, SymbolAnalytics(), _scores_from(conn, name).fetchall())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild score analytics tables from raw scores.")
+    parser.add_argument('--symbol', help="only rebuild this symbol (default: all symbols)")
+    parser.add_argument('--database', default=DATABASE_FILE)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database)
+    try:
+        init_analytics_tables(conn.cursor())
+        rebuild_analytics(conn, args.symbol)
+        count = conn.execute("SELECT COUNT(*) FROM score_analytics").fetchone()[0]
+        print(f"Rebuilt analytics for {args.symbol or 'all symbols'}; score_analytics now has {count} rows.")
+    finally:
+        conn.close()
@@ -0,0 +1,273 @@
+"""
+Cold tier for old scores.
+
+Scores older than a configurable age are moved out of the 'scores' table into
+Parquet files partitioned by symbol and month:
+
+    score_archive/<symbol>/<YYYY-MM>/part-<written_at_ms>-<n>.parquet
+
+Every archive run appends a new part file to the partitions it touches and
+only then deletes the rows from SQLite, so a crash in between leaves the rows
+in both tiers rather than in neither. Readers merge the tiers and let the
+SQLite row win on a duplicate timestamp. compact() later merges the parts of a
+partition into one file and drops duplicates.
+
+Rollups in score_rollups are left in place, so bucketed reads keep covering
+archived ranges without touching Parquet. Each run records the newest
+archived timestamp in score_symbols.archived_max_timestamp; rollup buckets
+up to it are recomputed from both tiers (see score_rollups).
+
+Run `python score_archive.py --max-age-days 30 [--compact]` from cron.
+"""
+import argparse
+import glob
+import heapq
+import os
+import shutil
+import sqlite3
+import time
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+DATABASE_FILE = 'scores.db'
+ARCHIVE_DIR = 'score_archive'
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def _symbol_dir(symbol, archive_dir=ARCHIVE_DIR):
+    # Symbols like 'BTC/USDT:USDT' are not valid directory names as they are
+    return os.path.join(archive_dir, quote(symbol, safe=''))
+
+
+def _month_start_ms(month):
+    return int(pd.Timestamp(f"{month}-01", tz='UTC').value // 1_000_000)
+
+
+def _month_end_ms(month):
+    return int((pd.Timestamp(f"{month}-01", tz='UTC') + pd.offsets.MonthBegin(1)).value // 1_000_000) - 1
+
+
+def archived_symbols(archive_dir=ARCHIVE_DIR):
+    """Returns the symbols that have at least one archived partition."""
+    if not os.path.isdir(archive_dir):
+        return []
+    return sorted(unquote(name) for name in os.listdir(archive_dir)
+                  if os.path.isdir(os.path.join(archive_dir, name)))
+
+
+def partition_files(symbol, start=None, end=None, archive_dir=ARCHIVE_DIR):
+    """
+    Lists the Parquet part files of a symbol whose month overlaps [start, end]
+    (inclusive ms, either may be None), ordered by month then write order.
+    """
+    base = _symbol_dir(symbol, archive_dir)
+    if not os.path.isdir(base):
+        return []
+    files = []
+    for month in sorted(os.listdir(base)):
+        if start is not None and _month_end_ms(month) < start:
+            continue
+        if end is not None and _month_start_ms(month) > end:
+            continue
+        files.extend(sorted(glob.glob(os.path.join(base, month, 'part-*.parquet'))))
+    return files
+
+
+def archived_months(symbol, archive_dir=ARCHIVE_DIR):
+    """Returns the (start_ms, end_ms) bounds of every archived month of a symbol, oldest first."""
+    base = _symbol_dir(symbol, archive_dir)
+    if not os.path.isdir(base):
+        return []
+    return [(_month_start_ms(month), _month_end_ms(month)) for month in sorted(os.listdir(base))]
+
+
+def delete_archived(symbol, archive_dir=ARCHIVE_DIR):
+    """
+    Removes every archived partition of a symbol.
+
+    Returns:
+        int: number of archived rows removed.
+    """
+    count = archived_row_count(symbol, archive_dir)
+    base = _symbol_dir(symbol, archive_dir)
+    if os.path.isdir(base):
+        shutil.rmtree(base)
+    return count
+
+
+def archive_signature(symbol, archive_dir=ARCHIVE_DIR):
+    """Cheap fingerprint of a symbol's cold tier (changes whenever a part is written or compacted)."""
+    return [os.path.relpath(path, archive_dir) for path in partition_files(symbol, archive_dir=archive_dir)]
+
+
+def archived_row_count(symbol, archive_dir=ARCHIVE_DIR):
+    """
+    Number of archived rows of a symbol, read from the Parquet footers only.
+    Can overcount timestamps that were archived twice until compact() runs.
+    """
+    import pyarrow.parquet as pq
+
+    return sum(pq.ParquetFile(path).metadata.num_rows for path in partition_files(symbol, archive_dir=archive_dir))
+
+
+def archived_bounds(symbol, archive_dir=ARCHIVE_DIR):
+    """Returns (min_timestamp, max_timestamp) of a symbol's cold tier, or None if it has none."""
+    files = partition_files(symbol, archive_dir=archive_dir)
+    if not files:
+        return None
+    base = _symbol_dir(symbol, archive_dir)
+    first_month = os.path.relpath(files[0], base).split(os.sep)[0]
+    last_month = os.path.relpath(files[-1], base).split(os.sep)[0]
+    first = read_archived(symbol, _month_start_ms(first_month), _month_end_ms(first_month), archive_dir)
+    last = read_archived(symbol, _month_start_ms(last_month), _month_end_ms(last_month), archive_dir)
+    return int(first['timestamp'].iloc[0]), int(last['timestamp'].iloc[-1])
+
+
+def read_archived(symbol, start=None, end=None, archive_dir=ARCHIVE_DIR):
+    """
+    Reads archived scores of a symbol within [start, end] (inclusive ms).
+
+    Returns:
+        pd.DataFrame: int64 'timestamp' and float64 'score', sorted by timestamp,
+        keeping the most recently written value for a repeated timestamp.
+    """
+    frames = []
+    for path in partition_files(symbol, start, end, archive_dir):
+        frame = pd.read_parquet(path, columns=['timestamp', 'score'])
+        if start is not None:
+            frame = frame[frame['timestamp'] >= start]
+        if end is not None:
+            frame = frame[frame['timestamp'] <= end]
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame({'timestamp': np.empty(0, np.int64), 'score': np.empty(0, np.float64)})
+    # Later parts were written later, so keep='last' prefers the newest copy
+    df = pd.concat(frames, ignore_index=True)
+    df = df.drop_duplicates('timestamp', keep='last').sort_values('timestamp', kind='stable')
+    return df.reset_index(drop=True)
+
+
+def merge_tiers(symbol, cold, hot_rows):
+    """
+    Merges archived rows with an iterable of hot (symbol, timestamp, score)
+    rows, both sorted by timestamp, into one sorted iterator of row tuples.
+    On equal timestamps the hot row wins.
+    """
+    cold_rows = ((symbol, ts, score) for ts, score in zip(cold['timestamp'].tolist(), cold['score'].tolist()))
+    merged = heapq.merge(
+        ((row[1], 0, row) for row in hot_rows),
+        ((row[1], 1, row) for row in cold_rows),
+    )
+    last_ts = None
+    for ts, _, row in merged:
+        if ts != last_ts:
+            yield row
+            last_ts = ts
+
+
+def _write_part(symbol, month, frame, archive_dir, sequence):
+    directory = os.path.join(_symbol_dir(symbol, archive_dir), month)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"part-{int(time.time() * 1000)}-{sequence:04d}.parquet")
+    tmp_path = path + '.tmp'
+    frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def archive_scores(conn, max_age_days, now_ms=None, archive_dir=ARCHIVE_DIR):
+    """
+    Moves scores older than 'max_age_days' from SQLite into the Parquet archive,
+    one symbol at a time.
+
+    Returns:
+        int: number of rows moved.
+    """
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    cutoff = now_ms - int(max_age_days * DAY_MS)
+    symbols = [row[0] for row in conn.execute(
+        "SELECT DISTINCT symbol FROM scores WHERE timestamp < ?", (cutoff,)
+    )]
+
+    moved = 0
+    for symbol in symbols:
+        # Hold the write lock from the read to the delete so a score written
+        # in between cannot be deleted without having been archived.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            df = pd.read_sql_query(
+                "SELECT timestamp, score FROM scores WHERE symbol = ? AND timestamp < ? ORDER BY timestamp",
+                conn, params=(symbol, cutoff), dtype={'timestamp': 'int64', 'score': 'float64'}
+            )
+            months = pd.to_datetime(df['timestamp'], unit='ms', utc=True).dt.strftime('%Y-%m')
+            for sequence, (month, frame) in enumerate(df.groupby(months, sort=True)):
+                _write_part(symbol, month, frame.reset_index(drop=True), archive_dir, sequence)
+            deleted = conn.execute("DELETE FROM scores WHERE symbol = ? AND timestamp < ?", (symbol, cutoff)).rowcount
+            if deleted:
+                archived_max = int(df['timestamp'].max())
+                try:
+                    # The rows only change tier, so score_symbols.row_count stays;
+                    # the rollups need to know which buckets reach into the archive
+                    conn.execute(
+                        """
+                        UPDATE score_symbols SET archived_max_timestamp = MAX(COALESCE(archived_max_timestamp, ?), ?)
+                        WHERE symbol = ?
+                        """,
+                        (archived_max, archived_max, symbol)
+                    )
+                except sqlite3.OperationalError:
+                    pass # Columns not created yet; score_server fills them in when it adds them
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        moved += len(df)
+        print(f"Archived {len(df)} scores for '{symbol}' older than {cutoff}.")
+    return moved
+
+
+def compact(symbol=None, min_parts=2, archive_dir=ARCHIVE_DIR):
+    """
+    Merges every partition with at least 'min_parts' part files into a single
+    file, dropping duplicate timestamps (newest write wins).
+
+    Returns:
+        int: number of partitions compacted.
+    """
+    compacted = 0
+    for name in ([symbol] if symbol else archived_symbols(archive_dir)):
+        base = _symbol_dir(name, archive_dir)
+        if not os.path.isdir(base):
+            continue
+        for month in sorted(os.listdir(base)):
+            parts = sorted(glob.glob(os.path.join(base, month, 'part-*.parquet')))
+            if len(parts) < min_parts:
+                continue
+            df = pd.concat([pd.read_parquet(path) for path in parts], ignore_index=True)
+            df = df.drop_duplicates('timestamp', keep='last').sort_values('timestamp', kind='stable')
+            _write_part(name, month, df.reset_index(drop=True), archive_dir, 0)
+            for path in parts:
+                os.remove(path)
+            compacted += 1
+    return compacted
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Move old scores from SQLite into the Parquet archive.")
+    parser.add_argument('--max-age-days', type=float, required=True,
+                        help="archive scores older than this many days")
+    parser.add_argument('--compact', action='store_true', help="merge small partitions afterwards")
+    parser.add_argument('--database', default=DATABASE_FILE)
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database, timeout=30)
+    try:
+        moved = archive_scores(conn, args.max_age_days, archive_dir=args.archive_dir)
+        print(f"Moved {moved} scores to '{args.archive_dir}'.")
+        if args.compact:
+            print(f"Compacted {compact(archive_dir=args.archive_dir)} partitions.")
+    finally:
+        conn.close()
@@ -0,0 +1,310 @@
+"""
+In-process hot cache of the most recent scores of each symbol.
+
+Each cached symbol gets a ScoreRing: preallocated int64 timestamp and float64
+score arrays of SCORE_CACHE_POINTS entries used as a ring buffer, kept in
+timestamp order. A ring also knows from which timestamp on it is complete
+('complete_from'): it holds every score of the symbol at or after that
+timestamp (None = the symbol's whole history). Reads whose lower bound is
+covered are answered from the ring without touching SQLite.
+
+- Rings are loaded lazily, on the first read of a symbol, with one indexed
+  query for its newest scores. Symbols without any scores in SQLite get no
+  ring, so lookups of unknown symbols can't evict the hot ones.
+- Every ring remembers the symbol's score_symbols.version it reflects, and
+  each read checks it against the table first (one primary-key lookup). A
+  ring that another process wrote past (or deleted) is reloaded, so the body
+  always matches the version the score server's ETag is built from.
+- The ingest path writes every committed batch through to the cached rings.
+  Scores newer than a ring's newest are appended in bulk; older ones
+  (backfills, INSERT OR REPLACE of an existing timestamp) are replaced or
+  inserted in place, or ignored when they fall before 'complete_from'.
+- A full ring drops its oldest score, and with SCORE_CACHE_HOURS scores more
+  than that many hours older than the newest one are dropped too; either
+  way 'complete_from' moves forward.
+- At most SCORE_CACHE_MAX_SYMBOLS rings are kept (least recently used
+  evicted first), so memory is bounded by
+  SCORE_CACHE_MAX_SYMBOLS * SCORE_CACHE_POINTS * 16 bytes. stats() reports it.
+
+Writers hold writing() around their transaction and write_through(), and
+loads take the same lock, so a ring never misses a batch committed by this
+process while it was being loaded; writes of other processes are caught by
+the version check. Set SCORE_CACHE_POINTS=0 to turn the cache off.
+"""
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import score_archive
+from db_manager import connections
+
+SCORE_CACHE_POINTS = int(os.getenv('SCORE_CACHE_POINTS', '10000'))
+SCORE_CACHE_HOURS = float(os.getenv('SCORE_CACHE_HOURS', '0')) or None
+SCORE_CACHE_MAX_SYMBOLS = int(os.getenv('SCORE_CACHE_MAX_SYMBOLS', '256'))
+HOUR_MS = 60 * 60 * 1000
+
+
+class ScoreRing:
+    """Fixed-capacity, timestamp-ordered ring buffer of one symbol's scores."""
+
+    def __init__(self, capacity, horizon_ms=None):
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        self.scores = np.empty(capacity, dtype=np.float64)
+        self.horizon_ms = horizon_ms
+        self.start = 0 # Physical index of the oldest score
+        self.size = 0
+        self.complete_from = None
+        self.version = None # score_symbols.version of the symbol the ring reflects
+
+    @property
+    def capacity(self):
+        return len(self.timestamps)
+
+    def _positions(self, first=0, stop=None):
+        """Physical indices of the logical range [first, stop)."""
+        stop = self.size if stop is None else stop
+        return (self.start + np.arange(first, stop)) % self.capacity
+
+    def search(self, timestamp, side='left'):
+        """Logical index where 'timestamp' would be inserted (numpy.searchsorted over the ring)."""
+        end = self.start + self.size
+        older = self.timestamps[self.start:min(end, self.capacity)]
+        index = int(np.searchsorted(older, timestamp, side))
+        if index == len(older) and end > self.capacity:
+            # Past the wrapped-around part, which holds the newer scores
+            index += int(np.searchsorted(self.timestamps[:end - self.capacity], timestamp, side))
+        return index
+
+    def newest(self):
+        return int(self.timestamps[(self.start + self.size - 1) % self.capacity]) if self.size else None
+
+    def covers(self, lower):
+        """True if every score at or after 'lower' (None = all of them) is in the ring."""
+        if self.complete_from is None:
+            return True
+        return lower is not None and lower >= self.complete_from
+
+    def _drop_oldest(self, count):
+        if count <= 0:
+            return
+        self.start = (self.start + count) % self.capacity
+        self.size -= count
+        # Everything from the new oldest score on is still here
+        first = int(self.timestamps[self.start]) if self.size else None
+        if first is not None:
+            self.complete_from = first if self.complete_from is None else max(self.complete_from, first)
+
+    def _trim_horizon(self):
+        if self.horizon_ms is None or not self.size:
+            return
+        cutoff = self.newest() - self.horizon_ms
+        self._drop_oldest(self.search(cutoff, 'left'))
+        if self.complete_from is None or self.complete_from < cutoff:
+            self.complete_from = cutoff
+
+    def append(self, timestamps, scores):
+        """Appends scores newer than the newest one (sorted, unique timestamps)."""
+        if len(timestamps) > self.capacity:
+            # Only the newest 'capacity' survive; the ring stays complete from the first kept one
+            self.complete_from = int(timestamps[-self.capacity])
+            timestamps, scores = timestamps[-self.capacity:], scores[-self.capacity:]
+        overflow = self.size + len(timestamps) - self.capacity
+        if overflow > 0:
+            self._drop_oldest(overflow)
+        positions = (self.start + self.size + np.arange(len(timestamps))) % self.capacity
+        self.timestamps[positions] = timestamps
+        self.scores[positions] = scores
+        self.size += len(timestamps)
+        self._trim_horizon()
+
+    def upsert(self, timestamp, score):
+        """Stores one score that is not newer than the newest one (replace or insert in place)."""
+        if not self.covers(timestamp):
+            return # Before the cached range; SQLite has it
+        index = self.search(timestamp, 'left')
+        if index < self.size:
+            position = (self.start + index) % self.capacity
+            if self.timestamps[position] == timestamp:
+                self.scores[position] = score
+                return
+        # A backfilled score in the middle: re-lay the ring out in order with it inserted
+        positions = self._positions()
+        timestamps = np.insert(self.timestamps[positions], index, timestamp)
+        scores = np.insert(self.scores[positions], index, score)
+        self.start, self.size = 0, 0
+        complete_from = self.complete_from
+        self.append(timestamps, scores)
+        if complete_from is not None and (self.complete_from is None or self.complete_from < complete_from):
+            self.complete_from = complete_from
+
+    def range(self, lower=None, upper=None):
+        """
+        Returns:
+            tuple: (timestamps, scores) copies of the cached scores within
+            [lower, upper] (inclusive, either may be None), oldest first.
+        """
+        first = 0 if lower is None else self.search(lower, 'left')
+        stop = self.size if upper is None else self.search(upper, 'right')
+        positions = self._positions(first, max(stop, first))
+        return self.timestamps[positions], self.scores[positions]
+
+    def nbytes(self):
+        return self.timestamps.nbytes + self.scores.nbytes
+
+
+class ScoreCache:
+    """LRU of ScoreRings, one per recently read symbol."""
+
+    def __init__(self, points=SCORE_CACHE_POINTS, horizon_hours=SCORE_CACHE_HOURS,
+                 max_symbols=SCORE_CACHE_MAX_SYMBOLS):
+        self.points = points
+        self.horizon_ms = None if horizon_hours is None else int(horizon_hours * HOUR_MS)
+        self.max_symbols = max_symbols
+        self._rings = OrderedDict()
+        self._lock = threading.Lock() # Guards the rings themselves
+        self._write_lock = threading.RLock() # Serialises writers and loads
+        self._counters = {'hits': 0, 'misses': 0, 'loads': 0, 'evictions': 0, 'stale': 0}
+
+    @property
+    def enabled(self):
+        return self.points > 0 and self.max_symbols > 0
+
+    def writing(self):
+        """Lock to hold around a scores transaction and the write_through() that follows it."""
+        return self._write_lock
+
+    @staticmethod
+    def _version(symbol):
+        """The symbol's current write version in score_symbols (0 if it has none)."""
+        try:
+            with connections.read() as conn:
+                row = conn.execute("SELECT version FROM score_symbols WHERE symbol = ?", (symbol,)).fetchone()
+        except sqlite3.Error:
+            return 0 # score_server hasn't created the table yet
+        return row[0] if row else 0
+
+    def _load(self, symbol):
+        """
+        Reads a symbol's newest scores into a new ring and caches it. Returns
+        None (and caches nothing) when there are no recent scores to hold.
+        """
+        with self._write_lock:
+            with self._lock:
+                if symbol in self._rings:
+                    return self._rings[symbol]
+            # Read before the rows: a write in between only makes the ring
+            # look older than it is, and the next read reloads it
+            version = self._version(symbol)
+            rows = connections.read_arrays(
+                "SELECT timestamp, score FROM scores WHERE symbol = ? ORDER BY timestamp DESC LIMIT ?",
+                (symbol, self.points), [('timestamp', np.int64), ('score', np.float64)]
+            )[::-1]
+            if not len(rows):
+                return None # Unknown symbol, or only archived scores; nothing recent to cache
+            ring = ScoreRing(self.points, self.horizon_ms)
+            ring.append(rows['timestamp'], rows['score'])
+            ring.version = version
+            if len(rows) == self.points or score_archive.partition_files(symbol):
+                # Older scores exist in SQLite or in the cold tier
+                first = int(rows['timestamp'][0])
+                ring.complete_from = first if ring.complete_from is None else max(ring.complete_from, first)
+            self._counters['loads'] += 1
+            with self._lock:
+                self._rings[symbol] = ring
+                while len(self._rings) > self.max_symbols:
+                    self._rings.popitem(last=False)
+                    self._counters['evictions'] += 1
+            return ring
+
+    def read(self, symbol, lower=None, upper=None):
+        """
+        Serves the scores of 'symbol' within [lower, upper] (inclusive ms,
+        either may be None) from memory, loading the symbol's ring first if
+        needed.
+
+        Returns:
+            tuple: (timestamps, scores) arrays, oldest first, or None when the
+            range reaches before what the ring covers (read SQLite instead).
+        """
+        if not self.enabled:
+            return None
+        version = self._version(symbol)
+        with self._lock:
+            ring = self._rings.get(symbol)
+            if ring is not None and ring.version != version:
+                # Written (or deleted) by another process since the ring was loaded
+                del self._rings[symbol]
+                self._counters['stale'] += 1
+                ring = None
+            if ring is not None:
+                self._rings.move_to_end(symbol)
+        if ring is None:
+            ring = self._load(symbol)
+        with self._lock:
+            if ring is None or not ring.covers(lower):
+                self._counters['misses'] += 1
+                return None
+            self._counters['hits'] += 1
+            return ring.range(lower, upper)
+
+    def write_through(self, rows, versions):
+        """
+        Applies committed (symbol, timestamp, score) rows to the cached rings
+        (symbols that aren't cached are loaded on their next read). 'versions'
+        maps each symbol to its score_symbols.version after the write. A ring
+        that wasn't at the version just before it missed another process's
+        write and is dropped instead. Call it while holding writing().
+        """
+        if not self.enabled:
+            return
+        by_symbol = {}
+        for symbol, timestamp, score in rows:
+            # Like INSERT OR REPLACE, the last row for a timestamp wins
+            by_symbol.setdefault(symbol, {})[timestamp] = score
+        with self._lock:
+            for symbol, points in by_symbol.items():
+                ring = self._rings.get(symbol)
+                if ring is None:
+                    continue
+                version = versions.get(symbol)
+                if version is None or ring.version != version - 1:
+                    del self._rings[symbol]
+                    continue
+                ring.version = version
+                timestamps = np.fromiter(points.keys(), dtype=np.int64, count=len(points))
+                scores = np.fromiter(points.values(), dtype=np.float64, count=len(points))
+                order = np.argsort(timestamps, kind='stable')
+                timestamps, scores = timestamps[order], scores[order]
+                newest = ring.newest()
+                split = 0 if newest is None else int(np.searchsorted(timestamps, newest, 'right'))
+                for timestamp, score in zip(timestamps[:split].tolist(), scores[:split].tolist()):
+                    ring.upsert(timestamp, score)
+                ring.append(timestamps[split:], scores[split:])
+
+    def drop(self, symbol=None):
+        """Forgets one symbol's ring (all of them if None), e.g. after its scores are deleted."""
+        with self._lock:
+            if symbol is None:
+                self._rings.clear()
+            else:
+                self._rings.pop(symbol, None)
+
+    def stats(self):
+        """Returns the cached symbols and points, the memory they hold and its bound, plus hit/miss counters."""
+        with self._lock:
+            return dict(
+                self._counters,
+                symbols=len(self._rings),
+                points=sum(ring.size for ring in self._rings.values()),
+                bytes=sum(ring.nbytes() for ring in self._rings.values()),
+                max_bytes=self.max_symbols * self.points * 16, # int64 timestamp + float64 score
+                points_per_symbol=self.points,
+                horizon_hours=None if self.horizon_ms is None else self.horizon_ms / HOUR_MS,
+            )
+
+
+# The score server's cache; write_scores writes through to it
+cache = ScoreCache()
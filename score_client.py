@@ -1,13 +1,28 @@
 # client_a.py
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import gzip
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
+import score_wire
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional; gzip is always available
+    zstandard = None
+
 # Replace with the actual IP address or hostname of Server B
 # If running on the same machine, '127.0.0.1' or 'localhost' is fine.
 # If on a different server, use its network IP (e.g., '192.168.1.100').
 SERVER_B_URL = "http://20.187.91.140:5000" # Assuming Server B runs on the same machine for this example
 
+# Answers worth retrying: rate limiting, full ingest queue and server-side failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 def datetime_to_milliseconds(dt_obj):
     """Converts a datetime object to milliseconds since epoch (UTC)."""
     if dt_obj.tzinfo is None:
@@ -34,6 +49,50 @@ def add_scores(scores_list):
         if e.response is not None:
             print("Server response:", e.response.text)
 
+def add_scores_columnar(symbols, timestamps, scores, fmt='packed'):
+    """
+    Adds scores to Server B using a columnar body instead of JSON objects.
+    'symbols', 'timestamps' (milliseconds) and 'scores' are equal-length
+    array-likes such as lists, numpy arrays or pandas Series.
+    'fmt' is 'packed' (numpy only) or 'arrow' (needs pyarrow).
+    """
+    url = f"{SERVER_B_URL}/scores"
+    columns = score_wire.columns_from_arrays(symbols, timestamps, scores)
+    if fmt == 'arrow':
+        body = b''.join(score_wire.iter_arrow_stream([columns]))
+        headers = {'Content-Type': score_wire.ARROW_MIMETYPE}
+    else:
+        body = score_wire.encode_packed(columns)
+        headers = {'Content-Type': score_wire.PACKED_MIMETYPE}
+    print(f"\n--- Adding {len(columns.timestamps)} scores ({fmt}) ---")
+    try:
+        response = requests.post(url, data=body, headers=headers)
+        response.raise_for_status()
+        print("Response:", json.dumps(response.json(), indent=2))
+    except requests.exceptions.RequestException as e:
+        print(f"Error adding scores: {e}")
+        if e.response is not None:
+            print("Server response:", e.response.text)
+
+def get_scores_frame(symbol=None, fmt='packed', **params):
+    """
+    Retrieves scores from Server B in a columnar format and decodes them
+    straight into a pandas DataFrame (categorical 'symbol', int64 'timestamp',
+    float64 'score'). Extra keyword arguments are passed as query parameters,
+    e.g. start=..., end=... for a single symbol.
+    """
+    url = f"{SERVER_B_URL}/scores" if symbol is None else f"{SERVER_B_URL}/scores/{symbol}"
+    mimetype = score_wire.ARROW_MIMETYPE if fmt == 'arrow' else score_wire.PACKED_MIMETYPE
+    try:
+        response = requests.get(url, params=params, headers={'Accept': mimetype})
+        response.raise_for_status()
+        return score_wire.to_dataframe(score_wire.decode(response.content, mimetype))
+    except requests.exceptions.RequestException as e:
+        print(f"Error getting scores: {e}")
+        if e.response is not None:
+            print("Server response:", e.response.text)
+        return None
+
 def get_all_scores():
     """Retrieves all scores from Server B."""
     url = f"{SERVER_B_URL}/scores"
@@ -77,6 +136,280 @@ def delete_scores_by_symbol(symbol):
         if e.response is not None:
             print("Server response:", e.response.text)
 
+class ScoreClient:
+    """
+    Reusable client for Server B built for bulk uploads.
+
+    - Keeps a pooled keep-alive requests.Session, so calls after the first
+      skip the TCP (and TLS) handshake.
+    - Splits large score lists into batches of 'batch_size' rows and posts
+      them with '?response=summary', so the server does not echo every row back.
+    - Compresses request bodies with gzip, or zstd when the 'zstandard'
+      package is installed and compression='zstd'.
+    - Retries connection errors, 429 and 5xx answers up to 'max_retries'
+      times with exponential backoff and full jitter (honouring Retry-After).
+    - Uploads batches on 'workers' threads when workers > 1.
+
+    upload() returns a report with the achieved rows/sec, which is the number
+    to size producers against.
+    """
+
+    def __init__(self, base_url=SERVER_B_URL, batch_size=5000, compression='gzip', body_format='json',
+                 workers=1, max_retries=4, backoff=0.25, max_backoff=8.0, timeout=30):
+        if compression not in (None, 'gzip', 'zstd'):
+            raise ValueError("compression must be None, 'gzip' or 'zstd'")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("compression='zstd' requires the 'zstandard' package")
+        if body_format not in ('json', 'packed', 'arrow'):
+            raise ValueError("body_format must be 'json', 'packed' or 'arrow'")
+        self.base_url = base_url.rstrip('/')
+        self.batch_size = batch_size
+        self.compression = compression
+        self.body_format = body_format
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(10, self.workers))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- Uploads ---
+
+    def upload(self, scores_list, mode=None):
+        """
+        Uploads a list of {"symbol", "timestamp", "score"} dicts in batches.
+        'mode' is passed through as '?mode=' (e.g. 'async' for the write-behind queue).
+
+        Returns:
+            dict: rows/batches sent and failed, bytes on the wire, elapsed
+            seconds, rows_per_sec and the error messages returned by the server.
+        """
+        batches = [scores_list[i:i + self.batch_size] for i in range(0, len(scores_list), self.batch_size)]
+        started = time.perf_counter()
+        if self.workers > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(lambda batch: self._post_batch(batch, mode), batches))
+        else:
+            results = [self._post_batch(batch, mode) for batch in batches]
+        elapsed = time.perf_counter() - started
+
+        report = {
+            "rows": 0, "failed_rows": 0, "batches": len(batches), "failed_batches": 0,
+            "bytes_sent": 0, "retries": 0, "errors": [],
+        }
+        for batch, result in zip(batches, results):
+            report["bytes_sent"] += result["bytes_sent"]
+            report["retries"] += result["retries"]
+            if result["ok"]:
+                report["rows"] += result["body"].get("inserted", result["body"].get("queued", len(batch)))
+                report["failed_rows"] += result["body"].get("failed", 0)
+                report["errors"].extend(result["body"].get("errors", []))
+            else:
+                report["failed_batches"] += 1
+                report["failed_rows"] += len(batch)
+                report["errors"].append(result["error"])
+        report["seconds"] = round(elapsed, 3)
+        report["rows_per_sec"] = round(report["rows"] / elapsed, 1) if elapsed > 0 else 0.0
+        return report
+
+    def _encode(self, batch):
+        if self.body_format == 'json':
+            body = json.dumps(batch, separators=(',', ':')).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            columns = score_wire.columns_from_arrays(
+                [item['symbol'] for item in batch],
+                [item['timestamp'] for item in batch],
+                [item['score'] for item in batch],
+            )
+            if self.body_format == 'arrow':
+                body = b''.join(score_wire.iter_arrow_stream([columns]))
+                content_type = score_wire.ARROW_MIMETYPE
+            else:
+                body = score_wire.encode_packed(columns)
+                content_type = score_wire.PACKED_MIMETYPE
+
+        headers = {'Content-Type': content_type}
+        if self.compression == 'gzip':
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+        elif self.compression == 'zstd':
+            body = zstandard.ZstdCompressor(level=3).compress(body)
+            headers['Content-Encoding'] = 'zstd'
+        return body, headers
+
+    def _post_batch(self, batch, mode):
+        body, headers = self._encode(batch)
+        params = {'response': 'summary'}
+        if mode:
+            params['mode'] = mode
+        response, retries, error = self._request('POST', '/scores', params=params, data=body, headers=headers)
+        result = {"bytes_sent": len(body) * (retries + 1), "retries": retries}
+        if response is None:
+            result.update(ok=False, error=error)
+        elif not response.ok:
+            result.update(ok=False, error=f"HTTP {response.status_code}: {response.text[:200]}")
+        else:
+            result.update(ok=True, body=response.json())
+        return result
+
+    def _request(self, method, path, **kwargs):
+        """
+        Sends a request, retrying connection errors and RETRY_STATUSES with
+        jittered exponential backoff. Other answers, including 4xx, are returned
+        as they are since retrying will not change them.
+        Returns (response or None, retries used, last error message).
+        """
+        url = f"{self.base_url}{path}"
+        error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    return response, attempt, None
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                retry_after = response.headers.get('Retry-After')
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = str(e)
+
+            if attempt < self.max_retries:
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                time.sleep(delay)
+        return None, self.max_retries, error
+
+    def _get(self, path, **kwargs):
+        response, _, error = self._request('GET', path, **kwargs)
+        if response is None:
+            raise requests.exceptions.RequestException(error)
+        return response
+
+    # --- Reads ---
+
+    def iter_scores(self, symbol=None, page_size=10000, **params):
+        """
+        Yields score dicts page by page using the server's keyset cursors, so
+        arbitrarily large histories can be walked with bounded memory.
+        """
+        path = '/scores' if symbol is None else f'/scores/{symbol}'
+        params = dict(params, limit=page_size)
+        while True:
+            response = self._get(path, params=params)
+            if response.status_code == 404:
+                return
+            response.raise_for_status()
+            page = response.json()
+            yield from page["scores"]
+            if page["next_after"] is None:
+                return
+            params['after'] = page["next_after"]
+
+    def get_frame(self, symbol=None, fmt='packed', **params):
+        """Fetches scores in a columnar format and decodes them into a pandas DataFrame."""
+        path = '/scores' if symbol is None else f'/scores/{symbol}'
+        mimetype = score_wire.ARROW_MIMETYPE if fmt == 'arrow' else score_wire.PACKED_MIMETYPE
+        response = self._get(path, params=params, headers={'Accept': mimetype})
+        response.raise_for_status()
+        return score_wire.to_dataframe(score_wire.decode(response.content, mimetype))
+
+class ScoreMirror:
+    """
+    Local copy of one symbol's scores kept in sync with Server B by deltas.
+
+    sync() sends the last ETag (If-None-Match) and the newest timestamp held
+    locally as '?since=', so an unchanged symbol costs a 304 and a changed one
+    only transfers the new rows. Scores replaced or back-filled at or before
+    the watermark never come back from a delta; the server reports them by
+    bumping X-Score-Rewrite-Version, and sync() then reloads the full history
+    straight away. If the merged copy no longer matches the server's
+    X-Score-Count (e.g. rows deleted), the next sync() reloads as well.
+    """
+
+    def __init__(self, client, symbol):
+        self.client = client
+        self.symbol = symbol
+        self.scores = {}  # timestamp (ms) -> score
+        self.watermark = None
+        self.etag = None
+        self.version = None
+        self.rewrite_version = None
+        self._full_reload = True
+
+    def sync(self):
+        """
+        Brings the local copy up to date.
+
+        Returns:
+            int: number of rows added or updated by this call (0 on a 304).
+        """
+        params = {}
+        headers = {}
+        delta = not self._full_reload
+        if delta:
+            if self.watermark is not None:
+                params['since'] = self.watermark
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+
+        response = self.client._get(f'/scores/{self.symbol}', params=params, headers=headers)
+        if response.status_code == 304:
+            return 0
+        if response.status_code == 404:
+            self.scores.clear()
+            self.watermark = None
+            self.etag = None
+            self.version = self.rewrite_version = None
+            self._full_reload = False
+            return 0
+        response.raise_for_status()
+
+        if self._full_reload:
+            self.scores.clear()
+            self.watermark = None
+        rows = response.json()
+        for item in rows:
+            self.scores[item['timestamp']] = item['score']
+        if rows:
+            # Rows come back ordered by timestamp
+            newest = rows[-1]['timestamp']
+            self.watermark = newest if self.watermark is None else max(self.watermark, newest)
+        self.etag = response.headers.get('ETag')
+
+        version = response.headers.get('X-Score-Version')
+        rewrite_version = response.headers.get('X-Score-Rewrite-Version')
+        if rewrite_version is not None:
+            rewritten = rewrite_version != self.rewrite_version
+        else:
+            # Older server: a new version that brought no newer rows must have rewritten old ones
+            rewritten = version is not None and version != self.version and not rows
+        self.version, self.rewrite_version = version, rewrite_version
+        if delta and rewritten:
+            self._full_reload = True
+            return len(rows) + self.sync()
+
+        server_count = response.headers.get('X-Score-Count')
+        self._full_reload = server_count is not None and int(server_count) != len(self.scores)
+        return len(rows)
+
+    def items(self):
+        """Returns the local copy as a list of (timestamp, score) sorted by time."""
+        return sorted(self.scores.items())
+
 if __name__ == '__main__':
     # --- Demonstrate adding scores ---
 
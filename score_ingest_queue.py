@@ -0,0 +1,214 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+# Errors that may go away on a retry (the database is locked or busy, the
+# disk is full). Anything else - a NOT NULL violation, an integer too large
+# for SQLite, a value of a type SQLite can't bind - fails the same way every
+# time, so the batch is split instead until the bad rows are isolated and
+# the rest is still written.
+TRANSIENT_WRITE_ERRORS = (sqlite3.OperationalError,)
+
+
+class IngestQueueFull(Exception):
+    """Raised when the queue cannot take a batch before the put timeout expires."""
+
+
+class WriteBehindQueue:
+    """
+    Bounded in-process queue of validated score rows with a single background
+    writer thread.
+
+    Producers call put_many() and return as soon as their rows are queued.
+    The writer drains the queue in batches of at most 'batch_size' rows, or
+    whatever is pending once 'flush_interval' seconds have passed since the
+    oldest queued row arrived, and hands each batch to 'write_batch'.
+    A batch that fails with anything but TRANSIENT_WRITE_ERRORS is split in
+    halves until the offending rows are isolated; those are logged and counted as
+    'invalid_rows', and the rows of every other request are still written.
+    """
+
+    def __init__(self, write_batch, maxsize=100000, batch_size=5000, flush_interval=0.5, max_attempts=3):
+        self.write_batch = write_batch
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+
+        self._rows = deque()
+        self._oldest_enqueued_at = None
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+        # Counters, all guarded by self._cond
+        self.enqueued_rows = 0
+        self.written_rows = 0
+        self.rejected_rows = 0
+        self.dropped_rows = 0
+        self.invalid_rows = 0
+        self.batches_written = 0
+        self.failed_attempts = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self):
+        """Starts the writer thread if it is not running yet."""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='score-ingest-writer', daemon=True)
+            self._thread.start()
+
+    def put_many(self, rows, timeout=1.0):
+        """
+        Queues a batch of rows. Blocks for up to 'timeout' seconds while the
+        queue is full and raises IngestQueueFull if there is still no room,
+        so callers can push back on their producers.
+        A batch larger than 'maxsize' is accepted only when the queue is empty.
+        """
+        if not rows:
+            return
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self._rows) and len(self._rows) + len(rows) > self.maxsize:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopping:
+                    self.rejected_rows += len(rows)
+                    raise IngestQueueFull(
+                        f"Ingest queue is full ({len(self._rows)}/{self.maxsize} rows pending)."
+                    )
+                self._cond.wait(remaining)
+            if not self._rows:
+                self._oldest_enqueued_at = time.monotonic()
+            self._rows.extend(rows)
+            self.enqueued_rows += len(rows)
+            self.max_depth = max(self.max_depth, len(self._rows))
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Blocks until everything queued so far has been written (or dropped)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._oldest_enqueued_at = 0 if self._rows else None # make pending rows due now
+            self._cond.notify_all()
+            while self._rows or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        """Flushes pending rows and stops the writer thread. Used as the shutdown hook."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self):
+        """Returns a snapshot of the queue counters."""
+        with self._cond:
+            return {
+                "queue_depth": len(self._rows),
+                "max_queue_depth": self.max_depth,
+                "queue_capacity": self.maxsize,
+                "in_flight_rows": self._in_flight,
+                "enqueued_rows": self.enqueued_rows,
+                "written_rows": self.written_rows,
+                "rejected_rows": self.rejected_rows,
+                "dropped_rows": self.dropped_rows,
+                "invalid_rows": self.invalid_rows,
+                "batches_written": self.batches_written,
+                "failed_attempts": self.failed_attempts,
+                "last_flush_ms": round(self.last_flush_ms, 3),
+                "max_flush_ms": round(self.max_flush_ms, 3),
+                "avg_flush_ms": round(self.total_flush_ms / self.batches_written, 3) if self.batches_written else 0.0,
+            }
+
+    def _take_batch(self):
+        """Waits until a batch is due and pops it. Returns None once stopped and drained."""
+        with self._cond:
+            while True:
+                if self._rows:
+                    due_at = self._oldest_enqueued_at + self.flush_interval
+                    if len(self._rows) >= self.batch_size or self._stopping or time.monotonic() >= due_at:
+                        break
+                    self._cond.wait(due_at - time.monotonic())
+                elif self._stopping:
+                    return None
+                else:
+                    self._cond.wait()
+
+            count = min(self.batch_size, len(self._rows))
+            batch = [self._rows.popleft() for _ in range(count)]
+            self._in_flight = count
+            self._oldest_enqueued_at = time.monotonic() if self._rows else None
+            # Producers blocked on a full queue can go ahead now
+            self._cond.notify_all()
+            return batch
+
+    def _write_isolating(self, rows):
+        """
+        Writes 'rows', splitting them on a permanent error until the failing
+        rows are found. Halves are written in order, so a later row for the
+        same key still wins. TRANSIENT_WRITE_ERRORS propagate to the retry loop.
+
+        Returns:
+            tuple: (rows written, rows rejected).
+        """
+        try:
+            self.write_batch(rows)
+            return len(rows), 0
+        except TRANSIENT_WRITE_ERRORS:
+            raise
+        except Exception as e:
+            if len(rows) == 1:
+                print(f"Ingest writer rejected row {rows[0]}: {e}")
+                return 0, 1
+            middle = len(rows) // 2
+            first = self._write_isolating(rows[:middle])
+            second = self._write_isolating(rows[middle:])
+            return first[0] + second[0], first[1] + second[1]
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+
+            written = False
+            for attempt in range(1, self.max_attempts + 1):
+                started = time.perf_counter()
+                try:
+                    written_count, invalid_count = self._write_isolating(batch)
+                    written = True
+                    break
+                except Exception as e:
+                    print(f"Ingest writer error (attempt {attempt}/{self.max_attempts}) for {len(batch)} rows: {e}")
+                    with self._cond:
+                        self.failed_attempts += 1
+                    time.sleep(min(0.1 * 2 ** attempt, 2.0))
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            with self._cond:
+                if written:
+                    self.written_rows += written_count
+                    self.invalid_rows += invalid_count
+                    self.batches_written += 1
+                    self.last_flush_ms = elapsed_ms
+                    self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                    self.total_flush_ms += elapsed_ms
+                else:
+                    self.dropped_rows += len(batch)
+                self._in_flight = 0
+                self._cond.notify_all()
@@ -0,0 +1,86 @@
+"""
+Cross-symbol statistics over a wide score frame (db_manager.fetch_scores_wide:
+one column per symbol, NaN where a symbol has no score).
+
+Everything is computed on the underlying 2-D array at once, column-wise,
+instead of looping over symbols:
+
+- latest_scores: latest score and time, change over the window, min / max /
+  mean and number of scores of each symbol;
+- score_correlation: pairwise Pearson correlation over the buckets both
+  symbols have a score in, as a few matrix products.
+"""
+import numpy as np
+import pandas as pd
+
+# Fewest common buckets a pair needs before its correlation is shown
+MIN_CORRELATION_PERIODS = 10
+
+
+def latest_scores(wide):
+    """
+    Summarises each column of a wide score frame.
+
+    Returns:
+        pd.DataFrame: indexed by symbol, with 'latest', 'latest_time',
+        'change' (latest - first score in the window), 'min', 'max', 'mean'
+        and 'count'. Symbols without scores have NaN / NaT and count 0.
+    """
+    values = wide.to_numpy(dtype=np.float64)
+    times = wide.index.to_numpy(dtype='datetime64[ns]')
+    if len(values) == 0:
+        # One all-NaN row, so the row lookups below have something to index
+        values = np.full((1, values.shape[1]), np.nan)
+        times = np.array(['NaT'], dtype='datetime64[ns]')
+    present = ~np.isnan(values)
+    count = present.sum(axis=0)
+    has = count > 0
+    columns = np.arange(values.shape[1])
+    # argmax finds the first True; on the reversed rows, the last one
+    first_row = np.argmax(present, axis=0)
+    last_row = len(values) - 1 - np.argmax(present[::-1], axis=0)
+
+    latest = np.where(has, values[last_row, columns], np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        summary = pd.DataFrame({
+            'latest': latest,
+            'latest_time': np.where(has, times[last_row], np.datetime64('NaT')),
+            'change': latest - values[first_row, columns],
+            # fmin/fmax skip NaN and give NaN for all-NaN columns without warning
+            'min': np.fmin.reduce(values, axis=0),
+            'max': np.fmax.reduce(values, axis=0),
+            'mean': np.nansum(values, axis=0) / np.where(has, count, np.nan),
+            'count': count,
+        }, index=pd.Index(wide.columns, name='symbol'))
+    return summary
+
+
+def score_correlation(wide, min_periods=MIN_CORRELATION_PERIODS):
+    """
+    Pairwise Pearson correlation of the columns of a wide score frame, each
+    pair using only the buckets where both have a score (like
+    DataFrame.corr), computed with matrix products over the whole frame.
+
+    Returns:
+        pd.DataFrame: symbols x symbols, NaN where a pair shares fewer than
+        'min_periods' buckets or one of them is constant there.
+    """
+    values = wide.to_numpy(dtype=np.float64)
+    present = ~np.isnan(values)
+    # Centering first keeps the sums of squares small, so the subtraction below stays accurate
+    column_mean = np.nansum(values, axis=0) / np.maximum(present.sum(axis=0), 1)
+    centered = np.where(present, values - column_mean, 0.0)
+    present = present.astype(np.float64)
+
+    # [i, j] entries are sums over the rows where both i and j have a score
+    n = present.T @ present
+    sum_x = centered.T @ present
+    sum_xx = (centered ** 2).T @ present
+    sum_xy = centered.T @ centered
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sum_xy - sum_x * sum_x.T / n
+        var_x = sum_xx - sum_x ** 2 / n
+        corr = cov / np.sqrt(var_x * var_x.T)
+    corr[(n < min_periods) | ~np.isfinite(corr)] = np.nan
+    corr = np.clip(corr, -1.0, 1.0)
+    return pd.DataFrame(corr, index=wide.columns, columns=wide.columns)
@@ -0,0 +1,247 @@
+"""
+Continuous aggregates of the 'scores' table.
+
+score_rollups holds one row per (symbol, interval, bucket) with count, min,
+max, sum and the last score of the bucket. The ingest path refreshes the
+buckets a batch touches inside its own transaction: 1m buckets are recomputed
+from raw scores, and every coarser interval from the interval below it, so
+each refresh reads at most a few dozen rows and stays correct when
+INSERT OR REPLACE overwrites an existing score.
+
+Old scores move to the Parquet archive (score_archive) while their rollups
+stay here. A 1m bucket at or before the symbol's archived_max_timestamp (in
+score_symbols) is therefore recomputed from both tiers, so a late write into
+an archived minute doesn't shrink the bucket to the rows still in SQLite.
+rebuild_rollups() merges the archive the same way.
+
+score_server builds the rollups of existing scores when it creates the
+table on an older database (a rollup row for a symbol is taken to mean its
+whole history is covered). Run `python score_rollups.py [--symbol SYMBOL]`
+to rebuild the tables from raw scores after a backfill.
+"""
+import argparse
+import sqlite3
+
+import pandas as pd
+
+import score_archive
+
+DATABASE_FILE = 'scores.db'
+
+# (name, width in ms), finest first. Each width must be a multiple of the previous one.
+ROLLUP_INTERVALS = (
+    ('1m', 60 * 1000),
+    ('5m', 5 * 60 * 1000),
+    ('1h', 60 * 60 * 1000),
+    ('1d', 24 * 60 * 60 * 1000),
+)
+
+# A bare column next to several aggregates comes from an undefined row in
+# SQLite, so 'last' is looked up by primary key from the row holding
+# MAX(timestamp): in 'scores' for 1m buckets, and in the finer interval's
+# bucket containing it for coarser ones.
+_REFRESH_FROM_SCORES = """
+    INSERT OR REPLACE INTO score_rollups (symbol, interval, bucket, count, min, max, sum, last_timestamp, last)
+    SELECT g.symbol, ?, ?, g.count, g.min, g.max, g.sum, g.last_timestamp,
+           (SELECT score FROM scores WHERE symbol = g.symbol AND timestamp = g.last_timestamp)
+    FROM (
+        SELECT symbol, COUNT(*) AS count, MIN(score) AS min, MAX(score) AS max, SUM(score) AS sum,
+               MAX(timestamp) AS last_timestamp
+        FROM scores
+        WHERE symbol = ? AND timestamp BETWEEN ? AND ?
+        GROUP BY symbol
+    ) AS g
+"""
+
+_REFRESH_FROM_ROLLUP = """
+    INSERT OR REPLACE INTO score_rollups (symbol, interval, bucket, count, min, max, sum, last_timestamp, last)
+    SELECT g.symbol, ?, ?, g.count, g.min, g.max, g.sum, g.last_timestamp,
+           (SELECT last FROM score_rollups
+            WHERE symbol = g.symbol AND interval = ? AND bucket = g.last_timestamp - g.last_timestamp % ?)
+    FROM (
+        SELECT symbol, SUM(count) AS count, MIN(min) AS min, MAX(max) AS max, SUM(sum) AS sum,
+               MAX(last_timestamp) AS last_timestamp
+        FROM score_rollups
+        WHERE symbol = ? AND interval = ? AND bucket BETWEEN ? AND ?
+        GROUP BY symbol
+    ) AS g
+"""
+
+
+def init_rollup_table(cursor):
+    """
+    Creates the score_rollups table if it doesn't exist.
+
+    Returns:
+        bool: True if the table was created, i.e. existing scores have no rollups yet.
+    """
+    created = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'score_rollups'"
+    ).fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS score_rollups (
+            symbol TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            bucket INTEGER NOT NULL, -- bucket start, milliseconds since epoch
+            count INTEGER NOT NULL,
+            min REAL NOT NULL,
+            max REAL NOT NULL,
+            sum REAL NOT NULL,
+            last_timestamp INTEGER NOT NULL,
+            last REAL NOT NULL,
+            PRIMARY KEY (symbol, interval, bucket)
+        ) WITHOUT ROWID
+    ''')
+    return created
+
+
+def _archived_until(conn, symbol):
+    """Newest archived timestamp of a symbol, or None if nothing of it was archived."""
+    try:
+        row = conn.execute("SELECT archived_max_timestamp FROM score_symbols WHERE symbol = ?", (symbol,)).fetchone()
+    except sqlite3.OperationalError:
+        return None # No score_symbols table (a database score_server never opened)
+    return row[0] if row else None
+
+
+def _minute_rows_from_tiers(conn, symbol, start, end, archive_dir=score_archive.ARCHIVE_DIR):
+    """
+    Aggregates the 1m buckets of a symbol within [start, end] (inclusive ms)
+    from the 'scores' table and the archive together. On a timestamp held by
+    both tiers the SQLite row wins, as in score_archive.merge_tiers.
+
+    Returns:
+        list: score_rollups rows (symbol, interval, bucket, count, min, max,
+        sum, last_timestamp, last), oldest bucket first.
+    """
+    name, width = ROLLUP_INTERVALS[0]
+    hot = pd.read_sql_query(
+        "SELECT timestamp, score FROM scores WHERE symbol = ? AND timestamp BETWEEN ? AND ?",
+        conn, params=(symbol, start, end), dtype={'timestamp': 'int64', 'score': 'float64'}
+    )
+    cold = score_archive.read_archived(symbol, start, end, archive_dir)
+    df = pd.concat([hot, cold], ignore_index=True).drop_duplicates('timestamp', keep='first')
+    df = df.sort_values('timestamp', kind='stable')
+    grouped = df.groupby(df['timestamp'] - df['timestamp'] % width, sort=True)
+    stats = grouped['score'].agg(['count', 'min', 'max', 'sum', 'last'])
+    stats['last_timestamp'] = grouped['timestamp'].max()
+    columns = [stats.index] + [stats[column] for column in ('count', 'min', 'max', 'sum', 'last_timestamp', 'last')]
+    return [(symbol, name, *values) for values in zip(*(column.tolist() for column in columns))]
+
+
+_INSERT_ROLLUP = """
+    INSERT OR REPLACE INTO score_rollups (symbol, interval, bucket, count, min, max, sum, last_timestamp, last)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def update_rollups(conn, rows):
+    """
+    Refreshes every rollup bucket touched by 'rows' ((symbol, timestamp, score)
+    tuples already written to 'scores'). Must run inside the ingest transaction.
+    """
+    finer_name, finer_width = ROLLUP_INTERVALS[0]
+    touched = {(symbol, ts - ts % finer_width) for symbol, ts, _ in rows}
+    archived_until = {symbol: _archived_until(conn, symbol) for symbol, _ in touched}
+    hot_only, with_archive = [], {}
+    for symbol, bucket in touched:
+        until = archived_until[symbol]
+        if until is not None and bucket <= until:
+            with_archive.setdefault(symbol, set()).add(bucket)
+        else:
+            hot_only.append((finer_name, bucket, symbol, bucket, bucket + finer_width - 1))
+    conn.executemany(_REFRESH_FROM_SCORES, hot_only)
+    for symbol, buckets in with_archive.items():
+        # Late writes into archived minutes: rare, so one read of the range is fine
+        minute_rows = _minute_rows_from_tiers(conn, symbol, min(buckets), max(buckets) + finer_width - 1)
+        conn.executemany(_INSERT_ROLLUP, [row for row in minute_rows if row[2] in buckets])
+    for name, width in ROLLUP_INTERVALS[1:]:
+        touched = {(symbol, bucket - bucket % width) for symbol, bucket in touched}
+        conn.executemany(_REFRESH_FROM_ROLLUP, [
+            (name, bucket, finer_name, finer_width, symbol, finer_name, bucket, bucket + width - 1)
+            for symbol, bucket in touched
+        ])
+        finer_name, finer_width = name, width
+
+
+def delete_rollups(conn, symbol):
+    """Drops all rollups of a symbol, e.g. when its scores are deleted."""
+    conn.execute("DELETE FROM score_rollups WHERE symbol = ?", (symbol,))
+
+
+def rebuild_rollups(conn, symbol=None, archive_dir=score_archive.ARCHIVE_DIR):
+    """
+    Recomputes the rollups of one symbol (or of all symbols) from raw scores
+    with one set-based statement per interval. Use after backfills.
+    The 1m buckets of archived months are then recomputed from both tiers,
+    one symbol and month at a time, before the coarser intervals are built.
+    """
+    where, params = ("WHERE symbol = ?", (symbol,)) if symbol else ("", ())
+    with conn:
+        conn.execute(f"DELETE FROM score_rollups {where}", params)
+        finer_name, finer_width = ROLLUP_INTERVALS[0]
+        conn.execute(f"""
+            INSERT INTO score_rollups (symbol, interval, bucket, count, min, max, sum, last_timestamp, last)
+            SELECT g.symbol, ?, g.bucket, g.count, g.min, g.max, g.sum, g.last_timestamp,
+                   (SELECT score FROM scores WHERE symbol = g.symbol AND timestamp = g.last_timestamp)
+            FROM (
+                SELECT symbol, timestamp - (timestamp % ?) AS bucket, COUNT(*) AS count, MIN(score) AS min,
+                       MAX(score) AS max, SUM(score) AS sum, MAX(timestamp) AS last_timestamp
+                FROM scores {where}
+                GROUP BY symbol, bucket
+            ) AS g
+        """, (finer_name, finer_width, *params))
+        for name in ([symbol] if symbol else score_archive.archived_symbols(archive_dir)):
+            for start, end in score_archive.archived_months(name, archive_dir):
+                conn.executemany(_INSERT_ROLLUP, _minute_rows_from_tiers(conn, name, start, end, archive_dir))
+        for name, width in ROLLUP_INTERVALS[1:]:
+            conn.execute(f"""
+                INSERT INTO score_rollups (symbol, interval, bucket, count, min, max, sum, last_timestamp, last)
+                SELECT g.symbol, ?, g.coarse, g.count, g.min, g.max, g.sum, g.last_timestamp,
+                       (SELECT last FROM score_rollups
+                        WHERE symbol = g.symbol AND interval = ? AND bucket = g.last_timestamp - g.last_timestamp % ?)
+                FROM (
+                    SELECT symbol, bucket - (bucket % ?) AS coarse, SUM(count) AS count, MIN(min) AS min,
+                           MAX(max) AS max, SUM(sum) AS sum, MAX(last_timestamp) AS last_timestamp
+                    FROM score_rollups
+                    WHERE interval = ? {'AND symbol = ?' if symbol else ''}
+                    GROUP BY symbol, coarse
+                ) AS g
+            """, (name, finer_name, finer_width, width, finer_name, *params))
+            finer_name, finer_width = name, width
+
+
+def pick_interval(bucket_ms):
+    """
+    Returns the coarsest (name, width) rollup interval no wider than
+    'bucket_ms', or None when even 1m buckets are too coarse.
+    """
+    chosen = None
+    for name, width in ROLLUP_INTERVALS:
+        if width <= bucket_ms:
+            chosen = (name, width)
+    return chosen
+
+
+def has_rollups(conn, symbol, interval):
+    """True if any rollup row exists for the symbol at this interval."""
+    return conn.execute(
+        "SELECT 1 FROM score_rollups WHERE symbol = ? AND interval = ? LIMIT 1", (symbol, interval)
+    ).fetchone() is not None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild score rollup tables from raw scores.")
+    parser.add_argument('--symbol', help="only rebuild this symbol (default: all symbols)")
+    parser.add_argument('--database', default=DATABASE_FILE)
+    parser.add_argument('--archive-dir', default=score_archive.ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database)
+    try:
+        init_rollup_table(conn.cursor())
+        rebuild_rollups(conn, args.symbol, args.archive_dir)
+        count = conn.execute("SELECT COUNT(*) FROM score_rollups").fetchone()[0]
+        print(f"Rebuilt rollups for {args.symbol or 'all symbols'}; score_rollups now has {count} rows.")
+    finally:
+        conn.close()
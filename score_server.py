@@ -1,9 +1,33 @@
 # server_b.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, make_response
 import sqlite3
 import os
+import json
+import base64
+import itertools
+import zlib
+import time
+import hashlib
+import math
+import atexit
 from datetime import datetime, timezone
 
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # zstd request bodies are optional; gzip is always supported
+    zstandard = None
+
+import score_analytics
+import score_archive
+import score_rollups
+import score_wire
+from downsample import bucket_aggregate, lttb_indices
+from score_ingest_queue import WriteBehindQueue, IngestQueueFull
+from db_manager import connections
+from score_cache import cache as score_cache
+
 app = Flask(__name__)
 
 # Define the SQLite database file name
@@ -27,197 +51,1016 @@ DATABASE_FILE = 'scores.db'
 
 def init_db():
     """Initializes the SQLite database and creates the 'scores' table if it doesn't exist."""
-    conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        # Create the scores table with symbol, timestamp (now INTEGER), and score columns.
-        # (symbol, timestamp) is set as a composite primary key to ensure uniqueness
-        # for a given symbol at a specific point in time.
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS scores (
-                symbol TEXT NOT NULL,
-                timestamp INTEGER NOT NULL, -- Storing as milliseconds since epoch
-                score REAL NOT NULL,
-                PRIMARY KEY (symbol, timestamp)
-            )
-        ''')
-        conn.commit()
-        print(f"Database '{DATABASE_FILE}' initialized successfully.")
+        with connections.write() as conn:
+            cursor = conn.cursor()
+            # Create the scores table with symbol, timestamp (now INTEGER), and score columns.
+            # (symbol, timestamp) is set as a composite primary key to ensure uniqueness
+            # for a given symbol at a specific point in time.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scores (
+                    symbol TEXT NOT NULL,
+                    timestamp INTEGER NOT NULL, -- Storing as milliseconds since epoch
+                    score REAL NOT NULL,
+                    PRIMARY KEY (symbol, timestamp)
+                )
+            ''')
+            # One row per symbol, bumped by every write. Lets readers validate a
+            # cached copy (ETag / Last-Modified) without rescanning the scores.
+            symbols_created = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'score_symbols'"
+            ).fetchone() is None
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS score_symbols (
+                    symbol TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL, -- milliseconds since epoch of the last write
+                    row_count INTEGER NOT NULL DEFAULT 0, -- distinct timestamps across 'scores' and the archive
+                    max_timestamp INTEGER, -- newest timestamp ever written
+                    rewrite_version INTEGER NOT NULL DEFAULT 0, -- last version that wrote at or before max_timestamp
+                    archived_max_timestamp INTEGER -- newest timestamp moved to score_archive
+                )
+            ''')
+            migrate_score_symbols(cursor, symbols_created)
+            rollups_created = score_rollups.init_rollup_table(cursor)
+            score_analytics.init_analytics_tables(cursor)
+            conn.commit()
+            if rollups_created:
+                # A database from before rollups: bucketed reads would take the
+                # first new rollup row as covering the symbol's whole history
+                score_rollups.rebuild_rollups(conn)
+                count = conn.execute("SELECT COUNT(*) FROM score_rollups").fetchone()[0]
+                if count:
+                    print(f"Built {count} rollups for the existing scores.")
+            print(f"Database '{DATABASE_FILE}' initialized successfully.")
     except sqlite3.Error as e:
         print(f"Database initialization error: {e}")
-    finally:
-        if conn:
-            conn.close()
+
+def migrate_score_symbols(cursor, created=False):
+    """
+    Adds the columns score_symbols gained over time to a table created before
+    them and fills them in: row_count / max_timestamp from 'scores' (including
+    symbols written before the table existed), archived_max_timestamp and
+    the cross-tier row_count of archived symbols from the Parquet archive.
+    'created' says init_db just created the table: the columns are all there,
+    but a database from before it still needs a row for every symbol, or
+    its scores would have no count (and read as missing) until rewritten.
+    """
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(score_symbols)")}
+    now = int(time.time() * 1000)
+    if created or 'row_count' not in columns:
+        if 'row_count' not in columns:
+            cursor.execute("ALTER TABLE score_symbols ADD COLUMN row_count INTEGER NOT NULL DEFAULT 0")
+            cursor.execute("ALTER TABLE score_symbols ADD COLUMN max_timestamp INTEGER")
+            cursor.execute("ALTER TABLE score_symbols ADD COLUMN rewrite_version INTEGER NOT NULL DEFAULT 0")
+        cursor.execute(
+            """
+            INSERT INTO score_symbols (symbol, version, updated_at, row_count, max_timestamp)
+            SELECT symbol, 0, ?, COUNT(*), MAX(timestamp) FROM scores WHERE true GROUP BY symbol
+            ON CONFLICT(symbol) DO UPDATE SET row_count = excluded.row_count, max_timestamp = excluded.max_timestamp
+            """,
+            (now,)
+        )
+        if cursor.rowcount > 0:
+            print(f"Added row counts for {cursor.rowcount} symbols to score_symbols.")
+    if created or 'archived_max_timestamp' not in columns:
+        if 'archived_max_timestamp' not in columns:
+            cursor.execute("ALTER TABLE score_symbols ADD COLUMN archived_max_timestamp INTEGER")
+        for symbol in score_archive.archived_symbols():
+            archived = set(score_archive.read_archived(symbol)['timestamp'].tolist())
+            if not archived:
+                continue
+            hot = {row[0] for row in cursor.execute("SELECT timestamp FROM scores WHERE symbol = ?", (symbol,))}
+            cursor.execute(
+                """
+                INSERT INTO score_symbols (symbol, version, updated_at, row_count, max_timestamp, archived_max_timestamp)
+                VALUES (?, 0, ?, ?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET row_count = excluded.row_count,
+                    max_timestamp = excluded.max_timestamp, archived_max_timestamp = excluded.archived_max_timestamp
+                """,
+                (symbol, now, len(hot | archived), max(hot | archived), max(archived))
+            )
 
 # Initialize the database when the application starts
 init_db()
+# Long analytics replays (see score_analytics) run here, off the ingest path
+ANALYTICS_REPLAY_INTERVAL = 1.0 # seconds between checks for symbols marked dirty
+score_analytics.start_replayer(connections.write, ANALYTICS_REPLAY_INTERVAL)
+
+# --- Write-behind ingest ---
+# With async ingest, POST /scores only validates and queues the rows and answers
+# 202 straight away; one background thread writes them in batches. Enable it for
+# the whole server with SCORE_INGEST_MODE=async, or per request with '?mode=async'.
+INGEST_MODE = os.getenv('SCORE_INGEST_MODE', 'sync')
+INGEST_QUEUE_MAXSIZE = 200000  # rows held in memory before producers get 503
+INGEST_BATCH_SIZE = 5000       # max rows per background transaction
+INGEST_FLUSH_INTERVAL = 0.5    # seconds a queued row may wait for its batch to fill
+INGEST_PUT_TIMEOUT = 1.0       # seconds a request waits for room in a full queue
+
+def _write_queued_batch(rows):
+    with connections.write() as conn:
+        write_scores(conn, rows)
+
+ingest_queue = WriteBehindQueue(
+    _write_queued_batch,
+    maxsize=INGEST_QUEUE_MAXSIZE,
+    batch_size=INGEST_BATCH_SIZE,
+    flush_interval=INGEST_FLUSH_INTERVAL,
+)
+# Flush whatever is still queued when the process shuts down
+atexit.register(ingest_queue.close)
+
+# Upper bound for a decompressed request body, so a small compressed
+# payload cannot expand into an arbitrarily large one.
+MAX_DECOMPRESSED_BYTES = 256 * 1024 * 1024
+
+def read_request_body():
+    """
+    Returns the raw request body, undoing a gzip or zstd Content-Encoding.
+    Raises ValueError for unknown encodings, corrupt data or bodies that
+    decompress beyond MAX_DECOMPRESSED_BYTES.
+    """
+    body = request.get_data()
+    encoding = request.headers.get('Content-Encoding', '').strip().lower()
+    if encoding in ('', 'identity'):
+        return body
+    try:
+        if encoding == 'gzip':
+            decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+            data = decompressor.decompress(body, MAX_DECOMPRESSED_BYTES)
+            if decompressor.unconsumed_tail:
+                raise ValueError("Decompressed request body is too large.")
+            return data
+        if encoding == 'zstd':
+            if zstandard is None:
+                raise ValueError("zstd request bodies need the 'zstandard' package on the server.")
+            data = zstandard.ZstdDecompressor().stream_reader(body).read(MAX_DECOMPRESSED_BYTES + 1)
+            if len(data) > MAX_DECOMPRESSED_BYTES:
+                raise ValueError("Decompressed request body is too large.")
+            return data
+    except (zlib.error, getattr(zstandard, 'ZstdError', zlib.error)) as e:
+        raise ValueError(f"Could not decompress {encoding} request body: {e}")
+    raise ValueError(f"Unsupported Content-Encoding '{encoding}'.")
+
+def validate_score_items(data):
+    """
+    Validates a batch of score items before anything is written.
+    Returns a tuple (rows, errors) where 'rows' is a list of
+    (symbol, timestamp_ms, score) tuples ready for executemany and 'errors'
+    holds one message per rejected item.
+    """
+    rows = []
+    errors = []
+    for item in data:
+        if not isinstance(item, dict):
+            errors.append(f"Invalid item format: {item}. Expected an object.")
+            continue
+
+        symbol = item.get('symbol')
+        timestamp_input = item.get('timestamp')
+        score = item.get('score')
+
+        # Basic validation for each item
+        if not all([symbol, timestamp_input is not None, score is not None]):
+            errors.append(f"Missing 'symbol', 'timestamp', or 'score' in item: {item}")
+            continue
+
+        # Anything but text would be stored as its string form, or fail the whole batch if unhashable
+        if not isinstance(symbol, str) or not symbol.strip():
+            errors.append(f"'symbol' for item {item} must be a non-empty string.")
+            continue
+
+        # Timestamps are accepted as milliseconds integers only (bool is an int subclass)
+        if not isinstance(timestamp_input, int) or isinstance(timestamp_input, bool):
+            errors.append(f"'timestamp' for item {item} must be a milliseconds integer.")
+            continue
+        # SQLite INTEGER is 64-bit; a larger value would fail the whole executemany
+        if not -2**63 <= timestamp_input < 2**63:
+            errors.append(f"'timestamp' for item {item} is out of range.")
+            continue
+
+        # Validate score type
+        if not isinstance(score, (int, float)) or isinstance(score, bool):
+            errors.append(f"'score' for item {item} must be a number.")
+            continue
+
+        # json.loads accepts NaN and Infinity, which SQLite can't store in a NOT NULL REAL column
+        try:
+            finite = math.isfinite(score)
+        except OverflowError: # An integer too large for a float
+            finite = False
+        if not finite:
+            errors.append(f"'score' for item {item} must be a finite number.")
+            continue
+
+        rows.append((symbol, timestamp_input, score))
+    return rows, errors
+
+def validate_score_columns(columns):
+    """
+    Validates a columnar batch decoded by score_wire with vectorized checks.
+    Returns (rows, errors) like validate_score_items; errors are reported
+    per rule with the number of affected rows rather than per item.
+    """
+    dictionary = np.array(columns.dictionary, dtype=object)
+    valid = np.isfinite(columns.scores)
+    errors = []
+    if not valid.all():
+        bad = np.flatnonzero(~valid)
+        errors.append(f"{len(bad)} items have a non-finite 'score' (first at row {bad[0]}).")
+    bad_symbols = np.array([not isinstance(symbol, str) or not symbol.strip() for symbol in columns.dictionary], dtype=bool)
+    if bad_symbols.any():
+        bad_rows = bad_symbols[columns.codes]
+        if bad_rows.any():
+            errors.append(f"{int(bad_rows.sum())} items have a 'symbol' that is not a non-empty string (first at row {np.flatnonzero(bad_rows)[0]}).")
+            valid &= ~bad_rows
+
+    rows = list(zip(
+        dictionary[columns.codes[valid]].tolist(),
+        columns.timestamps[valid].tolist(),
+        columns.scores[valid].tolist(),
+    ))
+    return rows, errors
+
+def _symbol_write_stats(conn, symbol, timestamps):
+    """
+    Works out how a batch of 'symbol' rows changes its score_symbols entry,
+    before the rows are written.
+
+    Returns:
+        tuple: (timestamps new to the symbol in either tier, newest timestamp
+        of the batch, whether the batch writes at or before the symbol's
+        max_timestamp - a replacement or backfill that a 'since' poller
+        would not see).
+    """
+    state = conn.execute(
+        "SELECT max_timestamp, archived_max_timestamp FROM score_symbols WHERE symbol = ?", (symbol,)
+    ).fetchone()
+    max_ts, archived_max = state if state else (None, None)
+    behind = [ts for ts in timestamps if max_ts is not None and ts <= max_ts]
+    existing = set()
+    for i in range(0, len(behind), 500):
+        chunk = behind[i:i + 500]
+        existing.update(row[0] for row in conn.execute(
+            f"SELECT timestamp FROM scores WHERE symbol = ? AND timestamp IN ({','.join('?' * len(chunk))})",
+            (symbol, *chunk)
+        ))
+    # A late write into an archived range may repeat a timestamp that now only lives in Parquet
+    cold = [ts for ts in behind if ts not in existing and archived_max is not None and ts <= archived_max]
+    if cold:
+        archived = score_archive.read_archived(symbol, min(cold), max(cold))['timestamp']
+        existing.update(set(cold) & set(archived.tolist()))
+    return len(timestamps) - len(existing), max(timestamps), bool(behind)
+
+def write_scores(conn, rows):
+    """
+    Writes validated (symbol, timestamp, score) rows with a single executemany
+    inside one transaction. Either the whole batch is stored or none of it is.
+    The same transaction bumps the symbols' versions and row counts in
+    score_symbols (and their rewrite_version if the batch replaced or
+    backfilled older scores), refreshes the score_rollups buckets the batch
+    touched and advances the symbols' rolling analytics (score_analytics).
+    Once committed, the rows and the new versions are written through to
+    the in-memory score_cache.
+    """
+    updated_at = int(time.time() * 1000)
+    timestamps = {}
+    for symbol, timestamp, _ in rows:
+        timestamps.setdefault(symbol, set()).add(timestamp)
+    symbols = set(timestamps)
+    with score_cache.writing():
+        with conn:
+            # Counted before the insert, which can't tell new rows from replaced ones
+            symbol_stats = [
+                (symbol, updated_at, *_symbol_write_stats(conn, symbol, list(points)))
+                for symbol, points in timestamps.items()
+            ]
+            conn.executemany(
+                "INSERT OR REPLACE INTO scores (symbol, timestamp, score) VALUES (?, ?, ?)",
+                rows
+            )
+            conn.executemany(
+                """
+                INSERT INTO score_symbols (symbol, version, updated_at, row_count, max_timestamp, rewrite_version)
+                VALUES (?, 1, ?, ?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    version = version + 1,
+                    updated_at = excluded.updated_at,
+                    row_count = row_count + excluded.row_count,
+                    max_timestamp = MAX(COALESCE(max_timestamp, excluded.max_timestamp), excluded.max_timestamp),
+                    rewrite_version = CASE WHEN excluded.rewrite_version THEN version + 1 ELSE rewrite_version END
+                """,
+                symbol_stats
+            )
+            score_rollups.update_rollups(conn, rows)
+            score_analytics.update_analytics(conn, rows)
+            versions = {
+                symbol: version for symbol, version in conn.execute(
+                    f"SELECT symbol, version FROM score_symbols WHERE symbol IN ({','.join('?' * len(symbols))})",
+                    tuple(symbols)
+                )
+            }
+        score_cache.write_through(rows, versions)
 
 @app.route('/scores', methods=['POST'])
 def add_score():
     """
     Adds one or more score entries to the database.
     Expects a JSON body that is either a single object:
-    {"symbol": "AAPL", "timestamp": "2025-06-30T12:00:00Z", "score": 95.5}
+    {"symbol": "AAPL", "timestamp": 1751284800000, "score": 95.5}
     OR a list of objects:
     [
-        {"symbol": "AAPL", "timestamp": "2025-06-30T12:00:00Z", "score": 95.5},
+        {"symbol": "AAPL", "timestamp": 1751284800000, "score": 95.5},
         {"symbol": "GOOG", "timestamp": 1678886400000, "score": 120.10}
     ]
-    'timestamp' can be either an ISO 8601 string or a raw integer (milliseconds since epoch).
-    The 'timestamp' will always be stored as milliseconds.
-    """
-    data = request.get_json()
-
-    if not data:
-        return jsonify({"error": "Request must be JSON"}), 400
+    'timestamp' must be a raw integer (milliseconds since epoch).
+    Columnar bodies are accepted too: send Content-Type
+    application/x-score-columns (packed arrays) or
+    application/vnd.apache.arrow.stream (Arrow IPC). Those are decoded
+    straight into arrays and always answered with the summary response.
+    Any body may be compressed with Content-Encoding: gzip or zstd.
 
-    # Ensure data is a list; if not, wrap it in a list for consistent processing
-    if not isinstance(data, list):
-        data = [data]
-
-    processed_scores = []
-    errors = []
+    The whole batch is validated first and the valid items are then written
+    in a single transaction on a pooled connection.
+    Pass '?response=summary' to get back only counts and errors instead of
+    the echoed 'successful_inserts' payload.
+    Pass '?mode=async' (or run with SCORE_INGEST_MODE=async) to have the valid
+    items queued for the background writer; the request is then answered
+    with 202, or 503 if the queue stays full.
+    """
+    summary_only = request.args.get('response') == 'summary'
 
-    conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
+        payload = read_request_body()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        for item in data:
-            if not isinstance(item, dict):
-                errors.append(f"Invalid item format: {item}. Expected an object.")
-                continue
+    if request.mimetype in (score_wire.PACKED_MIMETYPE, score_wire.ARROW_MIMETYPE):
+        try:
+            columns = score_wire.decode(payload, request.mimetype)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        item_count = len(columns.timestamps)
+        rows, errors = validate_score_columns(columns)
+        failed_count = item_count - len(rows)
+        summary_only = True
+    else:
+        data = None
+        if request.is_json:
+            try:
+                data = json.loads(payload)
+            except ValueError:
+                data = None
 
-            symbol = item.get('symbol')
-            timestamp_input = item.get('timestamp') # Can be string or int
-            score = item.get('score')
+        if not data:
+            return jsonify({"error": "Request must be JSON"}), 400
 
-            # Basic validation for each item
-            if not all([symbol, timestamp_input is not None, score is not None]):
-                errors.append(f"Missing 'symbol', 'timestamp', or 'score' in item: {item}")
-                continue
+        # Ensure data is a list; if not, wrap it in a list for consistent processing
+        if not isinstance(data, list):
+            data = [data]
 
-            timestamp_ms = None
-            # Determine if timestamp is already milliseconds or needs conversion from ISO 8601 string
-            if isinstance(timestamp_input, int):
-                timestamp_ms = timestamp_input
-            else:
-                errors.append(f"'timestamp' for item {item} must be a milliseconds integer.")
-                continue
-            
-            # Validate score type
-            if not isinstance(score, (int, float)):
-                errors.append(f"'score' for item {item} must be a number.")
-                continue
+        item_count = len(data)
+        rows, errors = validate_score_items(data)
+        failed_count = len(errors)
 
-            try:
-                cursor.execute(
-                    "INSERT OR REPLACE INTO scores (symbol, timestamp, score) VALUES (?, ?, ?)",
-                    (symbol, timestamp_ms, score)
-                )
-                processed_scores.append({"symbol": symbol, "timestamp": timestamp_ms, "score": score})
-            except sqlite3.Error as e:
-                errors.append(f"Database error for item {item}: {e}")
-            except Exception as e:
-                errors.append(f"An unexpected error occurred for item {item}: {e}")
-
-        conn.commit() # Commit all successful insertions in one go
-        
-        response_message = f"Successfully processed {len(processed_scores)} out of {len(data)} items."
+    if rows and request.args.get('mode', INGEST_MODE) == 'async':
+        try:
+            ingest_queue.put_many(rows, timeout=INGEST_PUT_TIMEOUT)
+        except IngestQueueFull as e:
+            response = jsonify({"error": str(e)})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        body = {
+            "message": f"Queued {len(rows)} out of {item_count} items for writing.",
+            "queued": len(rows),
+            "failed": failed_count,
+        }
         if errors:
-            response_message += f" {len(errors)} items had errors."
-            return jsonify({
-                "message": response_message,
-                "successful_inserts": processed_scores,
-                "errors": errors
-            }), 207 # Multi-Status
-        else:
-            return jsonify({
-                "message": response_message,
-                "successful_inserts": processed_scores
-            }), 201 # Created
+            body["errors"] = errors
+        return jsonify(body), 202 # Accepted
 
+    try:
+        if rows:
+            with connections.write() as conn:
+                write_scores(conn, rows)
     except sqlite3.Error as e:
-        # This catch is for errors before the loop or during connection
-        return jsonify({"error": f"Database connection or initial error: {e}"}), 500
+        return jsonify({"error": f"Database error while writing batch: {e}"}), 500
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred during batch processing: {e}"}), 500
-    finally:
-        if conn:
-            conn.close()
+
+    response_message = f"Successfully processed {len(rows)} out of {item_count} items."
+    if errors:
+        response_message += f" {failed_count} items had errors."
+    body = {"message": response_message}
+    if summary_only:
+        body["inserted"] = len(rows)
+        body["failed"] = failed_count
+    else:
+        body["successful_inserts"] = [
+            {"symbol": symbol, "timestamp": timestamp_ms, "score": score}
+            for symbol, timestamp_ms, score in rows
+        ]
+    if errors:
+        body["errors"] = errors
+        return jsonify(body), 207 # Multi-Status
+    return jsonify(body), 201 # Created
+
+@app.route('/ingest/stats', methods=['GET'])
+def get_ingest_stats():
+    """Returns the write-behind queue counters (depth, throughput, flush latency)."""
+    return jsonify(ingest_queue.stats()), 200
+
+@app.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Returns the hot score cache's symbols, points, memory (and its bound) and hit/miss counters."""
+    return jsonify(score_cache.stats()), 200
+
+# --- Read paths ---
+# Reads never materialize the full result set: rows are pulled from the cursor
+# STREAM_CHUNK_ROWS at a time and encoded straight into the response body.
+STREAM_CHUNK_ROWS = 2000
+MAX_PAGE_LIMIT = 100000
+MAX_DOWNSAMPLE_POINTS = 10000
+DEFAULT_ANALYTICS_LIMIT = 1000
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def _int_arg(name, minimum=None, maximum=None):
+    """Reads an optional integer query parameter, raising ValueError if it is malformed."""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an integer.")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"'{name}' must be at least {minimum}.")
+    if maximum is not None and value > maximum:
+        raise ValueError(f"'{name}' must be at most {maximum}.")
+    return value
+
+def encode_cursor(symbol, timestamp_ms):
+    """Encodes a (symbol, timestamp) keyset position as an opaque URL-safe token."""
+    raw = json.dumps([symbol, timestamp_ms], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Decodes a token produced by encode_cursor, raising ValueError if it is not one."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        symbol, timestamp_ms = json.loads(raw)
+    except Exception:
+        raise ValueError("'after' is not a valid cursor.")
+    if not isinstance(symbol, str) or not isinstance(timestamp_ms, int):
+        raise ValueError("'after' is not a valid cursor.")
+    return symbol, timestamp_ms
+
+RESPONSE_FORMATS = {
+    'json': 'application/json',
+    'ndjson': NDJSON_MIMETYPE,
+    'packed': score_wire.PACKED_MIMETYPE,
+    'arrow': score_wire.ARROW_MIMETYPE,
+}
+
+def response_format():
+    """
+    Picks the response encoding from '?format=' or, failing that, the Accept
+    header. JSON stays the default for clients that do not ask for anything else.
+    """
+    fmt = request.args.get('format')
+    if fmt:
+        if fmt not in RESPONSE_FORMATS:
+            raise ValueError(f"'format' must be one of: {', '.join(RESPONSE_FORMATS)}.")
+        return fmt
+    best = request.accept_mimetypes.best_match(list(RESPONSE_FORMATS.values()), default='application/json')
+    return next(name for name, mimetype in RESPONSE_FORMATS.items() if mimetype == best)
+
+def iter_row_chunks(sql, params):
+    """
+    Runs a query on a pooled connection and yields its rows in chunks of
+    STREAM_CHUNK_ROWS. The connection goes back to the pool when the
+    generator is exhausted or closed by the server.
+    """
+    with connections.read() as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            chunk = cursor.fetchmany(STREAM_CHUNK_ROWS)
+            if not chunk:
+                break
+            yield chunk
+
+def rows_to_dicts(rows):
+    return [{"symbol": row[0], "timestamp": row[1], "score": row[2]} for row in rows]
+
+def stream_json_array(chunks):
+    """Encodes row chunks as one JSON array, chunk by chunk."""
+    yield '['
+    first = True
+    for chunk in chunks:
+        body = json.dumps(rows_to_dicts(chunk))[1:-1]
+        yield body if first else ',' + body
+        first = False
+    yield ']'
+
+def stream_ndjson(chunks):
+    """Encodes row chunks as newline-delimited JSON, one score object per line."""
+    for chunk in chunks:
+        yield '\n'.join(json.dumps(item) for item in rows_to_dicts(chunk)) + '\n'
+
+def rechunk(rows, size=None):
+    """Groups an iterator of rows back into lists of STREAM_CHUNK_ROWS rows."""
+    size = size or STREAM_CHUNK_ROWS
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def scores_response(chunks, limit, next_after, not_found=None):
+    """
+    Builds the response for a generator of row chunks (see iter_row_chunks).
+    - With 'limit', returns one page: {"scores": [...], "next_after": cursor or null}.
+      The query should fetch limit + 1 rows so it is known whether another page exists.
+    - Without it, streams the whole result as a JSON array, or in the format
+      picked by response_format(), one cursor chunk at a time.
+    'next_after' maps the last row of a page to the cursor for the next one.
+    When 'not_found' is given and the query has no rows at all, it is returned
+    as a 404 message instead of an empty result.
+    """
+    fmt = response_format()
+    source = chunks
+    # Pull the first chunk eagerly so database errors and empty results are
+    # reported with a proper status code before streaming starts.
+    first_chunk = next(chunks, None)
+    if first_chunk is None and not_found:
+        return jsonify({"message": not_found}), 404
+    if first_chunk is not None:
+        chunks = itertools.chain([first_chunk], chunks)
+
+    if limit is None:
+        if fmt == 'ndjson':
+            body = stream_ndjson(chunks)
+        elif fmt == 'packed':
+            body = (score_wire.encode_packed(score_wire.columns_from_rows(chunk)) for chunk in chunks)
+        elif fmt == 'arrow':
+            body = score_wire.iter_arrow_stream(score_wire.columns_from_rows(chunk) for chunk in chunks)
+        else:
+            body = stream_json_array(chunks)
+        return Response(body, mimetype=RESPONSE_FORMATS[fmt]), 200
+
+    rows = list(itertools.islice(itertools.chain.from_iterable(chunks), limit + 1))
+    # Hand the pooled connection back now rather than when the generator is collected
+    source.close()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = next_after(rows[-1]) if has_more else None
+    if fmt == 'json':
+        return jsonify({"scores": rows_to_dicts(rows), "next_after": cursor}), 200
+
+    # Other formats carry the page in the body and the cursor in a header
+    if fmt == 'ndjson':
+        body = stream_ndjson([rows] if rows else [])
+    elif fmt == 'packed':
+        body = score_wire.encode_packed(score_wire.columns_from_rows(rows))
+    else:
+        body = b''.join(score_wire.iter_arrow_stream([score_wire.columns_from_rows(rows)]))
+    response = Response(body, mimetype=RESPONSE_FORMATS[fmt])
+    if cursor is not None:
+        response.headers['X-Next-After'] = str(cursor)
+    return response, 200
 
 @app.route('/scores', methods=['GET'])
 def get_all_scores():
     """
-    Retrieves all scores from the database.
+    Retrieves all scores from the database, ordered by (symbol, timestamp).
     Returns stored millisecond timestamps directly in the response.
+
+    Query parameters:
+    - limit: page size. Returns {"scores": [...], "next_after": cursor}.
+    - after: cursor from a previous page's 'next_after' (keyset pagination,
+      so every page costs the same however deep it is).
+    - format=ndjson|packed|arrow (or the matching Accept header): newline-
+      delimited JSON, or the columnar formats from score_wire. For those,
+      a page's cursor is returned in the X-Next-After header.
+    Without 'limit' the full table is streamed, keeping server memory flat.
+    Archived scores are merged in, one symbol at a time.
     """
-    conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT symbol, timestamp, score FROM scores ORDER BY symbol, timestamp")
-        rows = cursor.fetchall()
-
-        scores = []
-        for row in rows:
-            scores.append({
-                "symbol": row[0],
-                "timestamp": row[1], # Return raw milliseconds
-                "score": row[2]
-            })
-        return jsonify(scores), 200
+        limit = _int_arg('limit', minimum=1, maximum=MAX_PAGE_LIMIT)
+        after = request.args.get('after')
+        cursor = decode_cursor(after) if after else None
+        archived = score_archive.archived_symbols()
+        if archived:
+            rows = iter_both_tiers(cursor, archived)
+            if limit is not None:
+                rows = itertools.islice(rows, limit + 1)
+            chunks = rechunk(rows)
+        else:
+            sql = "SELECT symbol, timestamp, score FROM scores"
+            params = ()
+            if cursor:
+                sql += " WHERE (symbol, timestamp) > (?, ?)"
+                params = cursor
+            sql += " ORDER BY symbol, timestamp"
+            if limit is not None:
+                sql += " LIMIT ?"
+                params = (*params, limit + 1)
+            chunks = iter_row_chunks(sql, params)
+        return scores_response(chunks, limit, lambda row: encode_cursor(row[0], row[1]))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except sqlite3.Error as e:
         return jsonify({"error": f"Database error: {e}"}), 500
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
-    finally:
-        if conn:
-            conn.close()
+
+def iter_both_tiers(cursor, archived_symbols):
+    """
+    Yields every (symbol, timestamp, score) row of SQLite and the Parquet
+    archive after the (symbol, timestamp) 'cursor' (None = from the start),
+    ordered by symbol then timestamp, the SQLite row winning on a duplicate.
+    """
+    after_symbol, after_ts = cursor if cursor else (None, None)
+    with connections.read() as conn:
+        sql = "SELECT DISTINCT symbol FROM scores"
+        params = ()
+        if after_symbol is not None:
+            sql += " WHERE symbol >= ?"
+            params = (after_symbol,)
+        symbols = {row[0] for row in conn.execute(sql, params)}
+    symbols.update(symbol for symbol in archived_symbols if after_symbol is None or symbol >= after_symbol)
+    # Python orders str by code point, like SQLite's BINARY collation on UTF-8
+    for symbol in sorted(symbols):
+        lower = after_ts + 1 if symbol == after_symbol else None
+        sql = "SELECT symbol, timestamp, score FROM scores WHERE symbol = ?"
+        params = (symbol,)
+        if lower is not None:
+            sql += " AND timestamp >= ?"
+            params += (lower,)
+        hot = itertools.chain.from_iterable(iter_row_chunks(sql + " ORDER BY timestamp", params))
+        yield from score_archive.merge_tiers(symbol, score_archive.read_archived(symbol, lower), hot)
+
+def bucket_from_rollups(conn, symbol, start, end, points, rollup):
+    """
+    Bucketed downsampling served from a score_rollups interval instead of raw
+    scores. The grid is snapped to the rollup: the bucket width becomes a
+    multiple of the interval and 'start' is floored to it, so every rollup
+    row lands in exactly one output bucket.
+    """
+    interval, width = rollup
+    grid_start = start - start % width
+    bucket_ms = -(-(end - grid_start + 1) // points) # ceil division
+    bucket_ms = -(-bucket_ms // width) * width       # round up to a multiple of the interval
+    # 'last' comes from the rollup row holding the bucket's MAX(last_timestamp),
+    # looked up by key (a bare column next to several aggregates is undefined)
+    cursor = conn.execute(
+        """
+        SELECT g.b, g.count, g.min, g.max, g.mean, g.last_timestamp,
+               (SELECT last FROM score_rollups
+                WHERE symbol = ? AND interval = ? AND bucket = g.last_timestamp - g.last_timestamp % ?)
+        FROM (
+            SELECT (bucket - ?) / ? AS b, SUM(count) AS count, MIN(min) AS min, MAX(max) AS max,
+                   SUM(sum) / SUM(count) AS mean, MAX(last_timestamp) AS last_timestamp
+            FROM score_rollups
+            WHERE symbol = ? AND interval = ? AND bucket BETWEEN ? AND ?
+            GROUP BY b
+        ) AS g
+        ORDER BY g.b
+        """,
+        (symbol, interval, width, grid_start, bucket_ms, symbol, interval, grid_start, end)
+    )
+    return {
+        "start": grid_start,
+        "bucket_ms": bucket_ms,
+        "resolution": interval,
+        "points": [
+            {"timestamp": grid_start + bucket * bucket_ms, "count": count, "min": low,
+             "max": high, "mean": mean, "last": last, "last_timestamp": last_ts}
+            for bucket, count, low, high, mean, last_ts, last in cursor
+        ],
+    }
+
+def load_score_arrays(conn, symbol, start, end, cold=None):
+    """
+    Loads the scores of a symbol within [start, end] as (int64 timestamps,
+    float64 scores) arrays, merged with archived rows from 'cold' if given.
+    """
+    rows = conn.execute(
+        "SELECT symbol, timestamp, score FROM scores WHERE symbol = ? AND timestamp BETWEEN ? AND ? ORDER BY timestamp",
+        (symbol, start, end)
+    )
+    if cold is not None:
+        rows = score_archive.merge_tiers(symbol, cold, rows)
+    # Flatten straight into one float64 buffer; millisecond timestamps fit
+    # exactly in a double, so no per-row dicts are built for the full range.
+    data = np.fromiter(itertools.chain.from_iterable(row[1:] for row in rows), dtype=np.float64).reshape(-1, 2)
+    return data[:, 0].astype(np.int64), data[:, 1]
+
+def downsample_scores(symbol, start, end, points, method):
+    """
+    Reduces the scores of 'symbol' within [start, end] to at most 'points' entries.
+    - method='bucket': splits the range into 'points' equal intervals and returns
+      count/min/max/mean/last per interval. When the interval spans at least
+      a minute the coarsest fitting rollup table is used (rollups also cover
+      archived scores), otherwise raw scores are aggregated inside SQLite.
+    - method='lttb': returns the Largest-Triangle-Three-Buckets selection of raw scores.
+    Raw reads include the Parquet cold tier when the range reaches into it.
+    Missing bounds default to the first/last stored timestamp for the symbol.
+    """
+    with connections.read() as conn:
+        if start is None or end is None:
+            first_ts, last_ts = conn.execute(
+                "SELECT MIN(timestamp), MAX(timestamp) FROM scores WHERE symbol = ?", (symbol,)
+            ).fetchone()
+            cold_bounds = score_archive.archived_bounds(symbol)
+            if cold_bounds:
+                first_ts = cold_bounds[0] if first_ts is None else min(first_ts, cold_bounds[0])
+                last_ts = cold_bounds[1] if last_ts is None else max(last_ts, cold_bounds[1])
+            if first_ts is None:
+                return None
+            start = first_ts if start is None else start
+            end = last_ts if end is None else end
+
+        result = {"symbol": symbol, "start": start, "end": end, "method": method}
+        if method == 'bucket':
+            bucket_ms = max(1, -(-(end - start + 1) // points)) # ceil division
+            rollup = score_rollups.pick_interval(bucket_ms)
+            if rollup and score_rollups.has_rollups(conn, symbol, rollup[0]):
+                result.update(bucket_from_rollups(conn, symbol, start, end, points, rollup))
+                return result
+            result["bucket_ms"] = bucket_ms
+            result["resolution"] = "raw"
+
+            if score_archive.partition_files(symbol, start, end):
+                timestamps, scores = load_score_arrays(
+                    conn, symbol, start, end, score_archive.read_archived(symbol, start, end)
+                )
+                buckets = bucket_aggregate(timestamps, scores, start, bucket_ms)
+                rows = zip(*(buckets[key].tolist() for key in
+                             ('bucket', 'count', 'min', 'max', 'mean', 'last_timestamp', 'last')))
+            else:
+                # A bare column next to several aggregates comes from an
+                # undefined row, so the last score of each bucket is looked up
+                # by its (symbol, MAX(timestamp)) primary key instead.
+                rows = conn.execute(
+                    """
+                    SELECT g.bucket, g.count, g.min, g.max, g.mean, g.last_timestamp,
+                           (SELECT score FROM scores WHERE symbol = ? AND timestamp = g.last_timestamp)
+                    FROM (
+                        SELECT (timestamp - ?) / ? AS bucket, COUNT(*) AS count, MIN(score) AS min,
+                               MAX(score) AS max, AVG(score) AS mean, MAX(timestamp) AS last_timestamp
+                        FROM scores
+                        WHERE symbol = ? AND timestamp BETWEEN ? AND ?
+                        GROUP BY bucket
+                    ) AS g
+                    ORDER BY g.bucket
+                    """,
+                    (symbol, start, bucket_ms, symbol, start, end)
+                )
+            result["points"] = [
+                {"timestamp": start + bucket * bucket_ms, "count": count, "min": low,
+                 "max": high, "mean": mean, "last": last, "last_timestamp": last_ts}
+                for bucket, count, low, high, mean, last_ts, last in rows
+            ]
+        else:
+            cold = None
+            if score_archive.partition_files(symbol, start, end):
+                cold = score_archive.read_archived(symbol, start, end)
+            timestamps, scores = load_score_arrays(conn, symbol, start, end, cold)
+            keep = lttb_indices(timestamps, scores, points)
+            result["points"] = [
+                {"symbol": symbol, "timestamp": ts, "score": score}
+                for ts, score in zip(timestamps[keep].tolist(), scores[keep].tolist())
+            ]
+    return result
+
+def symbol_validators(symbol):
+    """
+    Returns (row_count, max_timestamp, version, updated_at, archive_signature,
+    rewrite_version) for a symbol across both tiers, or None if it has no
+    scores at all. Everything but the archive signature comes from the
+    symbol's score_symbols row, kept up to date by write_scores (row_count
+    counts a timestamp held by both tiers once), so validating a request
+    doesn't scan the scores.
+    """
+    with connections.read() as conn:
+        state = conn.execute(
+            "SELECT row_count, max_timestamp, version, updated_at, rewrite_version FROM score_symbols WHERE symbol = ?",
+            (symbol,)
+        ).fetchone()
+    count, max_ts, version, updated_at, rewrite_version = state if state else (0, None, 0, None, 0)
+    signature = score_archive.archive_signature(symbol)
+    if signature and state is None:
+        # Archived by hand, without a score_symbols row to keep the count in
+        count = score_archive.archived_row_count(symbol)
+    if signature and max_ts is None:
+        max_ts = score_archive.archived_bounds(symbol)[1]
+    if not count:
+        return None
+    return count, max_ts, version, updated_at, signature, rewrite_version
+
+def symbol_etag(validators):
+    """
+    Builds the ETag for a symbol read from its validators and the request's
+    representation (format and query parameters). 'since' is left out on
+    purpose: a delta poller sends a new watermark every time but still wants
+    a 304 while the symbol itself is unchanged.
+    """
+    args = sorted((key, value) for key, value in request.args.items(multi=True) if key != 'since')
+    fingerprint = json.dumps([validators[0], validators[1], validators[2], validators[4], response_format(), args])
+    return hashlib.sha1(fingerprint.encode()).hexdigest()
 
 @app.route('/scores/<string:symbol>', methods=['GET'])
 def get_scores_by_symbol(symbol):
     """
-    Retrieves scores for a specific symbol from the database.
+    Retrieves scores for a specific symbol from the database, ordered by timestamp.
     Returns stored millisecond timestamps directly in the response.
+
+    Query parameters:
+    - start / end: inclusive millisecond bounds, served from the (symbol, timestamp) key.
+    - since: only scores newer than this watermark (ms), for incremental sync.
+    - limit: page size. Returns {"scores": [...], "next_after": timestamp}.
+    - after: only scores with a timestamp greater than this value (ms).
+    - format=ndjson|packed|arrow (or the matching Accept header): see get_all_scores.
+    - points: downsample the range to at most this many points instead of
+      returning raw rows, using 'method' = 'bucket' (default, min/max/mean/last
+      per interval) or 'lttb'.
+    Without 'limit' or 'points' the full range is streamed. Ranges the
+    score_cache ring buffers cover (the recent tail) are served from memory.
+
+    Responses carry an ETag (from the symbol's row count, max timestamp and
+    write version) and Last-Modified, plus X-Score-Count / X-Score-Max-Timestamp
+    and X-Score-Version / X-Score-Rewrite-Version (the write version, and the
+    last version that replaced or backfilled scores at or before the max
+    timestamp - a 'since' poller has to reload when that one changes).
+    A matching If-None-Match or If-Modified-Since is answered with 304.
     """
-    conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT symbol, timestamp, score FROM scores WHERE symbol = ? ORDER BY timestamp", (symbol,))
-        rows = cursor.fetchall()
+        validators = symbol_validators(symbol)
+        if validators is None:
+            return read_symbol_scores(symbol)
+
+        etag = symbol_etag(validators)
+        updated_at = validators[3]
+        last_modified = None if updated_at is None else datetime.fromtimestamp(updated_at / 1000, tz=timezone.utc)
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            # HTTP dates have one-second resolution, so compare whole seconds
+            not_modified = (last_modified is not None and request.if_modified_since is not None
+                            and updated_at // 1000 <= int(request.if_modified_since.timestamp()))
 
-        if not rows:
+        response = make_response(Response(status=304) if not_modified else read_symbol_scores(symbol))
+        if response.status_code in (200, 304):
+            response.set_etag(etag)
+            response.vary.add('Accept')
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.headers['X-Score-Count'] = str(validators[0])
+            response.headers['X-Score-Max-Timestamp'] = str(validators[1])
+            response.headers['X-Score-Version'] = str(validators[2])
+            response.headers['X-Score-Rewrite-Version'] = str(validators[5])
+        return response
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except sqlite3.Error as e:
+        return jsonify({"error": f"Database error: {e}"}), 500
+    except Exception as e:
+        return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
+
+def read_symbol_scores(symbol):
+    """Builds the body of get_scores_by_symbol once the conditional checks have passed."""
+    start = _int_arg('start')
+    end = _int_arg('end')
+    if start is not None and end is not None and start > end:
+        raise ValueError("'start' must not be after 'end'.")
+
+    points = _int_arg('points', minimum=3, maximum=MAX_DOWNSAMPLE_POINTS)
+    if points is not None:
+        method = request.args.get('method', 'bucket')
+        if method not in ('bucket', 'lttb'):
+            raise ValueError("'method' must be 'bucket' or 'lttb'.")
+        result = downsample_scores(symbol, start, end, points, method)
+        if result is None:
             return jsonify({"message": f"No scores found for symbol '{symbol}'"}), 404
+        return jsonify(result), 200
+
+    limit = _int_arg('limit', minimum=1, maximum=MAX_PAGE_LIMIT)
+    after = _int_arg('after')
+    since = _int_arg('since')
+    lower = start
+    for watermark in (after, since):
+        if watermark is not None:
+            lower = watermark + 1 if lower is None else max(lower, watermark + 1)
+
+    # Recent tails are served from the in-memory ring buffers
+    cached = score_cache.read(symbol, lower, end)
+    if cached is not None:
+        timestamps, scores = cached
+        if limit is not None:
+            timestamps, scores = timestamps[:limit + 1], scores[:limit + 1]
+        chunks = rechunk(zip(itertools.repeat(symbol), timestamps.tolist(), scores.tolist()))
+    else:
+        sql = "SELECT symbol, timestamp, score FROM scores WHERE symbol = ?"
+        params = (symbol,)
+        if lower is not None:
+            sql += " AND timestamp >= ?"
+            params += (lower,)
+        if end is not None:
+            sql += " AND timestamp <= ?"
+            params += (end,)
+        sql += " ORDER BY timestamp"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit + 1,)
+        chunks = iter_row_chunks(sql, params)
+
+        # Stitch in the Parquet cold tier when the requested range reaches into it
+        if score_archive.partition_files(symbol, lower, end):
+            cold = score_archive.read_archived(symbol, lower, end)
+            chunks = rechunk(score_archive.merge_tiers(symbol, cold, itertools.chain.from_iterable(chunks)))
+
+    # A page past the end, an empty time range or an up-to-date watermark
+    # is simply empty; only a symbol without any scores is a 404
+    filtered = any(value is not None for value in (after, since, start, end))
+    not_found = None if filtered else f"No scores found for symbol '{symbol}'"
+    return scores_response(chunks, limit, lambda row: row[1], not_found=not_found)
+
+@app.route('/scores/<string:symbol>/analytics', methods=['GET'])
+def get_score_analytics(symbol):
+    """
+    Returns the rolling analytics score_analytics maintains at ingest time
+    (EMAs, rolling mean / std / z-score), without recomputing anything.
+
+    Query parameters:
+    - start / end: inclusive millisecond bounds of the series.
+    - limit: only the last 'limit' points of the range (default 1000).
+    - latest=true: only the metrics of the newest score, read from the
+      per-symbol state in constant time.
+
+    Returns {"symbol", "windows", "ema_spans", "latest": {"timestamp",
+    "metrics", "stale_from"}, "series": [{"timestamp", <metric>: value, ...},
+    ...]} with the series oldest first. 'stale_from' is set while a long
+    backfill is being replayed in the background: metrics from there on are
+    not up to date yet.
+    """
+    try:
+        start = _int_arg('start')
+        end = _int_arg('end')
+        limit = _int_arg('limit', minimum=1, maximum=MAX_PAGE_LIMIT) or DEFAULT_ANALYTICS_LIMIT
+        latest_only = request.args.get('latest', '').lower() in ('1', 'true', 'yes')
+        if start is not None and end is not None and start > end:
+            raise ValueError("'start' must not be after 'end'.")
 
-        scores = []
-        for row in rows:
-            scores.append({
-                "symbol": row[0],
-                "timestamp": row[1], # Return raw milliseconds
-                "score": row[2]
-            })
-        return jsonify(scores), 200
+        with connections.read() as conn:
+            latest = score_analytics.latest_analytics(conn, symbol)
+            if latest is None:
+                return jsonify({"message": f"No analytics found for symbol '{symbol}'"}), 404
+            body = {
+                "symbol": symbol,
+                "windows": list(score_analytics.ANALYTICS_WINDOWS),
+                "ema_spans": list(score_analytics.ANALYTICS_EMA_SPANS),
+                "latest": latest,
+            }
+            if not latest_only:
+                sql = "SELECT timestamp, metrics FROM score_analytics WHERE symbol = ?"
+                params = (symbol,)
+                if start is not None:
+                    sql += " AND timestamp >= ?"
+                    params += (start,)
+                if end is not None:
+                    sql += " AND timestamp <= ?"
+                    params += (end,)
+                # Newest first through the primary key, so only 'limit' rows are read
+                rows = conn.execute(sql + " ORDER BY timestamp DESC LIMIT ?", params + (limit,)).fetchall()
+                body["series"] = [dict(json.loads(metrics), timestamp=timestamp) for timestamp, metrics in reversed(rows)]
+        return jsonify(body), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except sqlite3.Error as e:
         return jsonify({"error": f"Database error: {e}"}), 500
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
-    finally:
-        if conn:
-            conn.close()
 
 @app.route('/scores/<string:symbol>', methods=['DELETE'])
 def delete_scores_by_symbol(symbol):
-    """Deletes all scores for a specific symbol from the database."""
-    conn = None
+    """Deletes all scores for a specific symbol, from the database and from the Parquet archive."""
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM scores WHERE symbol = ?", (symbol,))
-        rows_affected = cursor.rowcount
-        conn.commit()
+        with score_cache.writing(), connections.write() as conn:
+            cursor = conn.cursor()
+            # Both tiers' rows, with a timestamp held by each counted once
+            state = cursor.execute("SELECT row_count FROM score_symbols WHERE symbol = ?", (symbol,)).fetchone()
+            cursor.execute("DELETE FROM scores WHERE symbol = ?", (symbol,))
+            hot_deleted = cursor.rowcount
+            cursor.execute("DELETE FROM score_symbols WHERE symbol = ?", (symbol,))
+            score_rollups.delete_rollups(conn, symbol)
+            score_analytics.delete_analytics(conn, symbol)
+            conn.commit()
+            # The cold tier too, or GET and fetch_symbols would still see the archived scores
+            cold_deleted = score_archive.delete_archived(symbol)
+            rows_affected = state[0] if state else hot_deleted + cold_deleted
+            score_cache.drop(symbol)
 
         if rows_affected > 0:
             return jsonify({"message": f"Successfully deleted {rows_affected} scores for symbol '{symbol}'"}), 200
@@ -227,9 +1070,6 @@ def delete_scores_by_symbol(symbol):
         return jsonify({"error": f"Database error: {e}"}), 500
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
-    finally:
-        if conn:
-            conn.close()
 
 if __name__ == '__main__':
     # When running locally for testing, host='0.0.0.0' makes it accessible
@@ -0,0 +1,251 @@
+"""
+Compact columnar wire formats for score data.
+
+Two binary encodings are supported next to plain JSON:
+
+- PACKED_MIMETYPE: a sequence of self-contained frames, each holding
+  a symbol dictionary, int32 symbol codes, int64 timestamps and float64 scores.
+  All numeric columns are little-endian and 8-byte aligned so they can be
+  mapped with numpy.frombuffer without copying.
+
+      magic 'SCF2' | uint32 rows | uint32 dictionary entries | uint32 dictionary bytes
+      dictionary (utf-8 symbols joined by NUL, padded to 8 bytes)
+      int32 codes (padded to 8 bytes) | int64 timestamps | float64 scores
+
+- ARROW_MIMETYPE: an Arrow IPC stream with a 'symbol' column of strings
+  (usually dictionary-encoded), 'timestamp' (int64) and 'score' (float64).
+  Needs pyarrow.
+
+A stream is just frames (or record batches) written one after another, so
+the server can emit one per cursor chunk. Decoders return ScoreColumns whose
+arrays are numpy views over the payload; no Python object is created per row.
+"""
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow support is optional; the packed format needs only numpy
+    pa = None
+
+PACKED_MIMETYPE = 'application/x-score-columns'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+_MAGIC = b'SCF2'
+_HEADER = struct.Struct('<4sIII')
+
+ScoreColumns = namedtuple('ScoreColumns', ['dictionary', 'codes', 'timestamps', 'scores'])
+ScoreColumns.__doc__ = """
+Columnar score batch: row i has symbol dictionary[codes[i]],
+timestamp timestamps[i] (ms, int64) and score scores[i] (float64).
+"""
+
+
+def _pad(size):
+    return -size % 8
+
+
+def columns_from_rows(rows):
+    """Builds ScoreColumns from (symbol, timestamp, score) tuples, e.g. a cursor chunk."""
+    if not rows:
+        return ScoreColumns([], np.empty(0, np.int32), np.empty(0, np.int64), np.empty(0, np.float64))
+    symbols, timestamps, scores = zip(*rows)
+    dictionary, codes = np.unique(np.array(symbols, dtype=object), return_inverse=True)
+    return ScoreColumns(
+        dictionary.tolist(),
+        codes.astype(np.int32),
+        np.array(timestamps, dtype=np.int64),
+        np.array(scores, dtype=np.float64),
+    )
+
+
+def columns_from_arrays(symbols, timestamps, scores):
+    """Builds ScoreColumns from array-likes (lists, numpy arrays or pandas Series)."""
+    dictionary, codes = np.unique(np.asarray(symbols, dtype=object), return_inverse=True)
+    return ScoreColumns(
+        dictionary.tolist(),
+        codes.astype(np.int32),
+        np.ascontiguousarray(timestamps, dtype=np.int64),
+        np.ascontiguousarray(scores, dtype=np.float64),
+    )
+
+
+def encode_packed(columns):
+    """Encodes one ScoreColumns batch as a single packed frame (bytes)."""
+    rows = len(columns.timestamps)
+    dictionary = '\0'.join(columns.dictionary).encode('utf-8')
+    codes = np.ascontiguousarray(columns.codes, dtype='<i4')
+    parts = [
+        _HEADER.pack(_MAGIC, rows, len(columns.dictionary), len(dictionary)),
+        dictionary, b'\0' * _pad(_HEADER.size + len(dictionary)),
+        codes.tobytes(), b'\0' * _pad(codes.nbytes),
+        np.ascontiguousarray(columns.timestamps, dtype='<i8').tobytes(),
+        np.ascontiguousarray(columns.scores, dtype='<f8').tobytes(),
+    ]
+    return b''.join(parts)
+
+
+def iter_packed_frames(payload):
+    """Yields a ScoreColumns for every frame in a packed payload or stream."""
+    buffer = memoryview(payload)
+    offset = 0
+    while offset < len(buffer):
+        if len(buffer) - offset < _HEADER.size:
+            raise ValueError("Truncated packed score frame header.")
+        magic, rows, entries, dictionary_size = _HEADER.unpack_from(buffer, offset)
+        if magic != _MAGIC:
+            raise ValueError("Payload is not a packed score stream.")
+        offset += _HEADER.size
+        dictionary = bytes(buffer[offset:offset + dictionary_size]).decode('utf-8')
+        offset += dictionary_size + _pad(_HEADER.size + dictionary_size)
+
+        codes_size = rows * 4
+        end = offset + codes_size + _pad(codes_size) + rows * 16
+        if end > len(buffer):
+            raise ValueError("Truncated packed score frame.")
+        codes = np.frombuffer(buffer, dtype='<i4', count=rows, offset=offset)
+        offset += codes_size + _pad(codes_size)
+        timestamps = np.frombuffer(buffer, dtype='<i8', count=rows, offset=offset)
+        offset += rows * 8
+        scores = np.frombuffer(buffer, dtype='<f8', count=rows, offset=offset)
+        offset += rows * 8
+
+        # The entry count tells [] from [''], which both pack to zero bytes
+        symbols = dictionary.split('\0') if entries else []
+        if len(symbols) != entries:
+            raise ValueError("Packed score frame dictionary doesn't match its entry count.")
+        if rows and (codes.min() < 0 or codes.max() >= len(symbols)):
+            raise ValueError("Packed score frame has symbol codes outside its dictionary.")
+        yield ScoreColumns(symbols, codes, timestamps, scores)
+
+
+def _arrow_schema():
+    return pa.schema([
+        ('symbol', pa.dictionary(pa.int32(), pa.string())),
+        ('timestamp', pa.int64()),
+        ('score', pa.float64()),
+    ])
+
+
+def _require_arrow():
+    if pa is None:
+        raise ValueError("Arrow IPC requires the 'pyarrow' package, which is not installed.")
+
+
+def _to_record_batch(columns):
+    symbol = pa.DictionaryArray.from_arrays(
+        pa.array(columns.codes, type=pa.int32()), pa.array(columns.dictionary, type=pa.string())
+    )
+    return pa.RecordBatch.from_arrays(
+        [symbol, pa.array(columns.timestamps, type=pa.int64()), pa.array(columns.scores, type=pa.float64())],
+        schema=_arrow_schema(),
+    )
+
+
+class _ChunkSink:
+    """Write-only file object that collects what the Arrow writer emits."""
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_arrow_stream(batches):
+    """
+    Encodes an iterable of ScoreColumns as an Arrow IPC stream, yielding the
+    bytes of each record batch as soon as it is written.
+    """
+    _require_arrow()
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), _arrow_schema())
+    for columns in batches:
+        writer.write_batch(_to_record_batch(columns))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def iter_arrow_batches(payload):
+    """Yields a ScoreColumns for every record batch in an Arrow IPC stream."""
+    _require_arrow()
+    try:
+        reader = pa.ipc.open_stream(pa.py_buffer(payload))
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"Payload is not an Arrow IPC stream: {e}")
+    names = reader.schema.names
+    if not {'symbol', 'timestamp', 'score'} <= set(names):
+        raise ValueError("Arrow stream must have 'symbol', 'timestamp' and 'score' columns.")
+    symbol_type = reader.schema.field('symbol').type
+    if pa.types.is_dictionary(symbol_type):
+        symbol_type = symbol_type.value_type
+    if not (pa.types.is_string(symbol_type) or pa.types.is_large_string(symbol_type)):
+        raise ValueError(f"Arrow stream 'symbol' column must hold strings, not {reader.schema.field('symbol').type}.")
+    for batch in reader:
+        symbol = batch.column(names.index('symbol'))
+        if not pa.types.is_dictionary(symbol.type):
+            symbol = symbol.dictionary_encode()
+        if symbol.null_count or batch.column(names.index('timestamp')).null_count \
+                or batch.column(names.index('score')).null_count:
+            raise ValueError("Arrow stream columns must not contain nulls.")
+        yield ScoreColumns(
+            symbol.dictionary.to_pylist(),
+            symbol.indices.to_numpy(zero_copy_only=False).astype(np.int32, copy=False),
+            batch.column(names.index('timestamp')).cast(pa.int64()).to_numpy(),
+            batch.column(names.index('score')).cast(pa.float64()).to_numpy(),
+        )
+
+
+def concat_columns(batches):
+    """Merges several ScoreColumns into one, remapping codes onto a shared dictionary."""
+    batches = list(batches)
+    if len(batches) == 1:
+        return batches[0]
+    if not batches:
+        return columns_from_rows([])
+    dictionary = sorted(set().union(*(batch.dictionary for batch in batches)))
+    position = {symbol: i for i, symbol in enumerate(dictionary)}
+    codes = [
+        np.array([position[symbol] for symbol in batch.dictionary], dtype=np.int32)[batch.codes]
+        if len(batch.codes) else np.empty(0, np.int32)
+        for batch in batches
+    ]
+    return ScoreColumns(
+        dictionary,
+        np.concatenate(codes),
+        np.concatenate([batch.timestamps for batch in batches]),
+        np.concatenate([batch.scores for batch in batches]),
+    )
+
+
+def decode(payload, mimetype):
+    """Decodes a whole packed or Arrow payload into a single ScoreColumns."""
+    if mimetype == PACKED_MIMETYPE:
+        return concat_columns(iter_packed_frames(payload))
+    if mimetype == ARROW_MIMETYPE:
+        return concat_columns(iter_arrow_batches(payload))
+    raise ValueError(f"Unsupported score wire format '{mimetype}'.")
+
+
+def to_dataframe(columns):
+    """
+    Turns ScoreColumns into a pandas DataFrame with a categorical 'symbol'
+    column built from the codes, so no string object is created per row.
+    """
+    import pandas as pd
+
+    symbol = pd.Categorical.from_codes(columns.codes, categories=columns.dictionary)
+    return pd.DataFrame({'symbol': symbol, 'timestamp': columns.timestamps, 'score': columns.scores})
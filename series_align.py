@@ -0,0 +1,143 @@
+"""
+Vectorized alignment of score series onto candle grids.
+
+Everything works on sorted int64 millisecond timestamps with searchsorted, so
+joining N scores onto M candles costs O((N + M) log M) without building merge
+keys, sorting or re-indexing frames:
+
+- asof_indices / align_asof: for each left timestamp the last right value at
+  or before it (merge_asof direction='backward'), optionally within a tolerance;
+- bucket_reduce: every score falling inside [candle open, open + width)
+  reduced to one value per candle ('last', 'first', 'mean', 'min', 'max',
+  'sum' or 'count'), so several scores in one candle are no longer dropped or
+  duplicated;
+- align_to_candles: bucket_reduce, with empty candles optionally filled from
+  the last earlier score within a tolerance;
+- align_symbols: align_to_candles for every symbol of a long
+  (symbol, timestamp, score) frame at once, one output column per symbol.
+"""
+import numpy as np
+import pandas as pd
+
+REDUCERS = ('last', 'first', 'mean', 'min', 'max', 'sum', 'count')
+
+
+def to_epoch_ms(values):
+    """Converts datetimes (Series, Index or array, naive = UTC) or integer ms to an int64 ms array."""
+    if isinstance(getattr(values, 'dtype', None), pd.DatetimeTZDtype):
+        values = pd.DatetimeIndex(values).tz_convert('UTC').tz_localize(None)
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ms]').astype(np.int64)
+    return values.astype(np.int64, copy=False)
+
+
+def asof_indices(left_ts, right_ts, tolerance=None):
+    """
+    For each of the sorted 'left_ts', the index of the last of the sorted
+    'right_ts' at or before it, or -1 if there is none (or it is more than
+    'tolerance' ms earlier).
+
+    Returns:
+        numpy.ndarray: int64 indices into right_ts.
+    """
+    idx = np.searchsorted(right_ts, left_ts, side='right') - 1
+    if tolerance is not None and len(right_ts):
+        too_old = left_ts - right_ts[np.maximum(idx, 0)] > tolerance
+        idx[too_old] = -1
+    return idx.astype(np.int64, copy=False)
+
+
+def align_asof(left_ts, right_ts, values, tolerance=None, fill=np.nan):
+    """Values of the last right timestamp at or before each left timestamp (see asof_indices)."""
+    idx = asof_indices(left_ts, right_ts, tolerance)
+    out = np.full(len(left_ts), fill, dtype=np.float64)
+    matched = idx >= 0
+    out[matched] = np.asarray(values, dtype=np.float64)[idx[matched]]
+    return out
+
+
+def bucket_reduce(bucket_starts, bucket_ms, ts, values, how='last', fill=np.nan):
+    """
+    Reduces the (sorted) 'ts'/'values' series to one value per bucket
+    [bucket_starts[i], bucket_starts[i] + bucket_ms). Buckets must be sorted
+    and non-overlapping; points outside every bucket are ignored.
+
+    Returns:
+        numpy.ndarray: float64 array aligned with bucket_starts, 'fill' for
+        empty buckets (0 for how='count').
+    """
+    if how not in REDUCERS:
+        raise ValueError(f"Unknown reducer '{how}', expected one of {REDUCERS}.")
+    n = len(bucket_starts)
+    out = np.full(n, 0.0 if how == 'count' else fill, dtype=np.float64)
+    if n == 0 or len(ts) == 0:
+        return out
+
+    bucket = np.searchsorted(bucket_starts, ts, side='right') - 1
+    inside = (bucket >= 0) & (ts < bucket_starts[np.maximum(bucket, 0)] + bucket_ms)
+    if not inside.all():
+        bucket, values = bucket[inside], np.asarray(values)[inside]
+    if len(bucket) == 0:
+        return out
+    values = np.asarray(values, dtype=np.float64)
+
+    # 'ts' is sorted, so every bucket is one contiguous run
+    run_starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    run_buckets = bucket[run_starts]
+    if how == 'last':
+        out[run_buckets] = values[np.r_[run_starts[1:] - 1, len(values) - 1]]
+    elif how == 'first':
+        out[run_buckets] = values[run_starts]
+    elif how == 'count':
+        out[run_buckets] = np.diff(np.r_[run_starts, len(values)])
+    elif how == 'mean':
+        out[run_buckets] = np.add.reduceat(values, run_starts) / np.diff(np.r_[run_starts, len(values)])
+    else:
+        out[run_buckets] = {'min': np.minimum, 'max': np.maximum, 'sum': np.add}[how].reduceat(values, run_starts)
+    return out
+
+
+def align_to_candles(candle_ts, bucket_ms, ts, values, how='last', tolerance=None):
+    """
+    One score per candle: the 'how' reduction of the scores inside each candle.
+    With 'tolerance' (ms), candles without a score of their own take the last
+    earlier score, as long as it is at most 'tolerance' before the candle open.
+
+    Returns:
+        numpy.ndarray: float64 array aligned with candle_ts (NaN = no score).
+    """
+    candle_ts = to_epoch_ms(candle_ts)
+    ts = to_epoch_ms(ts)
+    out = bucket_reduce(candle_ts, bucket_ms, ts, values, how)
+    if tolerance is not None:
+        empty = np.isnan(out)
+        if empty.any():
+            out[empty] = align_asof(candle_ts[empty], ts, values, tolerance)
+    return out
+
+
+def align_symbols(candle_ts, bucket_ms, scores, how='last', tolerance=None):
+    """
+    Aligns every symbol of a long scores frame ('symbol', 'timestamp' in ms,
+    'score') onto one candle grid.
+
+    Returns:
+        pd.DataFrame: one float64 column per symbol, one row per candle
+        (index = candle_ts).
+    """
+    candle_ts = to_epoch_ms(candle_ts)
+    codes, symbols = pd.factorize(scores['symbol'], sort=True)
+    ts = to_epoch_ms(scores['timestamp'])
+    values = scores['score'].to_numpy(dtype=np.float64)
+    # Group by symbol, keeping each group sorted by timestamp
+    order = np.lexsort((ts, codes))
+    codes, ts, values = codes[order], ts[order], values[order]
+    bounds = np.searchsorted(codes, np.arange(len(symbols) + 1))
+
+    columns = {
+        symbol: align_to_candles(candle_ts, bucket_ms, ts[bounds[i]:bounds[i + 1]],
+                                 values[bounds[i]:bounds[i + 1]], how, tolerance)
+        for i, symbol in enumerate(symbols)
+    }
+    return pd.DataFrame(columns, index=candle_ts)
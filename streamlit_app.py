@@ -1,13 +1,20 @@
 import streamlit as st
+import math
 import os
 import pandas as pd
-import plotly.graph_objects as go
-import ccxt as ccxt
-import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from dotenv import load_dotenv
-from db_manager import fetch_symbols, fetch_scores, fetch_balance_history
-from ccxt_helper import get_balance_in_usdt
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from db_manager import fetch_symbols, fetch_scores, fetch_scores_wide, fetch_balance_history
+from candle_store import get_candles
+from trade_store import sync_trades, load_trades
+import exchange_factory
+from series_align import align_to_candles
+from chart_builder import build_balance_figure, build_kline_figure, build_sparkline_grid, build_correlation_heatmap
+from score_overview import latest_scores, score_correlation
+from query_cache import cache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,45 +28,41 @@ if not API_KEY or not API_SECRET:
     st.stop() # Stop the app if crucial credentials are missing
 
 # --- Initialize CCXT Exchange (cached for efficiency) ---
-@st.cache_resource
-def get_exchange(type):
-    """Initializes and returns the CCXT Binance exchange object."""
-    exchange = ccxt.binance(
-        {
-            'apiKey': API_KEY,
-            'secret': API_SECRET,
-            'enableRateLimit': True,
-            'options': {
-                'defaultType': type,  # spot, margin, future, delivery
-                'adjustForTimeDifference': True,
-            }
-        }
-    )
-    return exchange
+# Instances are shared per process by exchange_factory, which also refreshes their markets.
+# The loaders below run on worker threads (and for several sessions at once), so
+# they hold the instance's lock while using it. Each loader asks for its own
+# role, so the trades and klines round trips still run in parallel.
+def get_exchange(type, role=None):
+    """
+    Returns the CCXT Binance exchange object for 'role', locked for the
+    duration of a 'with' block; markets are loaded from the on-disk cache when fresh.
+    """
+    return exchange_factory.locked_exchange(type, API_KEY, API_SECRET, role)
 
-@st.cache_data(ttl=0) # ttl=0 ensures no caching, data is always refetched
+# Data functions go through the process-wide query cache, so every session
+# viewing the same symbol shares one fetch (see query_cache.QUERY_CACHE_TTLS)
 def get_live_trade_data(symbol: str, type: str):
-    """Simulates fetching real-time trade data."""
-    exchange = get_exchange(type)
-
-    trades = exchange.fetch_my_trades(symbol=symbol, limit=1000)
-    df = pd.DataFrame([trade['info'] for trade in trades])
-    if not df.empty:
-        df.insert(0, 'datetime', pd.to_datetime(df['time'], unit='ms'))
-        df = df.sort_values(by='datetime', ascending=False)
-    return df
+    """Syncs trades newer than the local ledger's high-water mark, then reads the full ledger."""
+    def load():
+        with get_exchange(type, 'trades') as exchange:
+            sync_trades(exchange, type, symbol)
+        return load_trades(type, symbol)
+    return cache.get('trades', (symbol, type), load)
 
 # --- Function to fetch K-line data ---
-@st.cache_data(ttl=0) # ttl=0 ensures no caching, data is always refetched
 def fetch_klines(symbol: str, type: str, timeframe='1m', limit=1440, since=None):
     """
-    Fetches OHLCV (K-line) data from Binance using CCXT.
-    Handles pagination if `limit` exceeds single request max (Binance max ~1000-1500).
+    Fetches OHLCV (K-line) data through the local candle store, which only
+    downloads candles it doesn't have yet (paginated past Binance's per-request max)
+    plus the currently open candle.
     """
-    exchange = get_exchange(type)
-    ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since, limit)
+    return cache.get('klines', (symbol, type, timeframe, limit, since),
+                     lambda: _load_klines(symbol, type, timeframe, limit, since))
+
+def _load_klines(symbol, type, timeframe, limit, since):
+    with get_exchange(type, 'klines') as exchange:
+        df = get_candles(exchange, type, symbol, timeframe, limit, since)
 
-    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
     df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
     df['merge_key'] = df['timestamp'].dt.floor('min')
     df.set_index('timestamp', inplace=True)
@@ -67,9 +70,21 @@ def fetch_klines(symbol: str, type: str, timeframe='1m', limit=1440, since=None)
 
     return df
 
-@st.cache_data(ttl=0)
-def load_balance_history():
-    return fetch_balance_history()
+# Most points the balance chart draws; longer histories are downsampled
+BALANCE_CHART_POINTS = 2000
+BALANCE_WINDOWS = {'All': None, '1 year': 365, '90 days': 90, '30 days': 30, '7 days': 7, '1 day': 1}
+
+def load_balance_history(days=None):
+    """Reads the balance history through db_manager's incremental cache, windowed and downsampled for the chart."""
+    start_ms = None
+    if days is not None:
+        start_ms = int((pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=days)).value // 1_000_000)
+    return cache.get('balance', (None, days),
+                     lambda: fetch_balance_history(start_ms=start_ms, max_points=BALANCE_CHART_POINTS))
+
+def load_scores(symbol):
+    """Reads a symbol's scores; cached entries are revalidated against the symbol's write version."""
+    return cache.get('scores', (symbol, None, None, None), lambda: fetch_scores(symbol))
 
 # Set the title and favicon that appear in the Browser's tab bar.
 st.set_page_config(
@@ -99,42 +114,97 @@ selected_symbol_type = st.selectbox(
 )
 
 # Load data from the database
-balance_df = load_balance_history()
+balance_window = st.selectbox(
+    "Balance history window:",
+    options=list(BALANCE_WINDOWS),
+    index=0,
+    help="Older snapshots are still kept; this only limits what the chart shows."
+)
+balance_df = load_balance_history(BALANCE_WINDOWS[balance_window])
 
 if not balance_df.empty:
     # st.subheader("Balance History")
-
-    # Create the Plotly Line Chart
-    fig = go.Figure(data=go.Scatter(
-        x=balance_df['datetime'], # Use the UTC datetime column for the X-axis
-        y=balance_df['total_usdt_value'],
-        mode='lines+markers', # Show both lines and individual data points
-        name='Total USDT Value',
-        line=dict(color='skyblue', width=2), # Styling the line
-        marker=dict(size=6, color='lightcoral', line=dict(width=1, color='DarkSlateGrey')) # Styling markers
-    ))
-
-    # Update layout for better readability and mobile responsiveness
-    fig.update_layout(
-        xaxis_title="Time (UTC)", # Explicitly label X-axis as UTC
-        yaxis_title="Total USDT Value",
-        hovermode="x unified", # Improves hover experience, especially on mobile
-        title=dict(
-            text="Account Balance History",
-            font=dict(size=20),
-            # x=0.5 # Center the title
-        ),
-        margin=dict(l=40, r=40, t=60, b=40), # Adjust margins
-        autosize=True, # Allow Plotly to automatically size the chart
-        height=500, # Set a default height, will scale with width due to autosize
-        template="plotly_dark" # Use a dark theme for aesthetics
-    )
+    fig = build_balance_figure(balance_df)
 
     # Display the Plotly chart in Streamlit
     st.plotly_chart(fig, use_container_width=True, config={'responsive': True, 'displayModeBar': False})
 else:
     st.info("No balance data available yet. Please ensure the `hourly_balance_collector_utc_ms.py` script is running to populate the database.")
 
+# --- Multi-symbol score overview ---
+# All selected symbols are loaded with one query into a wide frame (one
+# column per symbol), bucketed so the window has about OVERVIEW_POINTS rows
+OVERVIEW_POINTS = 500
+OVERVIEW_WINDOWS = {'1 day': 1, '7 days': 7, '30 days': 30}
+OVERVIEW_DEFAULT_SYMBOLS = 12
+
+def load_score_overview(symbols, days):
+    """Reads the wide score frame of 'symbols' over the last 'days' days through the query cache."""
+    window_ms = days * 24 * 60 * 60 * 1000
+    bucket_ms = max(math.ceil(window_ms / OVERVIEW_POINTS / 60_000), 1) * 60_000 # Whole minutes
+    start_ms = int(pd.Timestamp.now(tz='UTC').value // 1_000_000) - window_ms
+    return cache.get('scores_wide', (None, tuple(symbols), days),
+                     lambda: fetch_scores_wide(symbols, start_ms=start_ms, bucket_ms=bucket_ms))
+
+if st.toggle("Show score overview", help="Latest score, trend and correlation of several symbols at once."):
+    st.subheader("Score Overview")
+    overview_symbols = st.multiselect(
+        "Symbols:",
+        options=all_symbols,
+        default=all_symbols[:OVERVIEW_DEFAULT_SYMBOLS],
+    )
+    overview_window = st.selectbox("Overview window:", options=list(OVERVIEW_WINDOWS), index=1)
+    wide_df = load_score_overview(overview_symbols, OVERVIEW_WINDOWS[overview_window]) if overview_symbols else None
+
+    if wide_df is None or wide_df.empty:
+        st.info("No scores for the selected symbols in this window.")
+    else:
+        st.dataframe(latest_scores(wide_df).sort_values('latest', ascending=False), use_container_width=True)
+        st.plotly_chart(build_sparkline_grid(wide_df), use_container_width=True, config={'displayModeBar': False})
+        if len(overview_symbols) > 1:
+            st.plotly_chart(build_correlation_heatmap(score_correlation(wide_df)), use_container_width=True)
+
+# --- Rendering helpers for the "Load Data" panels ---
+def render_trades(placeholder, df):
+    """Shows the trade ledger in its placeholder."""
+    if df is not None and not df.empty:
+        placeholder.dataframe(
+            df,
+            # column_order=["datetime", "symbol"],
+            use_container_width=True
+        )
+    else:
+        # This will be displayed if the DataFrame is empty or an error occurred
+        placeholder.info("Trades info are empty.")
+
+# fetch_klines() is called with its default 1m timeframe
+KLINE_TIMEFRAME_MS = 60 * 1000
+
+def render_klines(placeholder, symbol, df_klines, df_scores=None):
+    """
+    Draws the K-line chart in its placeholder. Called once as soon as the
+    klines arrive and again when the scores do, so the candles never wait
+    for the score query.
+    """
+    # Last score inside each candle, matched on the sorted ms timestamps
+    # (klines are already in chronological order, so no merge or re-sort)
+    score = float('nan')
+    if df_scores is not None and not df_scores.empty:
+        score = align_to_candles(df_klines.index, KLINE_TIMEFRAME_MS, df_scores['timestamp'], df_scores['score'].to_numpy())
+    df_klines = df_klines.assign(score=score).set_index('merge_key')
+
+    if df_klines.empty:
+        placeholder.warning("No data fetched for the selected parameters. Please try different settings.")
+        return
+
+    fig = build_kline_figure(df_klines, symbol, KLINE_TIMEFRAME_MS)
+    placeholder.plotly_chart(fig, use_container_width=True)
+
+def run_with_script_ctx(ctx, fn, *args, **kwargs):
+    """Runs fn in a worker thread with the script run context attached, so Streamlit calls work there."""
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return fn(*args, **kwargs)
+
 # --- The "Load Data" Button ---
 # Data will only load when this button is clicked
 if st.button("Load Data", help="Click to fetch trade data for the selected symbol."):
@@ -144,82 +214,42 @@ if st.button("Load Data", help="Click to fetch trade data for the selected symbo
 
     # Check if data should be loaded (only after the button is clicked)
     if 'symbol' in st.session_state and 'type' in st.session_state:
-        st.subheader(f"Trade Data for {st.session_state.symbol}")
-        with st.spinner("Fetching live trade data..."):
-            df = get_live_trade_data(symbol=st.session_state.symbol, type=st.session_state.type)
-        if not df.empty:
-            st.dataframe(
-                df,
-                # column_order=["datetime", "symbol"],
-                use_container_width=True
-            )
-        else:
-            # This will be displayed if the DataFrame is empty or an error occurred
-            st.info("Trades info are empty.")
-        
-        st.subheader(f"{selected_symbol} K-line Chart")
-        with st.spinner(f"Fetching 1m klines data..."):
-            df_klines = fetch_klines(symbol=st.session_state.symbol, type=st.session_state.type)
-        with st.spinner("Fetching scores data..."):
-            df_scores = fetch_scores(symbol=st.session_state.symbol)
-        df_klines = pd.merge(df_klines, df_scores[['merge_key', 'score']],
-                on='merge_key', how='left')
-        df_klines.set_index('merge_key', inplace=True)
-        df_klines = df_klines.sort_index()
-
-        if not df_klines.empty:
-            # Create Candlestick chart
-            fig = go.Figure(data=[go.Candlestick(
-                x=df_klines.index,
-                open=df_klines['open'],
-                high=df_klines['high'],
-                low=df_klines['low'],
-                close=df_klines['close'],
-                name='Candlesticks',
-            )])
-
-            # Add Volume bars
-            fig.add_trace(go.Bar(
-                x=df_klines.index,
-                y=df_klines['volume'],
-                name='Volume',
-                marker_color='rgba(0, 150, 0, 0.5)',  # Green for up, red for down (simple)
-                yaxis='y2', # Assign to secondary y-axis
-            ))
-
-            # --- Workaround: Add an invisible Scatter trace for custom hover info ---
-            # This trace will carry all the hover data you want.
-            # Make sure it uses the same x-axis values as your candlesticks.
-            fig.add_trace(go.Scatter(
-                x=df_klines.index,
-                y=(df_klines['high'] + df_klines['low']) / 2, # Plot at the middle of the candle
-                mode='markers', # We need markers for hover, but we'll make them invisible
-                marker=dict(size=1, opacity=0), # Make markers tiny and fully transparent
-                name='Score', # This name might appear if hoverinfo is not 'none'
-                hoverinfo='text', # Crucial: Tell plotly to use text from hovertemplate
-                # Prepare customdata for the Scatter trace
-                customdata=df_klines[['score']].fillna('N/A').values,
-                hovertemplate=(
-                    "<b>Score:</b> %{customdata[0]:.6f}<extra></extra>"
-                )
-            ))
-
-            # Update layout for better appearance
-            fig.update_layout(
-                xaxis_rangeslider_visible=False, # Hide the default range slider for cleaner look
-                xaxis_title="Time",
-                yaxis_title="Price",
-                title=f"{selected_symbol} K-line Chart",
-                hovermode="x unified",
-                height=600,
-                # Add secondary y-axis for volume
-                yaxis=dict(domain=[0.3, 1]), # Price axis occupies top 70%
-                yaxis2=dict(domain=[0, 0.25], anchor='x', overlaying='y', side='right', showgrid=False, title='Volume'), # Volume axis occupies bottom 25%
-                template="plotly_dark", # Or "plotly_white"
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.warning("No data fetched for the selected parameters. Please try different settings.")
-
-        
+        symbol, type = st.session_state.symbol, st.session_state.type
 
+        # Lay out both panels up front; each is filled in as soon as its data arrives
+        st.subheader(f"Trade Data for {symbol}")
+        trades_placeholder = st.empty()
+        trades_placeholder.info("Fetching live trade data...")
+        st.subheader(f"{selected_symbol} K-line Chart")
+        klines_placeholder = st.empty()
+        klines_placeholder.info("Fetching 1m klines and scores data...")
+
+        # The two exchange round trips and the score query run concurrently,
+        # so the page waits for the slowest source rather than the sum of all
+        # three. Trades and klines use separate CCXT instances (one per role in
+        # exchange_factory), so they don't wait for each other's lock.
+        ctx = get_script_run_ctx()
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = {
+                executor.submit(run_with_script_ctx, ctx, get_live_trade_data, symbol=symbol, type=type): 'trades',
+                executor.submit(run_with_script_ctx, ctx, fetch_klines, symbol=symbol, type=type): 'klines',
+                executor.submit(run_with_script_ctx, ctx, load_scores, symbol=symbol): 'scores',
+            }
+            results = {}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = None
+                    if name == 'scores':
+                        print(f"Error fetching scores: {e}")
+                    else:
+                        (trades_placeholder if name == 'trades' else klines_placeholder).error(f"Error fetching {name}: {e}")
+                        continue
+
+                if name == 'trades':
+                    render_trades(trades_placeholder, results['trades'])
+                elif results.get('klines') is not None and (name == 'klines' or 'scores' in results):
+                    # Klines first: draw the candles now, redraw once the scores are in
+                    render_klines(klines_placeholder, selected_symbol, results['klines'], results.get('scores'))
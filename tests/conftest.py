@@ -0,0 +1,95 @@
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def server_module(tmp_path_factory):
+    """score_server imported inside a scratch directory (it opens ./scores.db on import)."""
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('server'))
+    import score_server
+    yield score_server
+    os.chdir(previous)
+
+
+def drop_tables():
+    import db_manager
+    with db_manager.connections.write() as conn:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            conn.execute(f"DROP TABLE {table}")
+        conn.commit()
+
+
+@pytest.fixture
+def server(server_module):
+    """A score server with an empty database, archive and caches."""
+    drop_tables()
+    shutil.rmtree(server_module.score_archive.ARCHIVE_DIR, ignore_errors=True)
+    server_module.score_cache.drop()
+    server_module.init_db()
+    return server_module
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+@pytest.fixture
+def legacy_db(server):
+    """
+    Replaces the database with one written before this series (only the
+    'scores' table) and returns a function that fills it in with rows.
+    """
+    drop_tables()
+
+    def fill(rows):
+        import db_manager
+        with db_manager.connections.write() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS scores (symbol TEXT NOT NULL, timestamp INTEGER NOT NULL, "
+                "score REAL NOT NULL, PRIMARY KEY (symbol, timestamp))"
+            )
+            conn.executemany("INSERT INTO scores (symbol, timestamp, score) VALUES (?, ?, ?)", rows)
+            conn.commit()
+    return fill
+
+
+class _TestResponse:
+    """The parts of a requests.Response that score_client uses, over a Flask test response."""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.content = response.data
+
+    def json(self):
+        return self._response.get_json()
+
+    def raise_for_status(self):
+        assert self.status_code < 400, self._response.data
+
+
+class _TestScoreClient:
+    """Stands in for score_client.ScoreClient, sending its GETs to the Flask test client."""
+
+    def __init__(self, client):
+        self.client = client
+        self.requests = 0
+
+    def _get(self, path, params=None, headers=None):
+        self.requests += 1
+        return _TestResponse(self.client.get(path, query_string=params, headers=headers))
+
+
+@pytest.fixture
+def score_client(client):
+    return _TestScoreClient(client)
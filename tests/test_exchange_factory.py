@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+import exchange_factory
+
+
+class FakeExchange:
+    """Just enough of ccxt.binance for exchange_factory, with a call that records overlaps."""
+
+    def __init__(self, config):
+        self.options = dict(config['options'])
+        self.markets, self.currencies = {}, {}
+        self.active = 0
+        self.overlapped = False
+
+    def set_markets(self, markets, currencies=None):
+        self.markets = markets
+
+    def load_markets(self, reload=False):
+        self.markets = {'BTC/USDT': {}}
+
+    def load_time_difference(self):
+        self.options['timeDifference'] = 0
+
+    def call(self, seconds):
+        self.active += 1
+        self.overlapped |= self.active > 1
+        time.sleep(seconds)
+        self.active -= 1
+
+
+@pytest.fixture(autouse=True)
+def fake_ccxt(monkeypatch, tmp_path):
+    monkeypatch.setattr(exchange_factory.ccxt, 'binance', FakeExchange)
+    monkeypatch.setattr(exchange_factory, 'MARKETS_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(exchange_factory, '_exchanges', {})
+    monkeypatch.setattr(exchange_factory, '_instance_locks', {})
+
+
+def run_threads(target, count):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_same_role_is_serialised():
+    def work(_):
+        for _ in range(5):
+            with exchange_factory.locked_exchange('future', 'key', 'secret', 'trades') as exchange:
+                exchange.call(0.005)
+
+    run_threads(work, 4)
+    assert not exchange_factory.get_exchange('future', 'key', 'secret', 'trades').overlapped
+
+
+def test_roles_get_their_own_instance_and_run_in_parallel():
+    roles = ('trades', 'klines')
+    started = time.perf_counter()
+
+    def work(i):
+        with exchange_factory.locked_exchange('future', 'key', 'secret', roles[i]) as exchange:
+            exchange.call(0.3)
+
+    run_threads(work, 2)
+    elapsed = time.perf_counter() - started
+    trades, klines = (exchange_factory.get_exchange('future', 'key', 'secret', role) for role in roles)
+    assert trades is not klines
+    assert elapsed < 0.55 # the slowest call, not the sum of both
@@ -0,0 +1,57 @@
+import pytest
+
+from query_cache import QueryCache, cache
+
+
+@pytest.fixture
+def loads():
+    calls = []
+
+    def loader(value):
+        def load():
+            calls.append(value)
+            return value
+        return load
+    loader.calls = calls
+    return loader
+
+
+def post(client, symbol, timestamp):
+    assert client.post('/scores', json=[{'symbol': symbol, 'timestamp': timestamp, 'score': 1.0}]).status_code == 201
+
+
+@pytest.mark.parametrize('symbols', [('A', 'B'), ()])
+def test_scores_wide_sees_ingest_from_another_process(client, loads, symbols):
+    cache.invalidate()
+    post(client, 'A', 1)
+    key = (None, symbols, 1)
+    assert cache.get('scores_wide', key, loads('first')) == 'first'
+    assert cache.get('scores_wide', key, loads('cached')) == 'first'
+
+    # The score server doesn't touch this process's cache; the version check catches the write
+    post(client, 'A', 2)
+    assert cache.get('scores_wide', key, loads('second')) == 'second'
+    post(client, 'B', 1)
+    assert cache.get('scores_wide', key, loads('third')) == 'third'
+    client.delete('/scores/B')
+    assert cache.get('scores_wide', key, loads('fourth')) == 'fourth'
+    assert loads.calls == ['first', 'second', 'third', 'fourth']
+
+
+def test_scores_entries_follow_the_symbol_version(client, loads):
+    cache.invalidate()
+    post(client, 'A', 1)
+    assert cache.get('scores', ('A', None), loads('first')) == 'first'
+    post(client, 'B', 1) # another symbol leaves A's entry alone
+    assert cache.get('scores', ('A', None), loads('cached')) == 'first'
+    post(client, 'A', 2)
+    assert cache.get('scores', ('A', None), loads('second')) == 'second'
+
+
+def test_ttl_and_size_bound(loads):
+    local = QueryCache(max_bytes=10_000, ttls={'short': 0})
+    assert local.get('short', ('X',), loads(1)) == 1
+    assert local.get('short', ('X',), loads(2)) == 2 # expired straight away
+    local.invalidate()
+    local.get('big', ('X',), loads('x' * 20_000)) # larger than the cache: not stored
+    assert local.stats()['entries'] == 0
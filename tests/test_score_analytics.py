@@ -0,0 +1,121 @@
+import json
+import random
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import score_analytics
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('''
+        CREATE TABLE scores (
+            symbol TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (symbol, timestamp)
+        )
+    ''')
+    score_analytics.init_analytics_tables(conn.cursor())
+    yield conn
+    conn.close()
+
+
+def ingest(conn, rows):
+    """Writes a batch the way score_server.write_scores does."""
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO scores (symbol, timestamp, score) VALUES (?, ?, ?)", rows)
+        score_analytics.update_analytics(conn, rows)
+
+
+def replay_all(conn, chunk_size):
+    while score_analytics.replay_dirty(conn, chunk_size):
+        pass
+
+
+def expected_metrics(scores):
+    """The metrics recomputed from scratch with pandas."""
+    expected = pd.DataFrame({'count': np.arange(1, len(scores) + 1)}, index=scores.index)
+    for span in score_analytics.ANALYTICS_EMA_SPANS:
+        expected[f'ema_{span}'] = scores.ewm(span=span, adjust=False).mean()
+    for size in score_analytics.ANALYTICS_WINDOWS:
+        mean = scores.rolling(size).mean()
+        std = scores.rolling(size).std()
+        expected[f'mean_{size}'] = mean
+        expected[f'std_{size}'] = std
+        expected[f'zscore_{size}'] = ((scores - mean) / std).where(std > 0)
+    return expected
+
+
+def stored_metrics(conn, symbol):
+    rows = conn.execute(
+        "SELECT timestamp, metrics FROM score_analytics WHERE symbol = ? ORDER BY timestamp", (symbol,)
+    ).fetchall()
+    frame = pd.DataFrame([json.loads(metrics) for _, metrics in rows], index=[ts for ts, _ in rows])
+    return frame.astype(float)
+
+
+def assert_matches_pandas(conn, symbol):
+    scores = pd.Series(dict(conn.execute(
+        "SELECT timestamp, score FROM scores WHERE symbol = ? ORDER BY timestamp", (symbol,)
+    ).fetchall()), dtype=float)
+    expected = expected_metrics(scores)
+    stored = stored_metrics(conn, symbol)[expected.columns]
+    assert list(stored.index) == list(expected.index)
+    np.testing.assert_allclose(stored.to_numpy(), expected.to_numpy(dtype=float), rtol=1e-9, atol=1e-9)
+    latest = score_analytics.latest_analytics(conn, symbol)
+    assert latest['timestamp'] == scores.index[-1]
+    assert latest['stale_from'] is None
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_randomized_ingest_matches_pandas(conn, monkeypatch, seed):
+    # Small limits so the run mixes appends, inline replays and deferred ones
+    monkeypatch.setattr(score_analytics, 'ANALYTICS_INLINE_REPLAY', 50)
+    rng = random.Random(seed)
+    timestamps = rng.sample(range(0, 5000 * 1000, 1000), 1500)
+    pending = [('RND', ts, rng.gauss(0, 1)) for ts in timestamps]
+    # Mostly in order, with some scores shuffled back and some replaced later on
+    pending.sort(key=lambda row: row[1] + rng.choice([0, 0, 0, -rng.randrange(400_000)]))
+    pending += [('RND', ts, rng.gauss(5, 2)) for ts in rng.sample(timestamps, 100)]
+
+    position = 0
+    while position < len(pending):
+        size = rng.randint(1, 60)
+        ingest(conn, pending[position:position + size])
+        position += size
+        if rng.random() < 0.2:
+            score_analytics.replay_dirty(conn, chunk_size=rng.randint(1, 300))
+    replay_all(conn, chunk_size=97)
+
+    assert_matches_pandas(conn, 'RND')
+
+
+def test_long_backfill_is_deferred_to_replay(conn, monkeypatch):
+    monkeypatch.setattr(score_analytics, 'ANALYTICS_INLINE_REPLAY', 100)
+    rng = random.Random(42)
+    ingest(conn, [('BF', ts, rng.gauss(0, 1)) for ts in range(1000, 1001000, 1000)])
+    assert_matches_pandas(conn, 'BF')
+
+    # Replacing an early score would replay ~1000 points: only marked in the ingest transaction
+    ingest(conn, [('BF', 5000, 50.0)])
+    assert score_analytics.latest_analytics(conn, 'BF')['stale_from'] == 5000
+    # Appends while the replay is pending leave the mark where it is
+    ingest(conn, [('BF', 2000000, 1.0)])
+    assert score_analytics.latest_analytics(conn, 'BF')['stale_from'] == 5000
+
+    assert score_analytics.replay_dirty(conn, chunk_size=400) == 1
+    replay_all(conn, chunk_size=400)
+    assert_matches_pandas(conn, 'BF')
+
+
+def test_short_backfill_is_replayed_inline(conn, monkeypatch):
+    monkeypatch.setattr(score_analytics, 'ANALYTICS_INLINE_REPLAY', 100)
+    rng = random.Random(7)
+    ingest(conn, [('IN', ts, rng.gauss(0, 1)) for ts in range(1000, 301000, 1000)])
+    ingest(conn, [('IN', 250500, 3.0), ('IN', 260000, -3.0)])
+    assert_matches_pandas(conn, 'IN')
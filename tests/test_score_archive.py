@@ -0,0 +1,74 @@
+import score_archive
+import score_client as score_client_module
+from db_manager import connections
+
+DAY_MS = 24 * 60 * 60 * 1000
+START = 1_700_000_000_000 - 1_700_000_000_000 % DAY_MS
+
+
+def seed(client, symbols=('A', 'B')):
+    """200 scores per symbol over 4 days, then everything older than 2.5 days is archived."""
+    for symbol in symbols:
+        items = [{'symbol': symbol, 'timestamp': START + i * 30 * 60 * 1000, 'score': float(i)} for i in range(200)]
+        assert client.post('/scores', json=items).status_code == 201
+    with connections.write() as conn:
+        moved = score_archive.archive_scores(conn, 1.5, now_ms=START + 4 * DAY_MS)
+    assert 0 < moved < 200 * len(symbols)
+    return START + 30 * 60 * 1000 * 10 # an archived timestamp
+
+
+def test_get_all_scores_merges_the_archive(client):
+    seed(client)
+    rows = client.get('/scores').get_json()
+    assert len(rows) == 400
+    assert [(row['symbol'], row['timestamp']) for row in rows] == sorted((row['symbol'], row['timestamp']) for row in rows)
+
+    paged, after = [], None
+    while True:
+        page = client.get('/scores', query_string={'limit': 70, **({'after': after} if after else {})}).get_json()
+        paged += page['scores']
+        after = page['next_after']
+        if after is None:
+            break
+    assert paged == rows
+
+
+def test_late_write_into_archive_is_counted_once(client, score_client):
+    archived_ts = seed(client, ('A',))
+    mirror = score_client_module.ScoreMirror(score_client, 'A')
+    mirror.sync()
+    assert len(mirror.scores) == 200
+
+    assert client.post('/scores', json=[{'symbol': 'A', 'timestamp': archived_ts, 'score': -1.0}]).status_code == 201
+    response = client.get('/scores/A')
+    assert response.headers['X-Score-Count'] == '200'
+    assert len(response.get_json()) == 200
+
+    mirror.sync()
+    assert mirror.scores[archived_ts] == -1.0
+    # Counts agree again, so the next polls are plain 304s rather than full reloads
+    requests = score_client.requests
+    assert mirror.sync() == 0 and mirror.sync() == 0
+    assert score_client.requests == requests + 2 and not mirror._full_reload
+
+    assert client.post('/scores', json=[{'symbol': 'A', 'timestamp': archived_ts + 1, 'score': 5.0}]).status_code == 201
+    assert client.get('/scores/A').headers['X-Score-Count'] == '201'
+    assert client.delete('/scores/A').get_json()['message'].startswith('Successfully deleted 201 ')
+
+
+def test_delete_removes_the_archive(client):
+    seed(client, ('A',))
+    assert client.delete('/scores/A').status_code == 200
+    assert client.get('/scores/A').status_code == 404
+    assert client.get('/scores').get_json() == []
+    assert score_archive.archived_symbols() == []
+
+
+def test_late_write_keeps_archived_rollup_buckets(client):
+    archived_ts = seed(client, ('A',))
+    with connections.read() as conn:
+        before = conn.execute("SELECT * FROM score_rollups WHERE interval = '1d' ORDER BY bucket").fetchall()
+    assert client.post('/scores', json=[{'symbol': 'A', 'timestamp': archived_ts + 1, 'score': 1.0}]).status_code == 201
+    with connections.read() as conn:
+        after = conn.execute("SELECT * FROM score_rollups WHERE interval = '1d' ORDER BY bucket").fetchall()
+    assert [row[3] for row in after] == [before[0][3] + 1] + [row[3] for row in before[1:]]
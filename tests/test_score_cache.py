@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+
+def post(client, symbol, *timestamps):
+    items = [{'symbol': symbol, 'timestamp': ts, 'score': float(ts)} for ts in timestamps]
+    assert client.post('/scores', json=items).status_code == 201
+
+
+def timestamps(client, symbol):
+    return [row['timestamp'] for row in client.get(f'/scores/{symbol}').get_json()]
+
+
+@pytest.fixture
+def other_process(server):
+    """A second connection to scores.db, writing the way another score server process would."""
+    conn = sqlite3.connect(server.DATABASE_FILE)
+    yield conn
+    conn.close()
+
+
+def foreign_write(conn, symbol, timestamp):
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO scores (symbol, timestamp, score) VALUES (?, ?, ?)",
+                     (symbol, timestamp, float(timestamp)))
+        conn.execute(
+            """
+            INSERT INTO score_symbols (symbol, version, updated_at, row_count, max_timestamp) VALUES (?, 1, 0, 1, ?)
+            ON CONFLICT(symbol) DO UPDATE SET version = version + 1, row_count = row_count + 1,
+                max_timestamp = MAX(max_timestamp, excluded.max_timestamp)
+            """,
+            (symbol, timestamp)
+        )
+
+
+def test_unknown_symbols_are_not_cached(server, client, other_process):
+    assert client.get('/scores/NEW').status_code == 404
+    assert server.score_cache.stats()['symbols'] == 0
+    foreign_write(other_process, 'NEW', 1)
+    assert timestamps(client, 'NEW') == [1]
+
+
+def test_write_of_another_process_reloads_the_ring(client, other_process):
+    post(client, 'A', 1, 2)
+    assert timestamps(client, 'A') == [1, 2]
+    foreign_write(other_process, 'A', 3)
+    assert timestamps(client, 'A') == [1, 2, 3]
+
+
+def test_local_write_after_a_foreign_one_keeps_both(client, other_process):
+    post(client, 'A', 1)
+    assert timestamps(client, 'A') == [1]
+    foreign_write(other_process, 'A', 2)
+    # The ring is a version behind, so this batch must not be appended to it
+    post(client, 'A', 3)
+    assert timestamps(client, 'A') == [1, 2, 3]
+    assert client.get('/scores/A').headers['X-Score-Count'] == '3'
+
+
+def test_delete_by_another_process_is_seen(client, other_process):
+    post(client, 'A', 1)
+    assert timestamps(client, 'A') == [1]
+    with other_process:
+        other_process.execute("DELETE FROM scores WHERE symbol = 'A'")
+        other_process.execute("DELETE FROM score_symbols WHERE symbol = 'A'")
+    assert client.get('/scores/A').status_code == 404
+
+
+def test_upgrade_backfills_score_symbols(server, legacy_db):
+    legacy_db([('OLD', ts, 1.0) for ts in (1, 2, 3)])
+    server.init_db()
+    client = server.app.test_client()
+
+    response = client.get('/scores/OLD')
+    assert response.status_code == 200
+    assert response.headers['X-Score-Count'] == '3'
+    assert response.headers['X-Score-Max-Timestamp'] == '3'
+    with server.connections.read() as conn:
+        assert conn.execute("SELECT version, row_count FROM score_symbols WHERE symbol = 'OLD'").fetchone() == (0, 3)
+    # The first write after the upgrade bumps the version, so cached copies are refreshed
+    post(client, 'OLD', 4)
+    assert timestamps(client, 'OLD') == [1, 2, 3, 4]
+    assert client.get('/scores/OLD').headers['X-Score-Count'] == '4'
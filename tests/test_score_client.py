@@ -0,0 +1,51 @@
+from score_client import ScoreMirror
+
+
+def post(client, rows, symbol='S'):
+    items = [{'symbol': symbol, 'timestamp': ts, 'score': score} for ts, score in rows]
+    assert client.post('/scores', json=items).status_code == 201
+
+
+def test_mirror_picks_up_replacements_behind_the_watermark(client, score_client):
+    post(client, [(1, 1.0), (2, 2.0), (3, 3.0)])
+    mirror = ScoreMirror(score_client, 'S')
+    assert mirror.sync() == 3
+    assert mirror.sync() == 0 # 304
+
+    post(client, [(2, 42.0)])
+    mirror.sync()
+    assert mirror.items() == [(1, 1.0), (2, 42.0), (3, 3.0)]
+
+    post(client, [(2, 43.0), (10, 10.0)])
+    mirror.sync()
+    assert mirror.items() == [(1, 1.0), (2, 43.0), (3, 3.0), (10, 10.0)]
+
+    post(client, [(0, -1.0)])
+    mirror.sync()
+    assert mirror.items() == [(0, -1.0), (1, 1.0), (2, 43.0), (3, 3.0), (10, 10.0)]
+
+    requests = score_client.requests
+    assert mirror.sync() == 0
+    assert score_client.requests == requests + 1 and not mirror._full_reload
+
+
+def test_appends_are_synced_as_deltas(client, score_client):
+    post(client, [(1, 1.0), (2, 2.0)])
+    mirror = ScoreMirror(score_client, 'S')
+    mirror.sync()
+    post(client, [(5, 5.0)])
+    requests = score_client.requests
+    assert mirror.sync() == 1 # only the new row came back, in one request
+    assert score_client.requests == requests + 1
+    assert mirror.items() == [(1, 1.0), (2, 2.0), (5, 5.0)]
+
+
+def test_headers_come_from_score_symbols(client):
+    post(client, [(1, 1.0), (2, 2.0)])
+    post(client, [(2, 5.0), (3, 3.0)])
+    response = client.get('/scores/S')
+    assert response.headers['X-Score-Count'] == '3'
+    assert response.headers['X-Score-Max-Timestamp'] == '3'
+    assert response.headers['X-Score-Version'] == '2'
+    assert response.headers['X-Score-Rewrite-Version'] == '2'
+    assert client.get('/scores/S', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
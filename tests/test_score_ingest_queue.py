@@ -0,0 +1,39 @@
+import sqlite3
+
+from score_ingest_queue import WriteBehindQueue
+
+
+def test_unbindable_row_is_isolated_not_dropped(client, server):
+    queue = server.ingest_queue
+    before = queue.stats()
+    good = [('GOOD', ts, 1.0) for ts in range(1, 101)]
+    # Rows that no amount of retrying can write, queued next to other requests' rows
+    bad = [({'not': 'a symbol'}, 1, 1.0), (['BAD'], 2, 1.0), ('BAD', 3, float('nan')), ('BAD', 2 ** 70, 1.0)]
+    queue.put_many(good[:50] + bad + good[50:])
+    assert queue.flush(timeout=30)
+
+    after = queue.stats()
+    assert after['written_rows'] - before['written_rows'] == 100
+    assert after['invalid_rows'] - before['invalid_rows'] == 4
+    assert after['dropped_rows'] == before['dropped_rows']
+    assert len(client.get('/scores/GOOD').get_json()) == 100
+
+
+def test_operational_errors_are_retried():
+    written = []
+    failures = [sqlite3.OperationalError('database is locked')] * 2
+
+    def write_batch(rows):
+        if failures:
+            raise failures.pop()
+        written.extend(rows)
+
+    queue = WriteBehindQueue(write_batch, flush_interval=0.01)
+    queue.put_many([('A', 1, 1.0), ('A', 2, 2.0)])
+    assert queue.flush(timeout=10)
+    queue.close()
+
+    stats = queue.stats()
+    assert written == [('A', 1, 1.0), ('A', 2, 2.0)]
+    assert stats['failed_attempts'] == 2
+    assert stats['invalid_rows'] == 0 and stats['dropped_rows'] == 0
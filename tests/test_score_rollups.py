@@ -0,0 +1,25 @@
+def test_upgrade_builds_rollups_for_existing_scores(server, legacy_db):
+    # 10000 scores written before rollups existed, one every 6 s from an hour boundary
+    start = 1_700_000_000_000 - 1_700_000_000_000 % 3_600_000
+    legacy_db([('OLD', start + i * 6000, float(i % 50)) for i in range(10000)])
+    server.init_db()
+    client = server.app.test_client()
+
+    assert client.post('/scores', json=[{'symbol': 'OLD', 'timestamp': start + 10000 * 6000, 'score': 1.0}]).status_code == 201
+    body = client.get('/scores/OLD?points=100').get_json()
+    assert body['resolution'] != 'raw'
+    assert sum(point['count'] for point in body['points']) == 10001
+
+
+def test_rollups_match_raw_buckets(client):
+    start = 1_700_000_000_000 - 1_700_000_000_000 % 3_600_000
+    items = [{'symbol': 'R', 'timestamp': start + i * 7000, 'score': float((i * 37) % 101)} for i in range(3000)]
+    assert client.post('/scores', json=items).status_code == 201
+    end = start + 3000 * 7000 - 1
+
+    rolled = client.get(f'/scores/R?start={start}&end={end}&points=5').get_json()
+    raw = client.get(f'/scores/R?start={start}&end={end}&points=3000').get_json()
+    assert rolled['resolution'] != 'raw' and raw['resolution'] == 'raw'
+    assert sum(point['count'] for point in rolled['points']) == 3000
+    assert max(point['max'] for point in rolled['points']) == max(point['max'] for point in raw['points'])
+    assert rolled['points'][-1]['last'] == items[-1]['score']
@@ -0,0 +1,22 @@
+import pytest
+
+
+@pytest.mark.parametrize('item', [
+    {'symbol': 'BAD', 'timestamp': 2, 'score': float('nan')},
+    {'symbol': 'BAD', 'timestamp': 2, 'score': float('inf')},
+    {'symbol': 'BAD', 'timestamp': 2, 'score': True},
+    {'symbol': 'BAD', 'timestamp': True, 'score': 1.0},
+    {'symbol': 'BAD', 'timestamp': 2 ** 63, 'score': 1.0},
+    {'symbol': 'BAD', 'timestamp': 2, 'score': 10 ** 400},
+    {'symbol': {'x': 1}, 'timestamp': 2, 'score': 1.0},
+    {'symbol': ['BAD'], 'timestamp': 2, 'score': 1.0},
+    {'symbol': 7, 'timestamp': 2, 'score': 1.0},
+    {'symbol': '   ', 'timestamp': 2, 'score': 1.0},
+])
+def test_invalid_item_is_rejected_per_item(client, item):
+    response = client.post('/scores', json=[{'symbol': 'OK', 'timestamp': 1, 'score': 1.0}, item])
+    assert response.status_code == 207
+    assert len(response.get_json()['errors']) == 1
+    assert [row['timestamp'] for row in client.get('/scores/OK').get_json()] == [1]
+    assert client.get('/scores/BAD').status_code == 404
+    assert client.get('/scores/7').status_code == 404
@@ -0,0 +1,45 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+
+import score_wire
+
+
+def arrow_payload(symbol):
+    batch = pa.record_batch([symbol, pa.array([1, 2], pa.int64()), pa.array([1.0, 2.0])],
+                            names=['symbol', 'timestamp', 'score'])
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+@pytest.mark.parametrize('dictionary', [[], [''], ['', 'A'], ['A', 'B']])
+def test_packed_dictionary_round_trips(dictionary):
+    codes = np.arange(len(dictionary), dtype=np.int32)
+    columns = score_wire.ScoreColumns(dictionary, codes, codes.astype(np.int64), codes.astype(np.float64))
+    [decoded] = score_wire.iter_packed_frames(score_wire.encode_packed(columns))
+    assert decoded.dictionary == dictionary
+    assert decoded.codes.tolist() == codes.tolist()
+
+
+def test_packed_empty_symbol_is_rejected(client):
+    columns = score_wire.columns_from_rows([('', 1, 1.0), ('OK', 1, 1.0)])
+    response = client.post('/scores', data=score_wire.encode_packed(columns), content_type=score_wire.PACKED_MIMETYPE)
+    assert response.status_code == 207
+    assert len(response.get_json()['errors']) == 1
+    assert client.get('/scores/OK').status_code == 200
+
+
+def test_arrow_string_symbols_are_accepted(client):
+    for symbol in (pa.array(['A', 'B']), pa.array(['A', 'B']).dictionary_encode(), pa.array(['A', 'B'], pa.large_string())):
+        response = client.post('/scores', data=arrow_payload(symbol), content_type=score_wire.ARROW_MIMETYPE)
+        assert response.status_code == 201
+    assert [row['timestamp'] for row in client.get('/scores/B').get_json()] == [2]
+
+
+@pytest.mark.parametrize('symbol', [pa.array([1, 2], pa.int64()), pa.array([1, 2], pa.int64()).dictionary_encode()])
+def test_arrow_non_string_symbols_are_rejected(client, symbol):
+    response = client.post('/scores', data=arrow_payload(symbol), content_type=score_wire.ARROW_MIMETYPE)
+    assert response.status_code == 400
+    assert client.get('/scores/1').status_code == 404
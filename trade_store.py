@@ -0,0 +1,114 @@
+"""
+Local ledger of the account's own trades.
+
+Trades are kept in the 'trades' table of scores.db, one row per
+(account type, symbol, trade id) with typed columns. The high-water mark of a
+ledger is simply its largest stored trade id: sync_trades() asks Binance for
+trades from the next id on ('fromId', which myTrades/userTrades page by) and
+keeps paging until a short page says it has caught up. The first sync starts
+at id 0, so the ledger holds the full history instead of the last 1000 trades.
+"""
+import pandas as pd
+
+from db_manager import connections
+
+# Binance returns at most 1000 trades per myTrades / userTrades request
+MAX_TRADES_PER_REQUEST = 1000
+
+TRADE_COLUMNS = ['trade_id', 'order_id', 'timestamp', 'side', 'price', 'amount', 'cost',
+                 'fee_cost', 'fee_currency', 'taker_or_maker']
+
+
+def init_trade_table(conn):
+    """Creates the trades table if it doesn't exist."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trades (
+            account_type TEXT NOT NULL, -- spot, margin, future, delivery
+            symbol TEXT NOT NULL,
+            trade_id INTEGER NOT NULL,
+            order_id TEXT,
+            timestamp INTEGER NOT NULL, -- milliseconds since epoch
+            side TEXT NOT NULL, -- buy or sell
+            price REAL NOT NULL,
+            amount REAL NOT NULL,
+            cost REAL,
+            fee_cost REAL,
+            fee_currency TEXT,
+            taker_or_maker TEXT,
+            PRIMARY KEY (account_type, symbol, trade_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _trade_row(account_type, symbol, trade):
+    """Flattens a unified ccxt trade into a trades table row."""
+    fee = trade.get('fee') or {}
+    return (
+        account_type, symbol, int(trade['id']), trade.get('order'), int(trade['timestamp']),
+        trade['side'], float(trade['price']), float(trade['amount']),
+        None if trade.get('cost') is None else float(trade['cost']),
+        None if fee.get('cost') is None else float(fee['cost']),
+        fee.get('currency'), trade.get('takerOrMaker'),
+    )
+
+
+def last_trade_id(conn, account_type, symbol):
+    """High-water mark of a ledger: the largest stored trade id, or None if it is empty."""
+    return conn.execute(
+        "SELECT MAX(trade_id) FROM trades WHERE account_type = ? AND symbol = ?", (account_type, symbol)
+    ).fetchone()[0]
+
+
+def sync_trades(exchange, account_type, symbol):
+    """
+    Downloads every trade newer than the ledger's high-water mark, one page
+    of MAX_TRADES_PER_REQUEST at a time, committing each page as it arrives.
+
+    Returns:
+        int: number of trades added.
+    """
+    with connections.write() as conn:
+        init_trade_table(conn)
+        high_water = last_trade_id(conn, account_type, symbol)
+        from_id = 0 if high_water is None else high_water + 1
+
+        added = 0
+        while True:
+            trades = exchange.fetch_my_trades(symbol, limit=MAX_TRADES_PER_REQUEST, params={'fromId': from_id})
+            if not trades:
+                break
+            rows = [_trade_row(account_type, symbol, trade) for trade in trades]
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO trades (account_type, symbol, trade_id, order_id, timestamp, side, "
+                    "price, amount, cost, fee_cost, fee_currency, taker_or_maker) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            added += len(rows)
+            next_id = max(row[2] for row in rows) + 1
+            # A short page means we are caught up; a non-advancing id would loop forever
+            if len(trades) < MAX_TRADES_PER_REQUEST or next_id <= from_id:
+                break
+            from_id = next_id
+        return added
+
+
+def load_trades(account_type, symbol):
+    """
+    Reads a ledger from the local store.
+
+    Returns:
+        pd.DataFrame: a 'datetime' column followed by TRADE_COLUMNS, newest trade first.
+    """
+    with connections.write() as conn:
+        init_trade_table(conn)
+    df = connections.read_frame(
+        f"SELECT {', '.join(TRADE_COLUMNS)} FROM trades WHERE account_type = ? AND symbol = ? "
+        "ORDER BY trade_id DESC",
+        (account_type, symbol),
+        dtypes={'trade_id': 'int64', 'timestamp': 'int64', 'price': 'float64', 'amount': 'float64',
+                'cost': 'float64', 'fee_cost': 'float64'}
+    )
+    df.insert(0, 'datetime', pd.to_datetime(df['timestamp'], unit='ms'))
+    return df